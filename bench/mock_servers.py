@@ -0,0 +1,799 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+# Hostnames the pipeline talks to. Requests are rewritten to
+# http://127.0.0.1:<port>/<hostname>/<path> by the bench worker.
+MOCK_HOSTS = (
+    "api.dropboxapi.com",
+    "content.dropboxapi.com",
+    "notify.dropboxapi.com",
+    "dl.dropboxusercontent.com",
+    "api.groq.com",
+    "graph.facebook.com",
+    "graph.threads.net",
+    "api.telegram.org",
+    "discord.com",
+    "api.twitter.com",
+    "upload.twitter.com",
+    "api.tumblr.com",
+    "media.bench",
+)
+
+DEFAULT_PROFILE = {
+    "latency_ms": 0,        # added before every response
+    "bandwidth_kbps": 0,    # 0 = unthrottled, applied to request and response bodies
+    "rate_429": 0.0,        # probability of a rate-limit response
+    "rate_5xx": 0.0,        # probability of a 503 response
+    "retry_after": 1,       # seconds advertised on injected 429s
+    "transcode_s": 0.0,     # container processing time (Graph / Threads)
+    "rate_lost": 0.0,       # probability a Graph post is applied but answered with a 503
+}
+
+DROPBOX_BLOCK = 4 * 1024 * 1024
+
+
+def dropbox_content_hash(path):
+    """Dropbox content_hash: sha256 over the sha256 of each 4 MB block."""
+    overall = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(DROPBOX_BLOCK)
+            if not block:
+                break
+            overall.update(hashlib.sha256(block).digest())
+    return overall.hexdigest()
+
+
+class MockState:
+    def __init__(self, profiles=None):
+        self.lock = threading.Lock()
+        self.profiles = {"default": dict(DEFAULT_PROFILE)}
+        for host, profile in (profiles or {}).items():
+            self.profiles[host] = {**self.profiles["default"], **profile}
+
+        self.files = {}        # path_lower -> {"name", "blob", "size", "hash", "id"}
+        self.folders = set()
+        self.journal = []      # (folder, metadata) per change; cursors are offsets into it
+        self.changed = threading.Condition(self.lock)
+        self.longpoll_cap = 2.0  # longpolls answer "no changes" after this many seconds
+        self.temp_links = {}   # token -> path_lower
+        self.containers = {}   # id -> (created monotonic, is_video)
+        self.captions = {}     # container id -> caption/text
+        self.posts = []        # published Graph objects, newest last
+        self.jobs = {}         # async job id -> {"polls", "entries"}
+        self.objects = {}      # uploaded small files (lease locks): path_lower -> {"data", "rev", "path_display"}
+        self.revs = 0
+        self.local_root = None  # served as https://media.bench/ for the local source
+        self.counter = 0
+        self.reset_stats()
+
+    def profile(self, host):
+        return self.profiles.get(host, self.profiles["default"])
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {
+                "bytes_in": {},
+                "bytes_out": {},
+                "requests": {},
+                "injected": {},
+                "batched": {},
+            }
+
+    def count(self, kind, host, amount=1):
+        with self.lock:
+            bucket = self.stats[kind]
+            bucket[host] = bucket.get(host, 0) + amount
+
+    def next_id(self, prefix=""):
+        with self.lock:
+            self.counter += 1
+            return f"{prefix}{self.counter}"
+
+    # ---------------- Dropbox fixtures ----------------
+
+    def add_file(self, folder, name, blob_path):
+        path_lower = f"{folder}/{name}".lower()
+        self.folders.add(folder.lower())
+        self.files[path_lower] = {
+            "name": name,
+            "path_display": f"{folder}/{name}",
+            "blob": blob_path,
+            "size": os.path.getsize(blob_path),
+            "hash": dropbox_content_hash(blob_path),
+            "id": f"id:{self.next_id('f')}",
+        }
+        self.note_change(path_lower)
+
+    def note_change(self, path_lower, deleted=False):
+        """Journal a file added or removed, for cursors and longpolls."""
+        folder = path_lower.rsplit("/", 1)[0]
+        if deleted:
+            name = path_lower.rsplit("/", 1)[-1]
+            meta = {".tag": "deleted", "name": name, "path_lower": path_lower, "path_display": path_lower}
+        else:
+            meta = self.file_meta(path_lower)
+        with self.changed:
+            self.journal.append((folder, meta))
+            self.changed.notify_all()
+
+    def cursor(self, folder):
+        return f"cursor:{folder}:{len(self.journal)}"
+
+    def changes_since(self, cursor):
+        """(folder, [metadata]) recorded after the cursor was handed out."""
+        _, folder, offset = (cursor.split(":") + ["", ""])[:3]
+        offset = int(offset) if offset.isdigit() else len(self.journal)
+        return folder, [meta for f, meta in self.journal[offset:] if f == folder]
+
+    def file_meta(self, path_lower):
+        entry = self.files[path_lower]
+        return {
+            ".tag": "file",
+            "name": entry["name"],
+            "id": entry["id"],
+            "client_modified": "2024-01-01T00:00:00Z",
+            "server_modified": "2024-01-01T00:00:00Z",
+            "rev": "0123456789abcdef",
+            "size": entry["size"],
+            "path_lower": path_lower,
+            "path_display": entry["path_display"],
+            "content_hash": entry["hash"],
+        }
+
+    def object_meta(self, path_lower):
+        entry = self.objects[path_lower]
+        return {
+            ".tag": "file",
+            "name": entry["path_display"].rsplit("/", 1)[-1],
+            "id": f"id:{entry['rev']}",
+            "client_modified": "2024-01-01T00:00:00Z",
+            "server_modified": "2024-01-01T00:00:00Z",
+            "rev": entry["rev"],
+            "size": len(entry["data"]),
+            "path_lower": path_lower,
+            "path_display": entry["path_display"],
+        }
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    chunk = 64 * 1024
+
+    # ---------------- plumbing ----------------
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def _split(self):
+        parts = urlsplit(self.path)
+        segments = parts.path.lstrip("/").split("/", 1)
+        rest = segments[1] if len(segments) > 1 else ""
+        return segments[0], "/" + rest, parse_qs(parts.query)
+
+    def _throttle(self, nbytes, profile):
+        kbps = profile["bandwidth_kbps"]
+        if kbps:
+            time.sleep(nbytes / (kbps * 1024))
+
+    def _read_body(self, host, profile):
+        body = bytearray()
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                data = self.rfile.read(size)
+                self.rfile.readline()
+                self._throttle(len(data), profile)
+                body.extend(data[:4096] if len(body) < 65536 else b"")
+                self.state.count("bytes_in", host, len(data))
+            return bytes(body)
+
+        remaining = int(self.headers.get("Content-Length") or 0)
+        self.state.count("bytes_in", host, remaining)
+        while remaining > 0:
+            data = self.rfile.read(min(self.chunk, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            self._throttle(len(data), profile)
+            # keep only the head of large uploads; handlers never need file bytes
+            if len(body) < 65536:
+                body.extend(data)
+        return bytes(body)
+
+    def _send(self, host, status, payload=b"", headers=None, content_type="application/json"):
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        self.state.count("bytes_out", host, len(payload))
+
+    def _send_file(self, host, profile, blob, headers):
+        size = os.path.getsize(blob)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        with open(blob, "rb") as f:
+            while True:
+                data = f.read(self.chunk)
+                if not data:
+                    break
+                self._throttle(len(data), profile)
+                self.wfile.write(data)
+        self.state.count("bytes_out", host, size)
+
+    def _inject(self, host, profile):
+        roll = random.random()
+        if roll < profile["rate_429"]:
+            self.state.count("injected", f"{host}:429")
+            retry_after = profile["retry_after"]
+            payload = {"retry_after": retry_after, "global": False,
+                       "ok": False, "error_code": 429,
+                       "parameters": {"retry_after": retry_after}}
+            headers = {"Retry-After": str(retry_after)}
+            if host == "discord.com":
+                headers.update({
+                    "X-RateLimit-Bucket": "mock-bucket",
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset-After": str(retry_after),
+                })
+            self._send(host, 429, payload, headers)
+            return True
+
+        if roll < profile["rate_429"] + profile["rate_5xx"]:
+            self.state.count("injected", f"{host}:503")
+            self._send(host, 503, {"error": "injected 503"})
+            return True
+
+        return False
+
+    def _handle(self, method):
+        host, path, query = self._split()
+        profile = self.state.profile(host)
+        self.state.count("requests", host)
+
+        body = self._read_body(host, profile) if method == "POST" else b""
+
+        if profile["latency_ms"]:
+            time.sleep(profile["latency_ms"] / 1000)
+
+        if self._inject(host, profile):
+            return
+
+        route = ROUTES.get(host)
+        if route is None:
+            self._send(host, 404, {"error": f"unknown host {host}"})
+            return
+
+        route(self, host, profile, method, path, query, body)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    # ---------------- helpers for routes ----------------
+
+    def form(self, body):
+        content_type = self.headers.get("Content-Type", "")
+        if "json" in content_type:
+            try:
+                return json.loads(body or b"{}")
+            except ValueError:
+                return {}
+        if "urlencoded" in content_type:
+            return {k: v[0] for k, v in parse_qs(body.decode("utf-8", "ignore")).items()}
+        if "multipart/form-data" in content_type and "boundary=" in content_type:
+            # Plain fields only; they precede the (truncated) file parts
+            boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+            fields = {}
+            for part in body.split(b"--" + boundary):
+                head, _, value = part.partition(b"\r\n\r\n")
+                match = re.search(rb'name="([^"]+)"', head)
+                if match and b"filename=" not in head:
+                    fields[match.group(1).decode()] = value[:-2].decode("utf-8", "ignore")
+            return fields
+        return {}
+
+    def container_status(self, container_id, profile):
+        if container_id not in self.state.containers:
+            return "ERROR"
+        created, is_video = self.state.containers[container_id]
+        if is_video and time.monotonic() - created < profile["transcode_s"]:
+            return "IN_PROGRESS"
+        return "FINISHED"
+
+    def publish(self, host, profile, owner, edge, text_field, text, prefix):
+        """Record a published object; a lost ack still records it."""
+        post = {
+            "id": self.state.next_id(prefix),
+            "owner": owner,
+            "edge": edge,
+            text_field: text,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S+0000", time.gmtime()),
+        }
+        with self.state.lock:
+            self.state.posts.append(post)
+
+        if random.random() < profile["rate_lost"]:
+            self.state.count("injected", f"{host}:lost")
+            self._send(host, 503, {"error": {"message": "injected lost ack"}})
+            return None
+        return post["id"]
+
+    def delete_entry(self, path_lower):
+        state = self.state
+        if path_lower not in state.files:
+            return {".tag": "failure", "failure": {".tag": "path_lookup", "path_lookup": {".tag": "not_found"}}}
+        meta = state.file_meta(path_lower)
+        del state.files[path_lower]
+        state.note_change(path_lower, deleted=True)
+        return {".tag": "success", "metadata": meta}
+
+    def move_entry(self, src, dst):
+        state = self.state
+        if src not in state.files:
+            return {".tag": "failure", "failure": {".tag": "relocation_error", "relocation_error": {".tag": "from_lookup", "from_lookup": {".tag": "not_found"}}}}
+        entry = state.files.pop(src)
+        entry["name"] = dst.rsplit("/", 1)[-1]
+        entry["path_display"] = dst
+        state.files[dst.lower()] = entry
+        state.note_change(src, deleted=True)
+        state.note_change(dst.lower())
+        return {".tag": "success", "success": state.file_meta(dst.lower())}
+
+
+# =====================================================
+# ROUTES (one function per mocked host family)
+# =====================================================
+
+def _dropbox_api(h, host, profile, method, path, query, body):
+    state = h.state
+    args = h.form(body)
+
+    if path == "/oauth2/token":
+        h._send(host, 200, {"access_token": "mock", "expires_in": 14400, "token_type": "bearer"})
+        return
+
+    if path == "/2/files/list_folder":
+        folder = str(args.get("path", "")).lower().rstrip("/")
+        entries = [
+            state.file_meta(p) for p in sorted(state.files)
+            if p.rsplit("/", 1)[0] == folder
+        ]
+        h._send(host, 200, {"entries": entries, "cursor": state.cursor(folder), "has_more": False})
+        return
+
+    if path == "/2/files/list_folder/continue":
+        folder, entries = state.changes_since(str(args.get("cursor", "")))
+        h._send(host, 200, {"entries": entries, "cursor": state.cursor(folder), "has_more": False})
+        return
+
+    if path == "/2/files/get_temporary_link":
+        path_lower = str(args.get("path", "")).lower()
+        if path_lower not in state.files:
+            h._send(host, 409, {"error_summary": "path/not_found/", "error": {".tag": "path", "path": {".tag": "not_found"}}})
+            return
+        token = state.next_id("t")
+        state.temp_links[token] = path_lower
+        port = h.server.server_address[1]
+        link = f"http://127.0.0.1:{port}/dl.dropboxusercontent.com/temp/{token}"
+        h._send(host, 200, {"metadata": state.file_meta(path_lower), "link": link})
+        return
+
+    if path == "/2/files/delete_v2" and str(args.get("path", "")).lower() in state.objects:
+        path_lower = str(args.get("path", "")).lower()
+        with state.lock:
+            entry = state.objects[path_lower]
+            if args.get("parent_rev") and args["parent_rev"] != entry["rev"]:
+                conflict = True
+            else:
+                conflict = False
+                meta = state.object_meta(path_lower)
+                del state.objects[path_lower]
+        if conflict:
+            h._send(host, 409, {"error_summary": "path_write/conflict/file/", "error": {".tag": "path_write", "path_write": {".tag": "conflict", "conflict": {".tag": "file"}}}})
+            return
+        h._send(host, 200, {"metadata": meta})
+        return
+
+    if path == "/2/files/delete_v2":
+        path_lower = str(args.get("path", "")).lower()
+        if path_lower not in state.files:
+            h._send(host, 409, {"error_summary": "path_lookup/not_found/", "error": {".tag": "path_lookup", "path_lookup": {".tag": "not_found"}}})
+            return
+        meta = state.file_meta(path_lower)
+        del state.files[path_lower]
+        state.note_change(path_lower, deleted=True)
+        h._send(host, 200, {"metadata": meta})
+        return
+
+    if path in ("/2/files/delete_batch", "/2/files/move_batch_v2"):
+        # Applied right away, reported through an async job that needs one
+        # in_progress poll, like Dropbox does for anything non-trivial.
+        entries = []
+        for entry in args.get("entries", []):
+            if path == "/2/files/delete_batch":
+                entries.append(h.delete_entry(str(entry.get("path", "")).lower()))
+            else:
+                entries.append(h.move_entry(str(entry.get("from_path", "")).lower(), str(entry.get("to_path", ""))))
+        job_id = state.next_id("job")
+        state.jobs[job_id] = {"polls": 0, "entries": entries}
+        h._send(host, 200, {".tag": "async_job_id", "async_job_id": job_id})
+        return
+
+    if path in ("/2/files/delete_batch/check", "/2/files/move_batch/check_v2"):
+        job = state.jobs.get(str(args.get("async_job_id", "")))
+        if job is None:
+            h._send(host, 409, {"error_summary": "invalid_async_job_id/", "error": {".tag": "invalid_async_job_id"}})
+            return
+        job["polls"] += 1
+        if job["polls"] < 2:
+            h._send(host, 200, {".tag": "in_progress"})
+            return
+        h._send(host, 200, {".tag": "complete", "entries": job["entries"]})
+        return
+
+    if path == "/2/files/create_folder_v2":
+        folder = str(args.get("path", "")).lower()
+        if folder in state.folders:
+            h._send(host, 409, {"error_summary": "path/conflict/folder/", "error": {".tag": "path", "path": {".tag": "conflict", "conflict": {".tag": "folder"}}}})
+            return
+        state.folders.add(folder)
+        name = folder.rsplit("/", 1)[-1]
+        h._send(host, 200, {"metadata": {"name": name, "id": f"id:{state.next_id('d')}", "path_lower": folder, "path_display": folder}})
+        return
+
+    if path == "/2/files/move_v2":
+        src = str(args.get("from_path", "")).lower()
+        dst = str(args.get("to_path", ""))
+        if src not in state.files:
+            h._send(host, 409, {"error_summary": "from_lookup/not_found/", "error": {".tag": "from_lookup", "from_lookup": {".tag": "not_found"}}})
+            return
+        entry = state.files.pop(src)
+        entry["name"] = dst.rsplit("/", 1)[-1]
+        entry["path_display"] = dst
+        state.files[dst.lower()] = entry
+        state.note_change(src, deleted=True)
+        state.note_change(dst.lower())
+        h._send(host, 200, {"metadata": state.file_meta(dst.lower())})
+        return
+
+    h._send(host, 404, {"error_summary": f"unsupported route {path}"})
+
+
+def _dropbox_notify(h, host, profile, method, path, query, body):
+    state = h.state
+    args = h.form(body)
+    cursor = str(args.get("cursor", ""))
+    timeout = min(float(args.get("timeout", 30)), state.longpoll_cap)
+    with state.changed:
+        changes = state.changed.wait_for(lambda: state.changes_since(cursor)[1], timeout=timeout)
+    h._send(host, 200, {"changes": bool(changes)})
+
+
+def _dropbox_content(h, host, profile, method, path, query, body):
+    state = h.state
+
+    if path == "/2/files/upload":
+        # Small files only (lease locks); add/update modes are compare-and-swap
+        args = json.loads(h.headers.get("Dropbox-API-Arg") or "{}")
+        path_lower = str(args.get("path", "")).lower()
+        mode = args.get("mode", "add")
+        tag = mode if isinstance(mode, str) else mode.get(".tag")
+        with state.lock:
+            current = state.objects.get(path_lower)
+            if (tag == "add" and current) or (
+                    tag == "update" and (current is None or current["rev"] != mode.get("update"))):
+                meta = None
+            else:
+                state.revs += 1
+                state.objects[path_lower] = {"data": body, "rev": f"{state.revs:012x}",
+                                             "path_display": args.get("path", "")}
+                meta = state.object_meta(path_lower)
+        if meta is None:
+            h._send(host, 409, {"error_summary": "path/conflict/file/", "error": {".tag": "path", "reason": {".tag": "conflict", "conflict": {".tag": "file"}}, "upload_session_id": "mock"}})
+            return
+        h._send(host, 200, meta)
+        return
+
+    if path == "/2/files/download":
+        args = json.loads(h.headers.get("Dropbox-API-Arg") or "{}")
+        path_lower = str(args.get("path", "")).lower()
+        with state.lock:
+            entry = state.objects.get(path_lower)
+            meta = json.dumps(state.object_meta(path_lower)) if entry else None
+        if entry is not None:
+            h._send(host, 200, entry["data"], {"Dropbox-API-Result": meta}, content_type="application/octet-stream")
+            return
+        if path_lower not in state.files:
+            h._send(host, 409, {"error_summary": "path/not_found/", "error": {".tag": "path", "path": {".tag": "not_found"}}})
+            return
+        meta = json.dumps(state.file_meta(path_lower))
+        h._send_file(host, profile, state.files[path_lower]["blob"], {"Dropbox-API-Result": meta})
+        return
+
+    h._send(host, 404, {"error_summary": f"unsupported route {path}"})
+
+
+def _dropbox_temp(h, host, profile, method, path, query, body):
+    token = path.rsplit("/", 1)[-1]
+    path_lower = h.state.temp_links.get(token)
+    if path_lower not in h.state.files:
+        h._send(host, 404, b"gone", content_type="text/plain")
+        return
+    h._send_file(host, profile, h.state.files[path_lower]["blob"], {})
+
+
+def _local_media(h, host, profile, method, path, query, body):
+    # public_base_url of the local source: files served straight from its root
+    local_path = os.path.join(h.state.local_root or "", unquote(path).lstrip("/"))
+    if not h.state.local_root or not os.path.isfile(local_path):
+        h._send(host, 404, b"gone", content_type="text/plain")
+        return
+    h._send_file(host, profile, local_path, {})
+
+
+def _groq(h, host, profile, method, path, query, body):
+    try:
+        prompt = json.loads(body or b"{}").get("messages", [{}])[-1].get("content", "")
+    except ValueError:
+        prompt = ""
+    # prompts quote the cleaned filename: "... titled 'sunset walk'. ..."
+    quoted = prompt.split("'")
+    words = (quoted[1] if len(quoted) >= 3 else "mock").lower().split()
+    tags = " ".join(f"#{w}" for w in words[:4] if w)
+    content = f"A mock caption for {' '.join(words)}. {tags}"
+    h._send(host, 200, {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "llama-3.1-8b-instant",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 20, "total_tokens": 30},
+    })
+
+
+class _Captured:
+    """A handler stand-in for one call of a Graph batch: keeps the response."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.response = (500, {"error": {"message": "no response"}})
+
+    def __getattr__(self, name):
+        attr = getattr(type(self.handler), name, None)
+        if callable(attr):
+            return attr.__get__(self)
+        return getattr(self.handler, name)
+
+    def _send(self, host, status, payload=b"", headers=None, content_type="application/json"):
+        self.response = (status, payload)
+
+
+def _graph_batch(h, host, profile, calls):
+    results = []
+    for call in calls:
+        parts = urlsplit("/" + call["relative_url"].lstrip("/"))
+        captured = _Captured(h)
+        _graph(captured, host, profile, call["method"].upper(), parts.path,
+               parse_qs(parts.query), call.get("body", "").encode())
+        status, payload = captured.response
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload)
+        elif isinstance(payload, bytes):
+            payload = payload.decode()
+        results.append({"code": status, "body": payload})
+    h.state.count("batched", host, len(calls))
+    h._send(host, 200, results)
+
+
+def _graph(h, host, profile, method, path, query, body):
+    state = h.state
+    args = h.form(body)
+    segments = [s for s in path.split("/") if s]
+
+    if method == "POST" and not segments and "batch" in args:
+        _graph_batch(h, host, profile, json.loads(args["batch"]))
+        return
+
+    # /v18.0/<id>/<edge>  or  /v1.0/<id>/<edge>
+    edge = segments[2] if len(segments) > 2 else None
+    object_id = segments[1] if len(segments) > 1 else None
+
+    if method == "POST" and edge in ("media", "threads"):
+        container_id = state.next_id("c")
+        is_video = str(args.get("media_type", "")).upper() in ("VIDEO", "REELS")
+        state.containers[container_id] = (time.monotonic(), is_video)
+        state.captions[container_id] = args.get("caption", args.get("text", ""))
+        h._send(host, 200, {"id": container_id})
+        return
+
+    if method == "POST" and edge in ("media_publish", "threads_publish"):
+        creation_id = str(args.get("creation_id", ""))
+        if h.container_status(creation_id, profile) != "FINISHED":
+            h._send(host, 400, {"error": {"message": "Media ID is not available", "code": 9007}})
+            return
+        listing = edge.replace("_publish", "")
+        text_field = "caption" if listing == "media" else "text"
+        media_id = h.publish(host, profile, object_id, listing, text_field,
+                             state.captions.get(creation_id, ""), "m")
+        if media_id:
+            h._send(host, 200, {"id": media_id})
+        return
+
+    if method == "POST" and edge == "videos":
+        video_id = h.publish(host, profile, object_id, "videos", "description",
+                             args.get("description", ""), "v")
+        if video_id:
+            h._send(host, 200, {"id": video_id})
+        return
+
+    if method == "POST" and edge == "photos":
+        if str(args.get("published", "true")) == "false":
+            h._send(host, 200, {"id": state.next_id("p")})
+            return
+        photo_id = h.publish(host, profile, object_id, "posts", "message",
+                             args.get("message", ""), "p")
+        if photo_id:
+            h._send(host, 200, {"id": photo_id, "post_id": f"{object_id}_{photo_id}"})
+        return
+
+    if method == "POST" and edge == "feed":
+        post_id = h.publish(host, profile, object_id, "posts", "message",
+                            args.get("message", ""), "f")
+        if post_id:
+            h._send(host, 200, {"id": f"{object_id}_{post_id}"})
+        return
+
+    if method == "GET" and edge == "content_publishing_limit":
+        since = time.strftime("%Y-%m-%dT%H:%M:%S+0000", time.gmtime(time.time() - 86400))
+        with state.lock:
+            used = sum(1 for p in state.posts
+                       if p["owner"] == object_id and p["edge"] == "media" and p["timestamp"] > since)
+        h._send(host, 200, {"data": [{"quota_usage": used,
+                                      "config": {"quota_total": profile.get("quota_total", 50),
+                                                 "quota_duration": 86400}}]})
+        return
+
+    if method == "GET" and edge in ("media", "threads", "videos", "posts"):
+        with state.lock:
+            data = [p for p in reversed(state.posts) if p["owner"] == object_id and p["edge"] == edge]
+        limit = int(query.get("limit", ["25"])[0])
+        h._send(host, 200, {"data": data[:limit]})
+        return
+
+    if method == "GET" and edge is None and object_id in state.containers:
+        status = h.container_status(object_id, profile)
+        h._send(host, 200, {"id": object_id, "status_code": status, "status": status})
+        return
+
+    h._send(host, 404, {"error": {"message": f"unsupported route {method} {path}"}})
+
+
+def _telegram(h, host, profile, method, path, query, body):
+    h._send(host, 200, {"ok": True, "result": {"message_id": int(h.state.next_id())}})
+
+
+def _discord(h, host, profile, method, path, query, body):
+    h._send(host, 200, {"id": h.state.next_id(), "channel_id": "mock"}, headers={
+        "X-RateLimit-Bucket": "mock-bucket",
+        "X-RateLimit-Limit": "5",
+        "X-RateLimit-Remaining": "4",
+        "X-RateLimit-Reset-After": "1.0",
+    })
+
+
+def _twitter(h, host, profile, method, path, query, body):
+    state = h.state
+
+    if path.startswith("/2/tweets"):
+        h._send(host, 201, {"data": {"id": state.next_id(), "text": "mock"}})
+        return
+
+    if path.startswith("/1.1/media/upload"):
+        command = h.form(body).get("command") or query.get("command", [None])[0]
+        if command is None and b'name="command"' in body:
+            command = body.split(b'name="command"', 1)[1].split(b"\r\n\r\n", 1)[1].split(b"\r\n", 1)[0].decode()
+
+        if command == "APPEND":
+            h.send_response(204)
+            h.send_header("Content-Length", "0")
+            h.end_headers()
+            return
+
+        media_id = int(state.next_id())
+        h._send(host, 200, {"media_id": media_id, "media_id_string": str(media_id), "expires_after_secs": 86400})
+        return
+
+    h._send(host, 404, {"errors": [{"message": f"unsupported route {path}"}]})
+
+
+def _tumblr(h, host, profile, method, path, query, body):
+    if path == "/v2/user/limits":
+        bucket = {"limit": 250, "remaining": 250, "reset_at": int(time.time()) + 86400}
+        h._send(host, 200, {"meta": {"status": 200, "msg": "OK"}, "response": {"user": {
+            "posts": bucket, "photos": dict(bucket), "videos": dict(bucket),
+        }}})
+        return
+
+    # legacy /post and NPF /posts
+    h._send(host, 201, {"meta": {"status": 201, "msg": "Created"},
+                        "response": {"id": h.state.next_id(), "state": "published"}})
+
+
+ROUTES = {
+    "api.dropboxapi.com": _dropbox_api,
+    "content.dropboxapi.com": _dropbox_content,
+    "notify.dropboxapi.com": _dropbox_notify,
+    "dl.dropboxusercontent.com": _dropbox_temp,
+    "api.groq.com": _groq,
+    "graph.facebook.com": _graph,
+    "graph.threads.net": _graph,
+    "api.telegram.org": _telegram,
+    "discord.com": _discord,
+    "api.twitter.com": _twitter,
+    "upload.twitter.com": _twitter,
+    "api.tumblr.com": _tumblr,
+    "media.bench": _local_media,
+}
+
+
+class MockCloud:
+    """
+    Threaded local stand-in for every remote the pipeline uses.
+    Usage:
+        cloud = MockCloud(profiles={"graph.facebook.com": {"transcode_s": 3}})
+        cloud.start(); ...; cloud.stop()
+    """
+
+    def __init__(self, profiles=None, port=0):
+        self.state = MockState(profiles)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,334 @@
+"""
+Offline end-to-end benchmark for main.main().
+
+Every HTTP call the pipeline makes (Dropbox, Groq, Graph, Threads,
+Telegram, Discord, Twitter, Tumblr) is redirected to a local MockCloud,
+so nothing is ever posted for real. Each scenario runs in a fresh worker
+process so peak RSS is per scenario.
+
+    python -m bench.run_bench --sizes 1,20,100 --mixes all,meta,files
+    python -m bench.run_bench --sizes 50 --mixes all --bandwidth-kbps 20000 \\
+        --rate-429 0.05 --rate-5xx 0.05 --transcode-s 8 --output bench_output.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit, urlunsplit
+
+from bench.mock_servers import MOCK_HOSTS, MockCloud
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLATFORM_MIXES = {
+    "all": ["instagram", "facebook", "threads", "twitter", "telegram", "discord", "tumblr"],
+    "meta": ["instagram", "facebook", "threads"],
+    "files": ["twitter", "telegram", "discord", "tumblr"],
+}
+
+FAKE_ENV = {
+    "GROQ_API_KEY": "mock",
+    "META_TOKEN": "mock",
+    "IG_ID": "1001",
+    "FB_PAGE_ID": "1002",
+    "THREADS_USER_ID": "1003",
+    "THREADS_ACCESS_TOKEN": "mock",
+    "TELEGRAM_POST_BOT_TOKEN": "123:mock",
+    "TELEGRAM_POST_CHAT_ID": "-100",
+    "DROPBOX_APP_KEY": "mock",
+    "DROPBOX_APP_SECRET": "mock",
+    "DROPBOX_REFRESH_TOKEN": "mock",
+    "TWITTER_API_KEY": "mock",
+    "TWITTER_API_SECRET": "mock",
+    "TWITTER_ACCESS_TOKEN": "mock",
+    "TWITTER_ACCESS_TOKEN_SECRET": "mock",
+    "TUMBLR_CONSUMER_KEY": "mock",
+    "TUMBLR_CONSUMER_SECRET": "mock",
+    "TUMBLR_OAUTH_TOKEN": "mock",
+    "TUMBLR_OAUTH_TOKEN_SECRET": "mock",
+    "TUMBLR_BLOG_NAME": "mockblog",
+    "DISCORD_BOT_TOKEN": "mock",
+    "DISCORD_CHANNEL_ID": "2001",
+}
+
+
+# =====================================================
+# WORKER SIDE (runs inside the scenario subprocess)
+# =====================================================
+
+def _install_redirect(mock_url):
+    """Route every requests-based client to the mock; refuse anything else."""
+    import requests.adapters
+
+    mock = urlsplit(mock_url)
+    original_send = requests.adapters.HTTPAdapter.send
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        if parts.hostname == mock.hostname and parts.port == mock.port:
+            return original_send(self, request, **kwargs)
+        if parts.hostname not in MOCK_HOSTS:
+            raise requests.exceptions.ConnectionError(
+                f"bench: refusing real network call to {parts.hostname}"
+            )
+        request.url = urlunsplit(
+            ("http", mock.netloc, f"/{parts.hostname}{parts.path}", parts.query, "")
+        )
+        return original_send(self, request, **kwargs)
+
+    requests.adapters.HTTPAdapter.send = send
+
+
+def _instrument_sleep(stages, sleep_scale):
+    """
+    Sleeps (polling, backoff, post_delay) are reported separately; they
+    overlap with the span that issued them.
+    """
+    real_sleep = time.sleep
+
+    def sleep(seconds):
+        stages["sleep (overlaps)"]["calls"] += 1
+        stages["sleep (overlaps)"]["seconds"] += seconds
+        real_sleep(seconds * sleep_scale)
+
+    time.sleep = sleep
+
+
+def run_worker(workdir, mock_url, sleep_scale):
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+
+    _install_redirect(mock_url)
+
+    stages = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "bytes": 0})
+    started = time.perf_counter()
+
+    import_started = time.perf_counter()
+    import main
+    stages["import"]["calls"] += 1
+    stages["import"]["seconds"] += time.perf_counter() - import_started
+
+    _instrument_sleep(stages, sleep_scale)
+
+    exit_code = 0
+    try:
+        main.main([])
+    except SystemExit as e:
+        exit_code = e.code or 0
+
+    # Per-stage timings come from the pipeline's own tracing spans
+    from core.tracing import TRACER
+
+    for (name, platform), data in TRACER.summary().items():
+        label = f"{name}[{platform}]" if platform else name
+        stages[label].update(calls=data["calls"], seconds=data["seconds"], bytes=data["bytes"])
+
+    result = {
+        "exit_code": exit_code,
+        "wall_seconds": time.perf_counter() - started,
+        # Uploads run in supervised workers: their peak counts too
+        "peak_rss_mb": max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                           resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024,
+        "worker_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        "stages": dict(stages),
+        "results": {k: dict(v) for k, v in main.PLATFORM_RESULTS.items()},
+    }
+    with open(os.path.join(workdir, "bench_result.json"), "w") as f:
+        json.dump(result, f)
+
+
+# =====================================================
+# DRIVER SIDE
+# =====================================================
+
+def _make_blob(path, size_mb):
+    chunk = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(max(1, int(size_mb))):
+            f.write(chunk)
+
+
+def _write_config(workdir, platforms, images, source="dropbox", parallel=1, upload_mbit=None):
+    with open(os.path.join(REPO_ROOT, "config.json")) as f:
+        config = json.load(f)
+
+    for name, conf in config["platforms"].items():
+        conf["enabled"] = name in platforms
+        # Albums are opt-in in config.json; the bench posts several images as one
+        conf["album"] = images > 1
+
+    config["settings"]["post_delay"] = 0
+    config["settings"]["images_per_run"] = images
+    config["settings"]["parallel_uploads"] = parallel
+    config["settings"].setdefault("upload", {})["max_mbit"] = upload_mbit
+
+    config["source"] = {"backend": source}
+    config["local"] = {
+        "root": "media",
+        "folder_video_ig": "instagram",
+        "folder_video_general": "facebook",
+        "folder_images": "images",
+        "failed_folder": "media/failed",
+        "public_base_url": "https://media.bench",
+        "settle_seconds": 0,
+    }
+
+    with open(os.path.join(workdir, "config.json"), "w") as f:
+        json.dump(config, f, indent=2)
+
+
+def run_scenario(args, size_mb, mix):
+    profile = {
+        "latency_ms": args.latency_ms,
+        "bandwidth_kbps": args.bandwidth_kbps,
+        "rate_429": args.rate_429,
+        "rate_5xx": args.rate_5xx,
+        "transcode_s": args.transcode_s,
+        "rate_lost": args.rate_lost,
+    }
+    # Dropbox and Groq stay clean unless asked; faults target the platforms.
+    clean = {"rate_429": 0.0, "rate_5xx": 0.0, "rate_lost": 0.0}
+    profiles = {"default": profile}
+    if not args.fault_dropbox:
+        for host in ("api.dropboxapi.com", "content.dropboxapi.com", "dl.dropboxusercontent.com", "api.groq.com"):
+            profiles[host] = {**profile, **clean}
+
+    cloud = MockCloud(profiles=profiles).start()
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        blob_video = os.path.join(workdir, "blob_video.mp4")
+        blob_image = os.path.join(workdir, "blob_image.jpg")
+        _make_blob(blob_video, size_mb)
+        _make_blob(blob_image, min(size_mb, args.image_mb))
+
+        queued = [("instagram", "golden_hour_reel.mp4", blob_video),
+                  ("facebook", "city_lights_story.mp4", blob_video)]
+        queued += [("images", f"morning_coffee_{i + 1}.jpg", blob_image) for i in range(args.images)]
+
+        if args.source == "local":
+            cloud.state.local_root = os.path.join(workdir, "media")
+            for folder, name, blob in queued:
+                os.makedirs(os.path.join(workdir, "media", folder), exist_ok=True)
+                shutil.copyfile(blob, os.path.join(workdir, "media", folder, name))
+        else:
+            for folder, name, blob in queued:
+                cloud.state.add_file(f"/{folder}", name, blob)
+
+        _write_config(workdir, PLATFORM_MIXES[mix], args.images, args.source,
+                      args.parallel, args.upload_mbit)
+
+        env = {k: v for k, v in os.environ.items() if not k.startswith("TELEGRAM_LOG_")}
+        env.update(FAKE_ENV)
+        env["GROQ_BASE_URL"] = f"{cloud.url}/api.groq.com"
+        env["PYTHONPATH"] = REPO_ROOT
+
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-m", "bench.run_bench", "--worker", workdir,
+             "--mock-url", cloud.url, "--sleep-scale", str(args.sleep_scale)],
+            cwd=REPO_ROOT, env=env,
+            stdout=subprocess.DEVNULL if not args.verbose else None,
+            stderr=subprocess.DEVNULL if not args.verbose else None,
+        )
+        elapsed = time.perf_counter() - started
+
+        result_path = os.path.join(workdir, "bench_result.json")
+        if os.path.exists(result_path):
+            with open(result_path) as f:
+                result = json.load(f)
+        else:
+            result = {"error": f"worker exited with {proc.returncode}"}
+
+    result.update({
+        "size_mb": size_mb,
+        "mix": mix,
+        "process_seconds": elapsed,
+        "traffic": cloud.state.snapshot(),
+    })
+    cloud.stop()
+    return result
+
+
+def _print_report(results):
+    for r in results:
+        print("=" * 60)
+        print(f"SCENARIO size={r['size_mb']}MB mix={r['mix']}")
+        print("-" * 60)
+        if "error" in r:
+            print(f"  ERROR: {r['error']}")
+            continue
+
+        print(f"  Wall time   : {r['wall_seconds']:.2f}s (process {r['process_seconds']:.2f}s)")
+        print(f"  Peak RSS    : {r['peak_rss_mb']:.1f} MB (largest worker {r.get('worker_rss_mb', 0):.1f} MB)")
+        up = sum(r["traffic"]["bytes_in"].values()) / (1024 * 1024)
+        down = sum(r["traffic"]["bytes_out"].values()) / (1024 * 1024)
+        print(f"  Bytes moved : up {up:.1f} MB | down {down:.1f} MB")
+        injected = r["traffic"]["injected"]
+        if injected:
+            print(f"  Injected    : {injected}")
+        batched = r["traffic"].get("batched")
+        if batched:
+            print(f"  Batched     : {batched} calls in Graph batch requests")
+        print("  Stages:")
+        for stage, data in sorted(r["stages"].items(), key=lambda kv: -kv[1]["seconds"]):
+            moved = f"  {data['bytes'] / (1024 * 1024):.1f} MB" if data.get("bytes") else ""
+            print(f"    {stage:34} {data['seconds']:8.2f}s  x{data['calls']}{moved}")
+        print("  Results:")
+        for name, data in sorted(r["results"].items()):
+            print(f"    {name:10} S:{data['success']} F:{data['failed']} SK:{data['skipped']}")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark")
+    parser.add_argument("--sizes", default="1,20", help="video sizes in MB, comma separated")
+    parser.add_argument("--mixes", default="all", help=f"platform mixes: {','.join(PLATFORM_MIXES)}")
+    parser.add_argument("--image-mb", type=float, default=2, help="cap for the image fixture size")
+    parser.add_argument("--images", type=int, default=1, help="queued images (sets images_per_run)")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--bandwidth-kbps", type=float, default=0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--transcode-s", type=float, default=0.0)
+    parser.add_argument("--rate-lost", type=float, default=0.0,
+                        help="Graph posts applied but answered with a 503")
+    parser.add_argument("--source", default="dropbox", choices=("dropbox", "local"),
+                        help="queue the fixtures in the mock Dropbox or a local directory")
+    parser.add_argument("--parallel", type=int, default=1, help="settings.parallel_uploads")
+    parser.add_argument("--upload-mbit", type=float, help="settings.upload.max_mbit (governor cap)")
+    parser.add_argument("--fault-dropbox", action="store_true", help="also inject faults into Dropbox/Groq")
+    parser.add_argument("--sleep-scale", type=float, default=1.0,
+                        help="multiply real sleeps (polling/backoff); reported sleep time is unscaled")
+    parser.add_argument("--output", help="write raw results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show worker logs")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--mock-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.mock_url, args.sleep_scale)
+        return
+
+    results = [
+        run_scenario(args, float(size), mix)
+        for size in args.sizes.split(",")
+        for mix in args.mixes.split(",")
+    ]
+
+    _print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
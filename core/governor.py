@@ -0,0 +1,252 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+import zlib
+from contextlib import contextmanager
+
+# Shared tables are sized up front: they are created before any worker
+# forks and cannot grow afterwards.
+MAX_TRANSFERS = 32
+HOST_SLOTS = 64
+RATE_WINDOW = 8  # seconds of history behind throughput()
+
+# Transfer row fields
+ACTIVE, PID, HOST, TOTAL, SENT, DEADLINE, WAITING = range(7)
+ROW = 7
+
+
+class Transfer:
+    """One governed upload; MultipartStream calls consume() per read."""
+
+    def __init__(self, governor, row, host):
+        self.governor = governor
+        self.row = row
+        self.host = host
+
+    def consume(self, nbytes):
+        self.governor._consume(self.row, nbytes)
+
+    def rewind(self):
+        self.governor._set(self.row, SENT, 0)
+
+    def close(self):
+        if self.row is not None:
+            self.governor._close(self.row, self.host)
+            self.row = None
+
+
+class UploadGovernor:
+    """
+    Caps the bandwidth and per-host connections of all uploads, across
+    threads and the supervisor's forked workers.
+
+    Every streamed upload opens a Transfer first. It holds one of its
+    host's connection slots until closed, and each chunk it sends draws
+    from one token bucket refilled at `max_bps`. When the bucket runs dry,
+    the waiting transfer with the least time to go gets the next tokens.
+    That is the smaller of its time to deadline and its remaining bytes at
+    full rate, so nearly finished uploads and tight deadlines go first
+    and no transfer crawls into its timeout.
+
+    State lives in shared memory created by configure(), which main calls
+    before any worker forks. A killed worker's transfer is reclaimed the
+    next time someone waits.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.configure()
+
+    def configure(self, max_bps=None, per_host=2, hosts=None, burst_seconds=0.25):
+        self.max_bps = float(max_bps) if max_bps else None
+        self.per_host = per_host
+        self.host_limits = dict(hosts or {})
+        self.burst = (self.max_bps or 0) * burst_seconds
+        self.deadline = None  # absolute monotonic deadline of this process's work
+
+        self._lock = multiprocessing.Lock()
+        self._rows = multiprocessing.RawArray("d", MAX_TRANSFERS * ROW)
+        self._hosts = multiprocessing.RawArray("i", HOST_SLOTS)
+        # tokens, last refill; then per-second byte counts and their stamps
+        self._bucket = multiprocessing.RawArray("d", 2)
+        self._rate_bytes = multiprocessing.RawArray("d", RATE_WINDOW)
+        self._rate_stamp = multiprocessing.RawArray("d", RATE_WINDOW)
+        self._bucket[0] = self.burst
+        self._bucket[1] = time.monotonic()
+        return self
+
+    @contextmanager
+    def _locked(self):
+        # A worker killed inside the lock would wedge every other process:
+        # the supervisor's SIGTERM waits until the lock is released.
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTERM})
+        self._lock.acquire()
+        try:
+            yield
+        finally:
+            self._lock.release()
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+
+    def set_deadline(self, seconds):
+        """Deadline for uploads started from now on (the supervisor's)."""
+        self.deadline = time.monotonic() + seconds if seconds else None
+
+    # =====================================================
+    # TRANSFERS
+    # =====================================================
+
+    def open(self, host, total):
+        """Wait for a connection slot on `host`; returns the Transfer."""
+        slot = zlib.crc32(host.encode("utf-8")) % HOST_SLOTS
+        limit = self.host_limits.get(host, self.per_host)
+        waited = False
+
+        while True:
+            with self._locked():
+                row = self._free_row()
+                if row is not None and (limit <= 0 or self._hosts[slot] < limit):
+                    self._hosts[slot] += 1
+                    base = row * ROW
+                    self._rows[base + ACTIVE] = 1
+                    self._rows[base + PID] = os.getpid()
+                    self._rows[base + HOST] = slot
+                    self._rows[base + TOTAL] = total
+                    self._rows[base + SENT] = 0
+                    self._rows[base + DEADLINE] = self.deadline or 0
+                    self._rows[base + WAITING] = 0
+                    return Transfer(self, row, slot)
+                self._reap()
+
+            if not waited:
+                self.logger.info(f"   ⏳ Waiting for an upload slot on {host}")
+                waited = True
+            time.sleep(0.05)
+
+    def _free_row(self):
+        for row in range(MAX_TRANSFERS):
+            if not self._rows[row * ROW + ACTIVE]:
+                return row
+        return None
+
+    def _reap(self):
+        # Rows left behind by workers the supervisor killed
+        for row in range(MAX_TRANSFERS):
+            base = row * ROW
+            if self._rows[base + ACTIVE] and not _alive(int(self._rows[base + PID])):
+                self._release(row, int(self._rows[base + HOST]))
+
+    def _release(self, row, slot):
+        self._rows[row * ROW + ACTIVE] = 0
+        self._rows[row * ROW + WAITING] = 0
+        self._hosts[slot] = max(0, self._hosts[slot] - 1)
+
+    def _close(self, row, slot):
+        with self._locked():
+            if self._rows[row * ROW + PID] == os.getpid():
+                self._release(row, slot)
+
+    def _set(self, row, field, value):
+        with self._locked():
+            self._rows[row * ROW + field] = value
+
+    # =====================================================
+    # BANDWIDTH
+    # =====================================================
+
+    def _consume(self, row, nbytes):
+        base = row * ROW
+        while True:
+            with self._locked():
+                now = time.monotonic()
+                if self.max_bps is None:
+                    self._account(base, nbytes, now)
+                    return
+
+                tokens = min(
+                    max(self.burst, nbytes),
+                    self._bucket[0] + (now - self._bucket[1]) * self.max_bps,
+                )
+                self._bucket[0], self._bucket[1] = tokens, now
+
+                if tokens >= nbytes and self._first_in_line(row, now):
+                    self._bucket[0] -= nbytes
+                    self._rows[base + WAITING] = 0
+                    self._account(base, nbytes, now)
+                    return
+
+                self._rows[base + WAITING] = 1
+                shortfall = max(nbytes - tokens, 0)
+                self._reap()
+
+            time.sleep(min(0.1, max(0.002, shortfall / self.max_bps)))
+
+    def _first_in_line(self, row, now):
+        mine = self._urgency(row, now)
+        for other in range(MAX_TRANSFERS):
+            base = other * ROW
+            if other == row or not (self._rows[base + ACTIVE] and self._rows[base + WAITING]):
+                continue
+            theirs = self._urgency(other, now)
+            if theirs < mine or (theirs == mine and other < row):
+                return False
+        return True
+
+    def _urgency(self, row, now):
+        """Seconds this transfer has left to do: the smaller is served first."""
+        base = row * ROW
+        to_finish = (self._rows[base + TOTAL] - self._rows[base + SENT]) / self.max_bps
+        deadline = self._rows[base + DEADLINE]
+        return min(to_finish, deadline - now) if deadline else to_finish
+
+    def _account(self, base, nbytes, now):
+        self._rows[base + SENT] += nbytes
+        second = int(now)
+        i = second % RATE_WINDOW
+        if self._rate_stamp[i] != second:
+            self._rate_stamp[i], self._rate_bytes[i] = second, 0
+        self._rate_bytes[i] += nbytes
+
+    # =====================================================
+    # LIVE THROUGHPUT
+    # =====================================================
+
+    def throughput(self):
+        """Aggregate upload rate (bytes/s) over the last few seconds."""
+        now = int(time.monotonic())
+        with self._locked():
+            sent = sum(
+                self._rate_bytes[i] for i in range(RATE_WINDOW)
+                if now - RATE_WINDOW < self._rate_stamp[i] < now
+            )
+        return sent / (RATE_WINDOW - 1)
+
+    def snapshot(self):
+        """Live view: aggregate rate plus each active transfer's progress."""
+        with self._locked():
+            active = [
+                {
+                    "pid": int(self._rows[row * ROW + PID]),
+                    "sent": int(self._rows[row * ROW + SENT]),
+                    "total": int(self._rows[row * ROW + TOTAL]),
+                    "waiting": bool(self._rows[row * ROW + WAITING]),
+                }
+                for row in range(MAX_TRANSFERS) if self._rows[row * ROW + ACTIVE]
+            ]
+        return {"bps": self.throughput(), "limit_bps": self.max_bps, "active": active}
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# One per process tree; main configures it from settings.upload before
+# the supervisor forks any worker.
+GOVERNOR = UploadGovernor()
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+# Remote clocks and ours disagree a little
+CLOCK_SLACK = 300
+
+
+def caption_fingerprint(caption):
+    """Stable id for a caption, ignoring case and whitespace changes."""
+    text = re.sub(r"\s+", " ", str(caption)).strip().lower()
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def files_fingerprint(local_paths):
+    # Cached media is named by content hash, so names identify the bytes
+    names = sorted(os.path.basename(p) for p in local_paths)
+    return hashlib.sha1("|".join(names).encode("utf-8")).hexdigest()[:16]
+
+
+def _epoch(timestamp):
+    """Graph/Threads timestamps: 2024-01-01T00:00:00+0000."""
+    try:
+        return datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S%z").timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def match_recent(entries, caption, since, text_field):
+    """
+    Id of the first listed post whose text matches the caption and that
+    was created after `since` (the first attempt), else None.
+    """
+    wanted = caption_fingerprint(caption)
+    for entry in entries:
+        if caption_fingerprint(entry.get(text_field, "")) != wanted:
+            continue
+        created = _epoch(entry.get("timestamp") or entry.get("created_time"))
+        if since and created and created < since - CLOCK_SLACK:
+            continue
+        return entry.get("id")
+    return None
+
+
+class PostLedger:
+    """
+    What has been attempted and posted, per platform and caption.
+
+    main opens an entry before each post; posters record the remote id
+    when the platform accepts it. A retry after an ambiguous failure (a
+    timeout or 5xx that may have landed) first asks the poster's
+    find_posted() whether the post exists, looking only at posts created
+    since the entry's first attempt. A post recorded here with the same
+    files is never sent again.
+    """
+
+    def __init__(self, path=None, keep_days=7):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.keep_seconds = keep_days * 86400
+        self.entries = {}  # "<platform>:<caption fp>" -> {"files", "started", "id"}
+        self._lock = threading.Lock()
+
+    # =====================================================
+    # PERSISTENCE
+    # =====================================================
+
+    def load(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            self.logger.warning(f"Post ledger unreadable, starting fresh: {e}")
+            self.entries = {}
+        return self
+
+    def save(self):
+        if not self.path:
+            return
+        cutoff = time.time() - self.keep_seconds
+        with self._lock:
+            self.entries = {k: v for k, v in self.entries.items() if v["started"] >= cutoff}
+            entries = dict(self.entries)
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.logger.warning(f"Post ledger not saved: {e}")
+
+    def merge(self, entries):
+        """Fold in the entries a supervised worker changed, key by key."""
+        with self._lock:
+            self.entries.update(entries)
+
+    # =====================================================
+    # LEDGER
+    # =====================================================
+
+    @staticmethod
+    def key(platform, caption):
+        return f"{platform}:{caption_fingerprint(caption)}"
+
+    def begin(self, platform, caption, local_paths):
+        """Open (or reopen) the entry for a post about to be attempted."""
+        files = files_fingerprint(local_paths)
+        with self._lock:
+            entry = self.entries.get(self.key(platform, caption))
+            if entry is None or entry["files"] != files:
+                self.entries[self.key(platform, caption)] = {
+                    "files": files, "started": time.time(), "id": None,
+                }
+
+    def posted(self, platform, caption, local_paths):
+        """Remote id if exactly this post already went out."""
+        entry = self.entries.get(self.key(platform, caption))
+        if entry and entry["files"] == files_fingerprint(local_paths):
+            return entry["id"]
+        return None
+
+    def since(self, platform, caption):
+        entry = self.entries.get(self.key(platform, caption))
+        return entry["started"] if entry else None
+
+    def record(self, platform, caption, remote_id):
+        with self._lock:
+            entry = self.entries.setdefault(
+                self.key(platform, caption),
+                {"files": None, "started": time.time(), "id": None},
+            )
+            entry["id"] = str(remote_id)
+
+
+# Shared by main and the posters; main loads/saves it from the state dir.
+LEDGER = PostLedger()
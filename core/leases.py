@@ -0,0 +1,292 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+# Released records carry post progress for the next owner; kept this long
+RELEASED_TTL = 7 * 86400
+
+
+class SQLiteLeaseStore:
+    """
+    Leases in one SQLite file: enough for several workers on one machine
+    or a shared volume. Each call opens its own connection, so it is
+    safe across threads and forked workers.
+    """
+
+    def __init__(self, path=".state/leases.db"):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases "
+                "(key TEXT PRIMARY KEY, owner TEXT, expires REAL, data TEXT)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def acquire(self, key, owner, ttl):
+        """(True, data left by the previous owner) or (False, None)."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM leases WHERE expires < ?", (now - RELEASED_TTL,))
+            row = conn.execute(
+                "SELECT owner, expires, data FROM leases WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row and row[0] not in ("", owner) and row[1] > now:
+                conn.execute("ROLLBACK")
+                return False, None
+
+            data = row[2] if row else None
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (key, owner, expires, data) VALUES (?, ?, ?, ?)",
+                (key, owner, now + ttl, data),
+            )
+            conn.execute("COMMIT")
+            return True, json.loads(data) if data else {}
+        finally:
+            conn.close()
+
+    def renew(self, key, owner, ttl):
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "UPDATE leases SET expires = ? WHERE key = ? AND owner = ?",
+                (time.time() + ttl, key, owner),
+            )
+            return cur.rowcount == 1
+        finally:
+            conn.close()
+
+    def release(self, key, owner, data=None):
+        conn = self._connect()
+        try:
+            if data:
+                conn.execute(
+                    "UPDATE leases SET owner = '', expires = ?, data = ? WHERE key = ? AND owner = ?",
+                    (time.time(), json.dumps(data), key, owner),
+                )
+            else:
+                conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+        finally:
+            conn.close()
+
+
+class DropboxLeaseStore:
+    """
+    One lock file per lease in a Dropbox folder, next to the queues every
+    worker already shares. Dropbox revisions make it compare-and-swap:
+    a lease is created with WriteMode.add, and renewed, taken over or
+    released only against the revision this worker last wrote.
+    """
+
+    def __init__(self, client_factory, folder="/.leases"):
+        self.logger = logging.getLogger(__name__)
+        self.client_factory = client_factory
+        self.folder = folder.rstrip("/")
+        self._revs = {}  # key -> rev of our lock file
+
+    def _path(self, key):
+        return f"{self.folder}/{hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]}.lock"
+
+    def _write(self, key, record, mode):
+        from dropbox.files import WriteMode
+
+        body = json.dumps({"key": key, **record}).encode("utf-8")
+        write_mode = WriteMode.add if mode is None else WriteMode.update(mode)
+        metadata = self.client_factory().files_upload(body, self._path(key), mode=write_mode, mute=True)
+        self._revs[key] = metadata.rev
+
+    def acquire(self, key, owner, ttl):
+        from dropbox.exceptions import ApiError
+
+        client = self.client_factory()
+        record = {"owner": owner, "expires": time.time() + ttl, "data": {}}
+        try:
+            self._write(key, record, None)
+            return True, {}
+        except ApiError:
+            pass  # exists: take it over only if expired or released
+
+        try:
+            metadata, res = client.files_download(self._path(key))
+            current = json.loads(res.content)
+            if current["owner"] not in ("", owner) and current["expires"] > time.time():
+                return False, None
+            record["data"] = current.get("data") or {}
+            self._write(key, record, metadata.rev)
+            return True, record["data"]
+        except ApiError:
+            # lost a race for the same lock file
+            return False, None
+
+    def renew(self, key, owner, ttl):
+        from dropbox.exceptions import ApiError
+
+        try:
+            self._write(key, {"owner": owner, "expires": time.time() + ttl, "data": {}}, self._revs[key])
+            return True
+        except (ApiError, KeyError):
+            return False
+
+    def release(self, key, owner, data=None):
+        from dropbox.exceptions import ApiError
+
+        rev = self._revs.pop(key, None)
+        if rev is None:
+            return
+        try:
+            if data:
+                self._write(key, {"owner": "", "expires": time.time(), "data": data}, rev)
+                self._revs.pop(key, None)
+            else:
+                self.client_factory().files_delete_v2(self._path(key), parent_rev=rev)
+        except ApiError as e:
+            self.logger.warning(f"Lease release failed for {key}: {e}")
+
+
+def open_store(conf, dropbox_client=None):
+    """Lease store from settings.leases; None disables claiming."""
+    backend = (conf or {}).get("backend", "none")
+    if backend == "sqlite":
+        return SQLiteLeaseStore(conf.get("path", ".state/leases.db"))
+    if backend == "dropbox":
+        return DropboxLeaseStore(dropbox_client, conf.get("folder", "/.leases"))
+    return None
+
+
+class LeaseManager:
+    """
+    Claims queued files so several workers can drain the same queues.
+
+    A worker only posts files it holds a lease on. Leases expire after
+    `ttl` seconds unless the heartbeat thread renews them, so a crashed
+    worker's files come back on their own. A file left unfinished is
+    released with the platforms it already reached, and the next owner
+    carries on from there instead of posting it again. Without a store
+    every claim succeeds, which is the single-worker behaviour.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.configure()
+
+    def configure(self, store=None, ttl=900):
+        self.store = store
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.held = {}  # key -> data handed over by the previous owner
+        self.finished = []  # keys released after the next flush
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = None
+        return self
+
+    @property
+    def enabled(self):
+        return self.store is not None
+
+    # =====================================================
+    # CLAIMS
+    # =====================================================
+
+    def claim(self, key):
+        if not self.enabled:
+            return True
+        with self._lock:
+            if key in self.held:
+                return True
+
+        try:
+            ok, data = self.store.acquire(key, self.owner, self.ttl)
+        except Exception as e:
+            self.logger.warning(f"Lease claim failed for {key}: {e}")
+            return False
+        if not ok:
+            return False
+
+        with self._lock:
+            self.held[key] = data
+        self._start_heartbeat()
+        return True
+
+    def holds(self, key):
+        return not self.enabled or key in self.held
+
+    def handed_over(self, key):
+        """What the previous owner left for this file ({} if nothing)."""
+        return self.held.get(key) or {}
+
+    def release(self, key, data=None):
+        """Give the file back now, with data for whoever claims it next."""
+        with self._lock:
+            if self.held.pop(key, None) is None:
+                return
+        try:
+            self.store.release(key, self.owner, data)
+        except Exception as e:
+            self.logger.warning(f"Lease release failed for {key}: {e}")
+
+    def finish(self, key):
+        """
+        Stop renewing a posted (or failed) file. Its record stays until
+        release_finished(), called once flush() has applied the Dropbox
+        delete/move, so nobody claims it in between.
+        """
+        with self._lock:
+            if self.held.pop(key, None) is not None:
+                self.finished.append(key)
+
+    def release_finished(self):
+        with self._lock:
+            keys, self.finished = self.finished, []
+        for key in keys:
+            try:
+                self.store.release(key, self.owner)
+            except Exception as e:
+                self.logger.warning(f"Lease release failed for {key}: {e}")
+
+    # =====================================================
+    # HEARTBEAT
+    # =====================================================
+
+    def _start_heartbeat(self):
+        if self._heartbeat and self._heartbeat.is_alive():
+            return
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._beat, name="lease-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def _beat(self):
+        while not self._stop.wait(self.ttl / 3):
+            with self._lock:
+                keys = list(self.held)
+            for key in keys:
+                try:
+                    renewed = self.store.renew(key, self.owner, self.ttl)
+                except Exception as e:
+                    self.logger.warning(f"Lease heartbeat failed for {key}: {e}")
+                    continue  # retried next beat, well before expiry
+                if not renewed:
+                    self.logger.warning(f"Lease lost for {key}; another worker may take it")
+                    with self._lock:
+                        self.held.pop(key, None)
+
+    def stop(self):
+        self._stop.set()
+
+
+# One per process; main configures it from settings.leases.
+LEASES = LeaseManager()
@@ -0,0 +1,83 @@
+import logging
+import time
+
+from .timeouts import ThroughputModel
+from .supervisor import SUPERVISOR
+
+# Cold-start guesses (seconds of fixed cost per post) until history exists
+DEFAULT_OVERHEAD = {"video": 60.0, "image": 10.0, "album": 20.0}
+DEFAULT_BPS = 1024 * 1024
+
+
+class RunPlanner:
+    """
+    Orders a run's posting tasks by expected cost and only starts the ones
+    that can still finish.
+
+    A task is one post: a file (or an album chunk) to one platform. Its
+    cost comes from POST_COSTS, an EWMA of past posts per
+    "<platform>.<video|image|album>" (fixed overhead plus size over
+    throughput), so slow Meta transcode polls are priced as such. Tasks
+    run cheapest-per-file first, which maximises finished posts when the
+    budget is short; a task whose estimate no longer fits the time left is
+    deferred, and its files stay queued for the next run.
+
+    The budget is settings.run_budget (counted from the start of the run)
+    if set, clipped by the supervisor's run deadline.
+    """
+
+    def __init__(self, costs=None, budget=None, delay=0, margin=1.25):
+        self.logger = logging.getLogger(__name__)
+        self.costs = costs if costs is not None else POST_COSTS
+        self.budget = budget
+        self.delay = delay
+        self.margin = margin
+
+    def remaining(self):
+        """Seconds left for posting, or None when unbounded."""
+        limits = [SUPERVISOR.remaining()]
+        if self.budget:
+            limits.append(self.budget - (time.monotonic() - SUPERVISOR.run_started))
+        limits = [limit for limit in limits if limit is not None]
+        return min(limits) if limits else None
+
+    def estimate(self, key, kind, nbytes):
+        expected = self.costs.expected_seconds(key, nbytes)
+        if expected is None:
+            expected = DEFAULT_OVERHEAD.get(kind, 30.0) + nbytes / DEFAULT_BPS
+        return expected
+
+    # =====================================================
+    # PLANNING
+    # =====================================================
+
+    def order(self, tasks):
+        """
+        Price each task dict ({"key", "kind", "bytes", "files", ...}) and
+        return them cheapest per file first.
+        """
+        for task in tasks:
+            task["estimate"] = self.estimate(task["key"], task["kind"], task["bytes"])
+
+        ordered = sorted(tasks, key=lambda t: (t["estimate"] / t["files"], t["estimate"]))
+
+        total = sum(t["estimate"] + self.delay for t in ordered)
+        remaining = self.remaining()
+        budget = f"{remaining:.0f}s" if remaining is not None else "unbounded"
+        self.logger.info(f"Run plan: {len(ordered)} posts, ~{total:.0f}s expected, budget {budget}")
+        return ordered
+
+    def admit(self, task):
+        """True if the task is expected to finish in the time left."""
+        remaining = self.remaining()
+        if remaining is None:
+            return True
+        return task["estimate"] * self.margin + self.delay <= remaining
+
+    def observe(self, task, seconds):
+        """Feed a finished task's wall time back into the history."""
+        self.costs.record(task["key"], task["bytes"], seconds)
+
+
+# Per-post cost history; main loads/saves it from the state dir.
+POST_COSTS = ThroughputModel()
@@ -0,0 +1,249 @@
+import cProfile
+import fcntl
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Deepest stack kept per sample; deeper frames are cut at the root side
+MAX_DEPTH = 64
+MB = 1024 * 1024
+
+
+class _Stage:
+    __slots__ = ("key", "profile", "traced", "peak", "started")
+
+    def __init__(self, key):
+        self.key = key
+        self.profile = None
+        self.traced = tracemalloc.get_traced_memory()[0]
+        self.peak = self.traced
+        self.started = time.perf_counter()
+
+
+class StageProfiler:
+    """
+    Opt-in CPU and memory profiling of every tracing span.
+
+    Off by default; SOCIAL_AUTO_PROFILE=1 or settings.profile.enabled
+    turns it on. Each span is a stage, keyed like the tracer's summary
+    ("platform.post[twitter]"), and a nested span takes over from its
+    parent until it ends, so time is charged to the innermost stage. Per
+    stage it collects:
+
+    - cProfile stats, merged into <dir>/<stage>.prof (pstats, snakeviz)
+    - stacks sampled every `sample_ms`, appended to <dir>/<stage>.folded
+      in collapsed format for flamegraph.pl / speedscope
+    - each run's peak and net change in traced memory, appended to
+      <dir>/<stage>.alloc.txt; when a stage keeps more than `alloc_mb`,
+      the allocation sites that grew since the last such report follow
+      (a snapshot of a big heap takes seconds, so not on every span).
+      Tracing is process-wide: parallel lanes share the numbers
+
+    Supervised workers profile their own calls and write to the same
+    files when they finish. When off, the tracer pays one attribute
+    check per span.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.enabled = False
+        self.configure()
+
+    def configure(self, enabled=False, directory="metrics/profile", sample_ms=5, top=25,
+                  alloc_mb=8):
+        self.enabled = bool(enabled)
+        self.directory = directory
+        self.interval = sample_ms / 1000.0
+        self.top = top
+        self.alloc_bytes = alloc_mb * MB
+        self._baseline = None  # snapshot the next allocation report is compared with
+        self._reset()
+        if self.enabled:
+            tracemalloc.start()
+            self.logger.warning(f"Profiling on: writing to {directory}/")
+        return self
+
+    def _reset(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._active = {}       # thread ident -> stage key being sampled
+        self._stats = {}        # stage key -> pstats.Stats
+        self._stacks = {}       # stage key -> Counter of folded stacks
+        self._allocs = {}       # stage key -> [report lines]
+        self._sampler = None
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    # =====================================================
+    # TRACER HOOKS
+    # =====================================================
+
+    def enter(self, span):
+        platform = span.attrs.get("platform")
+        stage = _Stage(f"{span.name}[{platform}]" if platform else span.name)
+        stack = self._stack()
+        if stack:
+            parent = stack[-1]
+            if parent.profile:
+                parent.profile.disable()
+            # The peak is about to be reset: bank it for the parent first
+            parent.peak = max(parent.peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+        stack.append(stage)
+        with self._lock:
+            self._active[threading.get_ident()] = stage.key
+        self._start_sampler()
+
+        # Last, so the profile holds the stage's own work only
+        stage.profile = cProfile.Profile()
+        try:
+            stage.profile.enable()
+        except ValueError:
+            stage.profile = None  # another profiler owns this interpreter
+
+    def exit(self, span):
+        stack = self._stack()
+        if not stack:
+            return
+        stage = stack.pop()
+        if stage.profile:
+            stage.profile.disable()
+
+        traced, peak = tracemalloc.get_traced_memory()
+        stage.peak = max(stage.peak, peak)
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, stage.peak)
+
+        report = [
+            f"--- pid {os.getpid()} {time.perf_counter() - stage.started:.2f}s: "
+            f"peak +{(stage.peak - stage.traced) / MB:.1f} MB, net {(traced - stage.traced) / MB:+.1f} MB "
+            f"({stage.peak / MB:.1f} MB traced)",
+        ]
+        if traced - stage.traced > self.alloc_bytes:
+            report += self._growth()
+
+        with self._lock:
+            if stage.profile:
+                if stage.key in self._stats:
+                    self._stats[stage.key].add(stage.profile)
+                else:
+                    self._stats[stage.key] = pstats.Stats(stage.profile)
+            self._allocs.setdefault(stage.key, []).extend(report)
+
+            ident = threading.get_ident()
+            if stack:
+                self._active[ident] = stack[-1].key
+            else:
+                self._active.pop(ident, None)
+
+        if stack and stack[-1].profile:
+            stack[-1].profile.enable()
+
+    def _growth(self):
+        snapshot = tracemalloc.take_snapshot()
+        if self._baseline is None:
+            stats = snapshot.statistics("lineno")
+        else:
+            stats = [stat for stat in snapshot.compare_to(self._baseline, "lineno") if stat.size_diff > 0]
+        self._baseline = snapshot
+        return [f"    {stat}" for stat in stats[:self.top]]
+
+    # =====================================================
+    # STACK SAMPLER
+    # =====================================================
+
+    def _start_sampler(self):
+        if self._sampler and self._sampler.is_alive():
+            return
+        self._sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+
+    def _sample(self):
+        me = threading.get_ident()
+        while self.enabled:
+            time.sleep(self.interval)
+            with self._lock:
+                active = dict(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ident, key in active.items():
+                frame = frames.get(ident)
+                if frame is None or ident == me:
+                    continue
+                folded = _fold(frame)
+                with self._lock:
+                    self._stacks.setdefault(key, Counter())[folded] += 1
+
+    # =====================================================
+    # OUTPUT
+    # =====================================================
+
+    def dump(self):
+        """Write what was collected since the last dump, then drop it."""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            stacks, self._stacks = self._stacks, {}
+            allocs, self._allocs = self._allocs, {}
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Workers and the parent merge into the same files
+            with open(os.path.join(self.directory, ".lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                for key, data in stats.items():
+                    path = self._path(key, "prof")
+                    if os.path.exists(path):
+                        data.add(path)
+                    data.dump_stats(path)
+                for key, counter in stacks.items():
+                    with open(self._path(key, "folded"), "a") as f:
+                        f.writelines(f"{stack} {count}\n" for stack, count in counter.items())
+                for key, lines in allocs.items():
+                    with open(self._path(key, "alloc.txt"), "a") as f:
+                        f.write("\n".join(lines) + "\n")
+        except Exception as e:
+            self.logger.warning(f"Profile not written: {e}")
+
+    def _path(self, key, ext):
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", key).strip("_")
+        return os.path.join(self.directory, f"{name}.{ext}")
+
+    def _after_fork(self):
+        # The worker inherits this thread's running profilers and the
+        # parent's collected data; it starts over with its own (but keeps
+        # the parent's baseline snapshot).
+        if not self.enabled:
+            return
+        for stage in self._stack():
+            if stage.profile:
+                stage.profile.disable()
+        self._reset()
+
+
+def _fold(frame):
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+# One per process; main configures it from SOCIAL_AUTO_PROFILE or
+# settings.profile and hands it to the tracer.
+PROFILER = StageProfiler()
+
+os.register_at_fork(after_in_child=PROFILER._after_fork)
@@ -0,0 +1,78 @@
+import json
+import logging
+import os
+import threading
+
+
+class PostProgress:
+    """
+    Which platforms each queued file has already reached.
+
+    A cron run posts a file everywhere at once, but with per-platform slots
+    a file goes out over several slots. This keeps track of the platforms
+    already done (path_lower -> [platform]) so nothing is posted twice,
+    also across restarts, and the file is only removed from Dropbox once
+    every target has it.
+    """
+
+    def __init__(self, path=None):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.done = {}
+        self._lock = threading.Lock()
+
+    # =====================================================
+    # PERSISTENCE
+    # =====================================================
+
+    def load(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.done = json.load(f)
+        except FileNotFoundError:
+            self.done = {}
+        except Exception as e:
+            self.logger.warning(f"Post progress unreadable, starting fresh: {e}")
+            self.done = {}
+        return self
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.done, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.logger.warning(f"Post progress not saved: {e}")
+
+    # =====================================================
+    # TRACKING
+    # =====================================================
+
+    def started(self, path_lower):
+        return path_lower in self.done
+
+    def posted(self, path_lower):
+        return list(self.done.get(path_lower, []))
+
+    def remaining(self, path_lower, targets):
+        done = self.done.get(path_lower, [])
+        return [name for name in targets if name not in done]
+
+    def mark(self, path_lower, platform):
+        with self._lock:
+            done = self.done.setdefault(path_lower, [])
+            if platform not in done:
+                done.append(platform)
+
+    def forget(self, path_lower):
+        with self._lock:
+            self.done.pop(path_lower, None)
+
+
+# Shared by main and the daemon; loaded/saved from the state dir.
+PROGRESS = PostProgress()
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+class QuotaLedger:
+    """
+    Publishes per platform over a rolling window (24h by default), so a
+    platform at its cap is left out before anything is downloaded or
+    uploaded for it, instead of failing the post and sending the file to
+    /failed.
+
+    main records every post that goes out (an album counts once, as the
+    platforms count it); the timestamps persist in the state dir. Caps
+    come from settings.quota.limits. Where the platform reports its own
+    usage (a poster's quota_usage(): Instagram's content_publishing_limit,
+    Tumblr's /user/limits) the report wins, since it also counts posts
+    made outside this workflow: it is asked again after
+    `refresh_minutes`, and posts recorded since are added to it.
+    """
+
+    def __init__(self, path=None):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.posts = {}     # platform -> [epoch seconds of each publish]
+        self.reported = {}  # platform -> {"used", "limit", "at"} from the platform itself
+        self._lock = threading.Lock()
+        self.configure()
+
+    def configure(self, limits=None, window_hours=24, refresh_minutes=15):
+        self.limits = dict(limits or {})
+        self.window = window_hours * 3600
+        self.refresh_seconds = refresh_minutes * 60
+        return self
+
+    # =====================================================
+    # PERSISTENCE
+    # =====================================================
+
+    def load(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.posts = json.load(f)
+        except FileNotFoundError:
+            self.posts = {}
+        except Exception as e:
+            self.logger.warning(f"Quota ledger unreadable, starting fresh: {e}")
+            self.posts = {}
+        return self
+
+    def save(self):
+        if not self.path:
+            return
+        cutoff = time.time() - self.window
+        with self._lock:
+            self.posts = {
+                platform: [t for t in stamps if t > cutoff]
+                for platform, stamps in self.posts.items()
+            }
+            posts = dict(self.posts)
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(posts, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.logger.warning(f"Quota ledger not saved: {e}")
+
+    # =====================================================
+    # COUNTING
+    # =====================================================
+
+    def record(self, platform):
+        with self._lock:
+            self.posts.setdefault(platform, []).append(time.time())
+
+    def used(self, platform, since=None):
+        """Recorded publishes in the window (or since `since`, if later)."""
+        cutoff = max(time.time() - self.window, since or 0)
+        return sum(1 for t in self.posts.get(platform, []) if t > cutoff)
+
+    def update(self, platform, usage):
+        """
+        Take the platform's own count from `usage()` -> (used, limit) or
+        None, unless the last report is still fresh. Failures keep the
+        local count (and are not retried before the next refresh).
+        """
+        report = self.reported.get(platform)
+        if report and time.time() - report["at"] < self.refresh_seconds:
+            return
+        try:
+            counts = usage()
+        except Exception as e:
+            self.logger.warning(f"{platform} quota usage unavailable: {e}")
+            counts = None
+
+        used, limit = counts if counts else (None, None)
+        self.reported[platform] = {"used": used, "limit": limit, "at": time.time()}
+
+    # =====================================================
+    # CHECKS
+    # =====================================================
+
+    def remaining(self, platform):
+        """Publishes left in the window, or None for a platform without a cap."""
+        report = self.reported.get(platform)
+        if report and report["limit"] is not None:
+            return report["limit"] - report["used"] - self.used(platform, since=report["at"])
+        limit = self.limits.get(platform)
+        if limit is None:
+            return None
+        return limit - self.used(platform)
+
+    def allows(self, platform):
+        left = self.remaining(platform)
+        return left is None or left > 0
+
+    def describe(self, platform):
+        left = self.remaining(platform)
+        report = self.reported.get(platform)
+        limit = report["limit"] if report and report["limit"] is not None else self.limits.get(platform)
+        return f"{max(left, 0)}/{limit} left in {self.window // 3600}h"
+
+    def resets_in(self, platform):
+        """
+        Seconds until a post may be allowed again: when the oldest
+        recorded post leaves the window, or the next usage report.
+        """
+        now = time.time()
+        stamps = [t for t in self.posts.get(platform, []) if t > now - self.window]
+        wait = min(stamps) + self.window - now if stamps else self.window
+        if platform in self.reported:
+            wait = min(wait, self.reported[platform]["at"] + self.refresh_seconds - now)
+        return max(wait, 60)
+
+
+# Shared by main's run modes; loaded/saved from the state dir.
+QUOTA = QuotaLedger()
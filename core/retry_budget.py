@@ -0,0 +1,176 @@
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+# Run-wide counters in shared memory
+RETRIES, WASTED = range(2)
+
+
+class RetryBudgetExhausted(Exception):
+    """A retry (or the wait before it) would overrun the retry budget."""
+
+
+class RetryBudget:
+    """
+    One allowance for every retry layer: the posters' urllib3 adapters,
+    Discord's 429 waits and SmartRetry all draw from it.
+
+    A retry costs one attempt, and the time it wastes is charged: the
+    failed request up to the failure, plus the wait before the next try.
+    Each post (one SmartRetry.execute) gets `call_retries` and
+    `call_seconds`; the run as a whole gets `run_retries` and
+    `run_seconds`, counted across the supervisor's forked workers. A
+    retry or a wait that does not fit raises RetryBudgetExhausted, so
+    layers stop stacking (3 SmartRetry attempts x 5 adapter retries) and
+    a bad run cannot burn its whole deadline re-sending the same bytes.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.configure()
+
+    def configure(self, call_retries=4, call_seconds=300, run_retries=40, run_seconds=900):
+        self.call_retries = call_retries
+        self.call_seconds = call_seconds
+        self.run_retries = run_retries
+        self.run_seconds = run_seconds
+
+        self._lock = multiprocessing.Lock()
+        self._run = multiprocessing.RawArray("d", 2)
+        self._local = threading.local()
+        return self
+
+    @contextmanager
+    def _locked(self):
+        # Same rule as the upload governor: no SIGTERM while holding the lock
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTERM})
+        self._lock.acquire()
+        try:
+            yield
+        finally:
+            self._lock.release()
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+
+    def start_run(self):
+        with self._locked():
+            self._run[RETRIES] = self._run[WASTED] = 0
+
+    # =====================================================
+    # PER-CALL SCOPE
+    # =====================================================
+
+    @contextmanager
+    def call(self):
+        """One post: a fresh per-call allowance for this thread."""
+        self._local.retries = 0
+        self._local.wasted = 0.0
+        self._local.mark = time.monotonic()
+        try:
+            yield
+        finally:
+            self._local.mark = None
+
+    def _in_call(self):
+        return getattr(self._local, "mark", None) is not None
+
+    def mark(self):
+        """An attempt starts now: a failure charges the time from here."""
+        if self._in_call():
+            self._local.mark = time.monotonic()
+
+    # =====================================================
+    # DRAWING
+    # =====================================================
+
+    def failed(self):
+        """Charge the attempt that just failed."""
+        if self._in_call():
+            now = time.monotonic()
+            self._charge(now - self._local.mark)
+            self._local.mark = now
+
+    def spend(self, what):
+        """Take one retry; raises RetryBudgetExhausted if none is left."""
+        in_call = self._in_call()
+        if in_call and self._local.retries >= self.call_retries:
+            raise RetryBudgetExhausted(f"{what}: {self.call_retries} retries per post used up")
+
+        with self._locked():
+            if self._run[RETRIES] >= self.run_retries:
+                raise RetryBudgetExhausted(f"{what}: {self.run_retries} retries per run used up")
+            self._run[RETRIES] += 1
+
+        if in_call:
+            self._local.retries += 1
+
+    def sleep(self, seconds, what):
+        """Wait before a retry, if the wait fits in what is left."""
+        seconds = max(0.0, seconds)
+        left = self.seconds_left()
+        if seconds > left:
+            raise RetryBudgetExhausted(
+                f"{what}: waiting {seconds:.0f}s would overrun the retry budget ({left:.0f}s left)"
+            )
+        time.sleep(seconds)
+        self._charge(seconds)
+        self.mark()
+
+    def seconds_left(self):
+        with self._locked():
+            left = self.run_seconds - self._run[WASTED]
+        if self._in_call():
+            left = min(left, self.call_seconds - self._local.wasted)
+        return max(0.0, left)
+
+    def _charge(self, seconds):
+        if self._in_call():
+            self._local.wasted += seconds
+        with self._locked():
+            self._run[WASTED] += seconds
+
+    def usage(self):
+        with self._locked():
+            return {"retries": int(self._run[RETRIES]), "wasted_seconds": round(self._run[WASTED], 1)}
+
+
+class BudgetedRetry(Retry):
+    """
+    urllib3 retries for the posters' sessions, paid for out of
+    RETRY_BUDGET. When the budget says no, the request ends as if its own
+    retries ran out: the last response is returned for a retryable status
+    (the poster raises on it, with its status code) and connection errors
+    surface as usual.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("raise_on_status", False)
+        super().__init__(*args, **kwargs)
+
+    def increment(self, method=None, url=None, response=None, error=None,
+                  _pool=None, _stacktrace=None):
+        new_retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        RETRY_BUDGET.failed()
+        try:
+            RETRY_BUDGET.spend(f"{method} {url}")
+        except RetryBudgetExhausted as e:
+            raise MaxRetryError(_pool, url, error or ResponseError(str(e))) from e
+        return new_retry
+
+    def sleep(self, response=None):
+        wait = None
+        if self.respect_retry_after_header and response is not None:
+            wait = self.get_retry_after(response)
+        if wait is None:
+            wait = self.get_backoff_time()
+        RETRY_BUDGET.sleep(wait, "transport retry")
+
+
+# One per process tree; main configures it from settings.retry_budget
+# before the supervisor forks any worker.
+RETRY_BUDGET = RetryBudget()
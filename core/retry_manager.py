@@ -1,9 +1,11 @@
-import time
 import random
 import logging
 from datetime import datetime, timezone
 from email.utils import parsedate_to_datetime
 from .error_classifier import ErrorClassifier
+from .tracing import TRACER
+from .timeouts import THROUGHPUT
+from .retry_budget import RETRY_BUDGET, RetryBudgetExhausted
 
 
 def backoff_with_full_jitter(attempt, base=2, cap=900):
@@ -41,12 +43,54 @@ class SmartRetry:
         except Exception:
             return None
 
-    def execute(self, func, *args, **kwargs):
+    def execute(self, func, *args, verify=None, **kwargs):
+        """
+        verify(*args), if given, is asked before a retry that follows an
+        ambiguous failure whether the previous attempt landed after all;
+        a truthy answer ends the retry loop as a success.
+
+        Retries and the waits before them come out of RETRY_BUDGET, shared
+        with the posters' transport retries; when it runs dry the last
+        error is raised.
+        """
+        try:
+            with RETRY_BUDGET.call():
+                return self._execute(func, *args, verify=verify, **kwargs)
+        finally:
+            THROUGHPUT.set_attempt(0)
+
+    def _already_done(self, verify, args):
+        try:
+            with TRACER.span("retry.verify"):
+                remote_id = verify(*args)
+        except Exception as e:
+            self.logger.warning(f"Pre-retry check failed, retrying anyway: {e}")
+            return False
+
+        if remote_id:
+            self.logger.warning(f"Previous attempt went through (id {remote_id}). Not retrying.")
+            return True
+        return False
+
+    def _execute(self, func, *args, verify=None, **kwargs):
         # func may return a result or raise an exception with optional status_code/headers
+        ambiguous = False
         for attempt in range(self.max_attempts):
+            # posters widen their learned timeouts on later attempts
+            THROUGHPUT.set_attempt(attempt)
+
+            if ambiguous and verify and self._already_done(verify, args):
+                return True
+
+            RETRY_BUDGET.mark()
             try:
-                return func(*args, **kwargs)
+                with TRACER.span("retry.attempt", attempt=attempt + 1):
+                    return func(*args, **kwargs)
+            except RetryBudgetExhausted as e:
+                self.logger.error(f"Retry budget spent: {e}. Stopping.")
+                raise
             except Exception as e:
+                RETRY_BUDGET.failed()
                 response = getattr(e, "response", None)
                 status_code = getattr(e, "status_code", None) or getattr(response, "status_code", None)
                 headers = getattr(e, "headers", None) or getattr(response, "headers", {}) or {}
@@ -68,6 +112,15 @@ class SmartRetry:
                     self.logger.error("Max retries reached.")
                     raise
 
+                try:
+                    RETRY_BUDGET.spend(f"attempt {attempt + 2}")
+                except RetryBudgetExhausted as spent:
+                    self.logger.error(f"Retry budget spent: {spent}. Stopping.")
+                    raise e
+
+                # A 429 was refused outright; anything else may have landed
+                ambiguous = status_code != 429
+
                 retry_after = self._parse_retry_after(headers.get("Retry-After"))
                 if status_code == 429:
                     wait_seconds = retry_after if retry_after is not None else 30
@@ -75,7 +128,8 @@ class SmartRetry:
                     self.logger.warning(
                         f"Rate limit hit (429). Sleeping for {wait_seconds}s before retry..."
                     )
-                    time.sleep(wait_seconds + 1)
+                    with TRACER.span("retry.sleep", attempt=attempt + 1, reason="429"):
+                        self._sleep(wait_seconds + 1, e)
                     continue
 
                 wait = (
@@ -89,4 +143,12 @@ class SmartRetry:
                 self.logger.warning(
                     f"{action} error. Attempt {attempt + 1}/{self.max_attempts}. Retrying in {wait:.1f}s..."
                 )
-                time.sleep(wait)
+                with TRACER.span("retry.sleep", attempt=attempt + 1, reason=action):
+                    self._sleep(wait, e)
+
+    def _sleep(self, seconds, error):
+        try:
+            RETRY_BUDGET.sleep(seconds, "retry wait")
+        except RetryBudgetExhausted as spent:
+            self.logger.error(f"Retry budget spent: {spent}. Stopping.")
+            raise error
@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+
+class SlotSchedule:
+    """
+    Daily posting slots in a fixed timezone, from settings.schedule:
+
+        "schedule": {
+            "timezone": "Europe/Berlin",
+            "slots": ["08:00", "12:30", "19:00"],
+            "platforms": {"twitter": ["09:00", "17:30"]},
+            "prepare_minutes": 5
+        }
+
+    "slots" applies to every platform without its own list. Platforms that
+    share a time are published together in one slot. Times are wall-clock
+    in the configured zone, so slots follow DST changes.
+    """
+
+    def __init__(self, conf, platforms):
+        self.logger = logging.getLogger(__name__)
+        self.tz = pytz.timezone(conf.get("timezone", "UTC"))
+        self.prepare_seconds = float(conf.get("prepare_minutes", 5)) * 60
+
+        default = conf.get("slots", [])
+        overrides = conf.get("platforms", {})
+
+        self.slots = {}  # (hour, minute) -> [platform]
+        for name in platforms:
+            for value in overrides.get(name, default):
+                self.slots.setdefault(self._parse(value), []).append(name)
+
+        if not self.slots:
+            raise ValueError("settings.schedule has no slots for any enabled platform")
+
+    @staticmethod
+    def _parse(value):
+        hour, minute = str(value).split(":")
+        return int(hour), int(minute)
+
+    @property
+    def platforms(self):
+        return {name for names in self.slots.values() for name in names}
+
+    def next_slot(self, after=None):
+        """(UTC datetime, [platforms]) of the first slot strictly after `after`."""
+        after = after or datetime.now(pytz.utc)
+        today = after.astimezone(self.tz).date()
+
+        for offset in range(2):
+            day = today + timedelta(days=offset)
+            for hour, minute in sorted(self.slots):
+                naive = datetime(day.year, day.month, day.day, hour, minute)
+                # normalize() moves times that fall in a DST gap forward
+                at = self.tz.normalize(self.tz.localize(naive))
+                if at > after:
+                    return at.astimezone(pytz.utc), list(self.slots[(hour, minute)])
+
+        raise RuntimeError("no upcoming slot found")  # unreachable with >= 1 slot
+
+    def describe(self, at):
+        return at.astimezone(self.tz).strftime("%Y-%m-%d %H:%M %Z")
+
+
+def sleep_until(at, stop_event=None, step=60):
+    """
+    Sleep until the UTC datetime `at` in short steps, so clock jumps and
+    host suspends do not make us oversleep. Returns False if stopped.
+    """
+    stop_event = stop_event or threading.Event()
+    while True:
+        remaining = (at - datetime.now(pytz.utc)).total_seconds()
+        if remaining <= 0:
+            return True
+        if stop_event.wait(min(step, remaining)):
+            return False
+
+
+class PostPacer:
+    """
+    Minimum spacing between posts per platform, for ingest mode, from
+    settings.ingest:
+
+        "ingest": {
+            "min_interval_minutes": 60,
+            "platforms": {"twitter": 20}
+        }
+
+    Last post times are kept in `path` so a restart does not post a burst.
+    """
+
+    def __init__(self, conf, platforms, path=None):
+        self.logger = logging.getLogger(__name__)
+        default = float(conf.get("min_interval_minutes", 60))
+        overrides = conf.get("platforms", {})
+        self.intervals = {name: float(overrides.get(name, default)) * 60 for name in platforms}
+        self.path = path
+        self.last = {}  # platform -> epoch of its last post
+
+        if path:
+            try:
+                with open(path) as f:
+                    self.last = json.load(f)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                self.logger.warning(f"Pacing state unreadable, starting fresh: {e}")
+
+    @property
+    def platforms(self):
+        return set(self.intervals)
+
+    def ready(self, now=None):
+        now = now or time.time()
+        return [
+            name for name, interval in self.intervals.items()
+            if now - self.last.get(name, 0) >= interval
+        ]
+
+    def seconds_until(self, names, now=None):
+        """Seconds until the first of `names` may post again (0 if one may now)."""
+        now = now or time.time()
+        return min(
+            max(0.0, self.last.get(name, 0) + self.intervals[name] - now)
+            for name in names
+        )
+
+    def mark(self, names):
+        now = time.time()
+        for name in names:
+            self.last[name] = now
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.last, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.logger.warning(f"Pacing state not saved: {e}")
@@ -0,0 +1,242 @@
+import copy
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import requests
+
+from .tracing import TRACER
+from .timeouts import THROUGHPUT
+from .idempotency import LEDGER
+from .governor import GOVERNOR
+from .profiler import PROFILER
+
+
+class DeadlineExceeded(Exception):
+    """A supervised call ran past its hard deadline and was killed."""
+
+
+class RunDeadlineExceeded(BaseException):
+    """
+    The run as a whole is out of time. A BaseException, like
+    KeyboardInterrupt, so the posters' broad except blocks let it through.
+    """
+
+
+class RemoteError(Exception):
+    """An exception raised in a worker, carried back with its HTTP details."""
+
+    def __init__(self, message, kind, status_code=None, headers=None):
+        super().__init__(message)
+        self.kind = kind
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class Supervisor:
+    """
+    Runs each platform call in a forked worker with a hard deadline.
+
+    A worker that outlives its deadline is terminated, which really stops
+    a hung socket or a stuck poll loop, unlike a thread. The worker ships
+    back its result plus what the parent needs to stay coherent: new
+    tracing spans, the throughput and ledger entries it changed (merged
+    key by key) and any poster attributes listed in the poster's
+    SHARED_STATE.
+
+    The run deadline caps the whole run: every call's deadline is clipped
+    to the time left (minus `reserve` for summary and Dropbox cleanup), and
+    SIGALRM backs this up for stages that run in the parent.
+
+    A worker starts with empty connection pools, so the posters' pooled
+    sessions only keep connections warm across posts with
+    `supervised: false`.
+    """
+
+    def __init__(self, platform_deadline=600, run_deadline=None, reserve=120,
+                 enabled=True, overrides=None):
+        self.logger = logging.getLogger(__name__)
+        self.configure(platform_deadline, run_deadline, reserve, enabled, overrides)
+        self.run_started = time.monotonic()
+
+    def configure(self, platform_deadline=600, run_deadline=None, reserve=120,
+                  enabled=True, overrides=None):
+        self.platform_deadline = platform_deadline
+        self.run_deadline = run_deadline
+        self.reserve = reserve
+        self.overrides = overrides or {}
+        # Killable workers need fork(); elsewhere calls run inline
+        self.enabled = enabled and "fork" in multiprocessing.get_all_start_methods()
+        return self
+
+    # =====================================================
+    # RUN DEADLINE
+    # =====================================================
+
+    def start_run(self):
+        """Start the run clock and arm the SIGALRM backstop."""
+        self.run_started = time.monotonic()
+        if self.run_deadline:
+            signal.signal(signal.SIGALRM, self._on_alarm)
+            signal.alarm(int(self.run_deadline))
+
+    def stop_run(self):
+        if self.run_deadline:
+            signal.alarm(0)
+
+    def _on_alarm(self, signum, frame):
+        raise RunDeadlineExceeded(f"run exceeded {self.run_deadline}s")
+
+    def remaining(self):
+        """Seconds left for platform work, or None without a run deadline."""
+        if not self.run_deadline:
+            return None
+        elapsed = time.monotonic() - self.run_started
+        return self.run_deadline - self.reserve - elapsed
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def deadline_for(self, platform):
+        deadline = self.overrides.get(platform, self.platform_deadline)
+        remaining = self.remaining()
+        if remaining is not None:
+            deadline = min(deadline, remaining)
+        return deadline
+
+    # =====================================================
+    # SUPERVISED CALL
+    # =====================================================
+
+    def call(self, platform, poster, func, *args):
+        # Callers check expired() first; this only guards the race
+        deadline = max(1.0, self.deadline_for(platform))
+
+        if not self.enabled:
+            GOVERNOR.set_deadline(deadline)
+            return func(*args)
+
+        ctx = multiprocessing.get_context("fork")
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        span_mark = len(TRACER.spans)
+
+        worker = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, poster, func, args, span_mark, deadline),
+            name=f"post-{platform}",
+            daemon=True,
+        )
+        worker.start()
+        child_conn.close()
+
+        try:
+            if not parent_conn.poll(deadline):
+                self._kill(worker)
+                raise DeadlineExceeded(f"{platform} exceeded its {deadline:.0f}s deadline")
+            message = parent_conn.recv()
+        except EOFError:
+            message = None
+        finally:
+            parent_conn.close()
+            worker.join(5)
+            if worker.is_alive():
+                self._kill(worker)
+
+        if message is None:
+            raise RemoteError(f"{platform} worker died (exit code {worker.exitcode})", "WorkerCrash")
+
+        self._merge(poster, message)
+
+        if "error" in message:
+            kind, text, status_code, headers = message["error"]
+            raise RemoteError(text, kind, status_code, headers)
+        return message["result"]
+
+    def _kill(self, worker):
+        worker.terminate()
+        worker.join(5)
+        if worker.is_alive():
+            worker.kill()
+            worker.join()
+
+    @staticmethod
+    def _merge(poster, message):
+        with TRACER._lock:
+            TRACER.spans.extend(message.get("spans", []))
+        with THROUGHPUT._lock:
+            THROUGHPUT.stats.update(message.get("throughput", {}))
+        LEDGER.merge(message.get("ledger", {}))
+        for name, value in message.get("state", {}).items():
+            setattr(poster, name, value)
+
+
+def _worker_main(conn, poster, func, args, span_mark, deadline):
+    # Default SIGTERM so the parent's kill is immediate
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.alarm(0)
+    GOVERNOR.set_deadline(deadline)
+    _fresh_connections(poster)
+    # Parallel lanes fork from the same parent: ship back only what this
+    # call changed, or a stale copy would overwrite another lane's update
+    throughput = copy.deepcopy(THROUGHPUT.stats)
+    ledger = copy.deepcopy(LEDGER.entries)
+
+    message = {}
+    try:
+        message["result"] = func(*args)
+    except BaseException as e:
+        response = getattr(e, "response", None)
+        status_code = getattr(e, "status_code", None) or getattr(response, "status_code", None)
+        headers = getattr(e, "headers", None) or getattr(response, "headers", None) or {}
+        message["error"] = (type(e).__name__, str(e), status_code, dict(headers))
+
+    PROFILER.dump()
+    message["spans"] = TRACER.spans[span_mark:]
+    message["throughput"] = _changed(throughput, THROUGHPUT.stats)
+    message["ledger"] = _changed(ledger, LEDGER.entries)
+    message["state"] = {
+        name: getattr(poster, name)
+        for name in getattr(poster, "SHARED_STATE", ())
+        if hasattr(poster, name)
+    }
+
+    try:
+        conn.send(message)
+    except Exception as e:
+        # Unpicklable span or state: still report the outcome
+        logging.getLogger(__name__).warning(f"Worker state not returned: {e}")
+        conn.send({key: message[key] for key in ("result", "error") if key in message})
+    finally:
+        conn.close()
+
+
+def _changed(before, after):
+    return {key: value for key, value in after.items() if before.get(key) != value}
+
+
+def _fresh_connections(poster):
+    # Keep-alive sockets in the poster's pools are the parent's. Closing
+    # them here only drops this process's copy, and the worker dials its
+    # own: one killed mid-upload cannot leave a half-written connection
+    # for the parent to reuse.
+    for value in list(vars(poster).values()):
+        if isinstance(value, requests.Session):
+            value.close()
+
+
+def _fresh_locks():
+    # Posts run from parallel threads: one of them may hold a shared lock
+    # at the moment another forks, and the worker must not inherit it held.
+    for shared in (TRACER, THROUGHPUT, LEDGER):
+        shared._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_fresh_locks)
+
+
+# One per process; main configures it from settings.
+SUPERVISOR = Supervisor()
@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import threading
+
+
+class ThroughputModel:
+    """
+    Learns per-endpoint upload behaviour from past runs and turns it into
+    (connect, read) timeouts for requests.
+
+    Each key ("facebook.video", "discord", ...) keeps an EWMA of throughput
+    (bytes/s) and of fixed overhead (seconds of server work on top of the
+    transfer). Expected duration = overhead + size / throughput. The read
+    timeout is that estimate times a safety factor, widened on each retry
+    attempt. Without history the poster's old hard-coded default is used.
+    """
+
+    def __init__(self, path=None, alpha=0.3, connect_timeout=10,
+                 safety=3.0, grace=10, min_read=15, max_read=900,
+                 retry_growth=1.5):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.alpha = alpha
+        self.connect_timeout = connect_timeout
+        self.safety = safety
+        self.grace = grace
+        self.min_read = min_read
+        self.max_read = max_read
+        self.retry_growth = retry_growth
+        self.stats = {}  # key -> {"bps", "overhead", "samples"}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # =====================================================
+    # PERSISTENCE
+    # =====================================================
+
+    def load(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.stats = json.load(f)
+            self.logger.info(f"Throughput history loaded ({len(self.stats)} endpoints)")
+        except FileNotFoundError:
+            self.stats = {}
+        except Exception as e:
+            self.logger.warning(f"Throughput history unreadable, starting fresh: {e}")
+            self.stats = {}
+        return self
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.stats, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.logger.warning(f"Throughput history not saved: {e}")
+
+    # =====================================================
+    # RETRY CONTEXT (set by SmartRetry)
+    # =====================================================
+
+    def set_attempt(self, attempt):
+        self._local.attempt = attempt
+
+    def _attempt(self):
+        return getattr(self._local, "attempt", 0)
+
+    # =====================================================
+    # MODEL
+    # =====================================================
+
+    def record(self, key, nbytes, seconds):
+        """Feed one successful request (bytes sent, total seconds)."""
+        if seconds <= 0:
+            return
+
+        with self._lock:
+            entry = self.stats.get(key)
+
+            if entry is None:
+                # First sample: attribute everything to transfer for big
+                # payloads, to overhead for tiny ones.
+                if nbytes >= 256 * 1024:
+                    entry = {"bps": nbytes / seconds, "overhead": 0.0, "samples": 1}
+                else:
+                    entry = {"bps": 0.0, "overhead": seconds, "samples": 1}
+                self.stats[key] = entry
+                return
+
+            a = self.alpha
+            transfer = nbytes / entry["bps"] if entry["bps"] else 0.0
+            overhead = max(0.0, seconds - transfer)
+            entry["overhead"] = (1 - a) * entry["overhead"] + a * overhead
+
+            if nbytes >= 256 * 1024:
+                bps = nbytes / max(seconds - entry["overhead"], seconds * 0.1)
+                entry["bps"] = bps if not entry["bps"] else (1 - a) * entry["bps"] + a * bps
+
+            entry["samples"] += 1
+
+    def expected_seconds(self, key, nbytes):
+        entry = self.stats.get(key)
+        if not entry:
+            return None
+        transfer = nbytes / entry["bps"] if entry["bps"] else 0.0
+        return entry["overhead"] + transfer
+
+    def timeout_for(self, key, nbytes, default=60):
+        """(connect, read) timeout for one request of nbytes."""
+        growth = self.retry_growth ** self._attempt()
+        expected = self.expected_seconds(key, nbytes)
+
+        if expected is None or (nbytes >= 256 * 1024 and not self.stats[key]["bps"]):
+            read = default * growth
+        else:
+            read = (expected * self.safety + self.grace) * growth
+            read = min(self.max_read, max(self.min_read, read))
+
+        return (self.connect_timeout, round(read, 1))
+
+
+# Shared by all posters; main loads/saves it from the state dir.
+THROUGHPUT = ThroughputModel()
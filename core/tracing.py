@@ -0,0 +1,199 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Span:
+    __slots__ = ("name", "parent", "attrs", "start", "duration", "status")
+
+    def __init__(self, name, parent, attrs):
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration = 0.0
+        self.status = "ok"
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "parent": self.parent,
+            "start": round(self.start, 6),
+            "duration": round(self.duration, 6),
+            "status": self.status,
+            "attrs": self.attrs,
+        }
+
+
+class Tracer:
+    """
+    Lightweight in-process spans.
+
+        with TRACER.span("dropbox.download", bytes=file.size) as sp:
+            ...
+            sp.set(status_code=200)
+
+    A span inherits the 'platform' attribute of its enclosing span, so
+    retry attempts and container polls roll up under their platform.
+    An observer (the profiler) is told when each span starts and ends.
+    """
+
+    def __init__(self):
+        self.observer = None
+        self.spans = []
+        self.started = time.time()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name, **attrs):
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+
+        if parent is not None and "platform" not in attrs and "platform" in parent.attrs:
+            attrs["platform"] = parent.attrs["platform"]
+
+        sp = Span(name, parent.name if parent else None, attrs)
+        stack.append(sp)
+        observer = self.observer
+        if observer:
+            observer.enter(sp)
+        started = time.perf_counter()
+        try:
+            yield sp
+        except BaseException as e:
+            sp.status = "error"
+            sp.attrs.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            sp.duration = time.perf_counter() - started
+            if observer:
+                observer.exit(sp)
+            stack.pop()
+            with self._lock:
+                self.spans.append(sp)
+
+    def reset(self):
+        """Start a fresh run window (daemon mode exports one per slot)."""
+        with self._lock:
+            self.spans = []
+            self.started = time.time()
+
+    # =====================================================
+    # AGGREGATION
+    # =====================================================
+
+    def summary(self):
+        """(name, platform) -> {calls, seconds, bytes, errors}"""
+        totals = {}
+        for sp in list(self.spans):
+            key = (sp.name, sp.attrs.get("platform", ""))
+            data = totals.setdefault(key, {"calls": 0, "seconds": 0.0, "bytes": 0, "errors": 0})
+            data["calls"] += 1
+            data["seconds"] += sp.duration
+            data["bytes"] += int(sp.attrs.get("bytes", 0) or 0)
+            if sp.status != "ok":
+                data["errors"] += 1
+        return totals
+
+    def summary_lines(self, top=12):
+        rows = sorted(self.summary().items(), key=lambda kv: -kv[1]["seconds"])
+        lines = []
+        for (name, platform), data in rows[:top]:
+            label = f"{name}[{platform}]" if platform else name
+            lines.append(f"{label:34} {data['seconds']:8.2f}s  x{data['calls']}")
+        return lines
+
+    # =====================================================
+    # EXPORT
+    # =====================================================
+
+    @staticmethod
+    def _atomic_write(path, text):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def export_json(self, path, results=None):
+        payload = {
+            "started": self.started,
+            "duration": time.time() - self.started,
+            "results": results or {},
+            "spans": [sp.to_dict() for sp in list(self.spans)],
+        }
+        self._atomic_write(path, json.dumps(payload, indent=2, default=str))
+
+    def export_prometheus(self, path, results=None):
+        """Node-exporter textfile format; written atomically."""
+        lines = [
+            "# HELP social_auto_stage_seconds_total Wall time spent per stage.",
+            "# TYPE social_auto_stage_seconds_total counter",
+        ]
+        summary = self.summary()
+
+        def labels(name, platform):
+            out = f'stage="{name}"'
+            if platform:
+                out += f',platform="{platform}"'
+            return out
+
+        for (name, platform), data in sorted(summary.items()):
+            lines.append(f"social_auto_stage_seconds_total{{{labels(name, platform)}}} {data['seconds']:.6f}")
+
+        lines += [
+            "# HELP social_auto_stage_calls_total Number of spans per stage.",
+            "# TYPE social_auto_stage_calls_total counter",
+        ]
+        for (name, platform), data in sorted(summary.items()):
+            lines.append(f"social_auto_stage_calls_total{{{labels(name, platform)}}} {data['calls']}")
+
+        lines += [
+            "# HELP social_auto_stage_bytes_total Bytes transferred per stage.",
+            "# TYPE social_auto_stage_bytes_total counter",
+        ]
+        for (name, platform), data in sorted(summary.items()):
+            if data["bytes"]:
+                lines.append(f"social_auto_stage_bytes_total{{{labels(name, platform)}}} {data['bytes']}")
+
+        lines += [
+            "# HELP social_auto_stage_errors_total Spans that ended with an exception.",
+            "# TYPE social_auto_stage_errors_total counter",
+        ]
+        for (name, platform), data in sorted(summary.items()):
+            lines.append(f"social_auto_stage_errors_total{{{labels(name, platform)}}} {data['errors']}")
+
+        if results:
+            lines += [
+                "# HELP social_auto_posts_total Post outcomes per platform.",
+                "# TYPE social_auto_posts_total counter",
+            ]
+            for platform, counts in sorted(results.items()):
+                for outcome, value in sorted(counts.items()):
+                    lines.append(f'social_auto_posts_total{{platform="{platform}",result="{outcome}"}} {value}')
+
+        lines += [
+            "# HELP social_auto_run_duration_seconds Duration of the last run.",
+            "# TYPE social_auto_run_duration_seconds gauge",
+            f"social_auto_run_duration_seconds {time.time() - self.started:.3f}",
+            "# HELP social_auto_last_run_timestamp_seconds Unix time the last run finished.",
+            "# TYPE social_auto_last_run_timestamp_seconds gauge",
+            f"social_auto_last_run_timestamp_seconds {time.time():.0f}",
+        ]
+
+        self._atomic_write(path, "\n".join(lines) + "\n")
+
+
+# One tracer per process; main exports it at the end of the run.
+TRACER = Tracer()
@@ -24,9 +24,17 @@ class MediaVerifier:
         if not os.path.exists(file_path):
             return False, "File not found on local disk"
 
+        is_safe, msg = MediaVerifier.verify_size(os.path.getsize(file_path), platform_name, media_type)
+        if not is_safe:
+            logger.warning(f"   ⚠️ {msg}")
+        return is_safe, msg
+
+    @staticmethod
+    def verify_size(size_bytes, platform_name, media_type):
+        """The size rules alone, for files known only from a listing."""
         # Get file size in MB
-        file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
-        
+        file_size_mb = size_bytes / (1024 * 1024)
+
         # Get platform limits
         platform_limits = MediaVerifier.LIMITS.get(platform_name.lower())
         if not platform_limits:
@@ -36,7 +44,6 @@ class MediaVerifier:
 
         if file_size_mb > max_allowed:
             error_msg = f"File too large: {file_size_mb:.2f}MB (Max {max_allowed}MB for {platform_name} {media_type})"
-            logger.warning(f"   ⚠️ {error_msg}")
             return False, error_msg
 
-        return True, "Safe"
\ No newline at end of file
+        return True, "Safe"
@@ -1,28 +1,44 @@
 import os
 import json
 import time
+import random
+import signal
 import logging
+import argparse
+import functools
+import threading
 import sys
+from datetime import timedelta
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Core Modules
 from core.retry_manager import SmartRetry
 from core.verifier import MediaVerifier
+from core.tracing import TRACER
+from core.timeouts import THROUGHPUT
+from core.progress import PROGRESS
+from core.planner import RunPlanner, POST_COSTS, DEFAULT_BPS
+from core.idempotency import LEDGER
+from core.leases import LEASES, open_store
+from core.scheduler import PostPacer, SlotSchedule, sleep_until
+from core.supervisor import SUPERVISOR, DeadlineExceeded, RunDeadlineExceeded
+from core.governor import GOVERNOR
+from core.retry_budget import RETRY_BUDGET
+from core.profiler import PROFILER
+from core.quota import QUOTA
 
 # Project Modules
 from modules.dropbox_handler import DropboxHandler
+from modules.local_source import LocalDirectorySource
+from modules.media_cache import MediaCache
 from modules.caption_generator import CaptionGenerator
+from modules.hashtag_index import HASHTAGS
 from modules.utils import setup_logging
 
-# Platform Classes
-from platforms.instagram import InstagramPoster
-from platforms.facebook import FacebookPoster
-from platforms.threads import ThreadsPoster
-from platforms.twitter import TwitterPoster
-from platforms.telegram import TelegramPoster
-from platforms.discord import DiscordPoster
-from platforms.tumblr import TumblrPoster
+# Platform Registry (posters are imported lazily)
+from platforms.registry import PlatformRegistry, PLATFORM_CLASSES
 
 
 # ============================================
@@ -35,9 +51,14 @@ logger = setup_logging()
 PLATFORM_RESULTS = defaultdict(lambda: {
     "success": 0,
     "failed": 0,
-    "skipped": 0
+    "skipped": 0,
+    "timeouts": 0
 })
 
+# Whether the task this thread is posting is a fair post-cost sample.
+# publish_plan sets it; posts that were skipped, failed or killed clear it.
+POST_TIMING = threading.local()
+
 
 # ============================================
 # CAPTION BUILDER (Non-Tumblr Platforms)
@@ -73,52 +94,276 @@ def safe_trim_caption(text: str, limit: int) -> str:
 # SAFE POST WRAPPER
 # ============================================
 
-def safe_post(platform_name, platform_obj, method_name,
-              file_arg, caption, retry_engine,
-              local_path, media_type):
-
-    # Media verification
-    is_safe, msg = MediaVerifier.verify(local_path, platform_name, media_type)
+def verify_media(platform_name, local_path, media_type):
+    with TRACER.span("verify", platform=platform_name):
+        is_safe, msg = MediaVerifier.verify(local_path, platform_name, media_type)
 
     if not is_safe:
         logger.warning(f"{platform_name.upper()} skipped: {msg}")
         PLATFORM_RESULTS[platform_name]["skipped"] += 1
+
+    return is_safe
+
+
+def safe_post(platform_name, platforms, method_name,
+              file_arg, caption, retry_engine,
+              local_path, media_type):
+
+    # Media verification
+    if not verify_media(platform_name, local_path, media_type):
         return False
 
-    try:
-        logger.info(f"{platform_name.upper()} uploading...")
+    return _execute_post(platform_name, platforms, method_name, file_arg,
+                         caption, retry_engine, [local_path],
+                         uploads_file=file_arg == local_path)
 
-        method = getattr(platform_obj, method_name)
 
-        result = retry_engine.execute(method, file_arg, caption)
+def safe_post_album(platform_name, platforms, file_args, caption,
+                    retry_engine, local_paths, media_type):
+    """
+    One post_images() call for a group of already-verified files.
+    Results are counted per file.
+    """
+    return _execute_post(platform_name, platforms, "post_images", file_args,
+                         caption, retry_engine, local_paths,
+                         uploads_file=file_args == local_paths)
 
-        if result is True:
-            PLATFORM_RESULTS[platform_name]["success"] += 1
-            logger.info(f"{platform_name.upper()} success")
-            return True
 
-        else:
-            PLATFORM_RESULTS[platform_name]["failed"] += 1
-            logger.error(f"{platform_name.upper()} failed (API returned False)")
+def _execute_post(platform_name, platforms, method_name, file_arg, caption,
+                  retry_engine, local_paths, uploads_file):
+    count = len(local_paths)
+
+    # URL-first calls make Meta fetch the file; only local uploads move bytes
+    sent_bytes = sum(os.path.getsize(p) for p in local_paths) if uploads_file else 0
+
+    with TRACER.span("platform.post", platform=platform_name, method=method_name,
+                     bytes=sent_bytes, files=count) as post_span:
+        try:
+            logger.info(f"{platform_name.upper()} uploading...")
+
+            poster = platforms.get(platform_name)
+            method = getattr(poster, method_name)
+
+            # Went out in an earlier run that died before saving progress
+            remote_id = LEDGER.posted(platform_name, caption, local_paths)
+            sent = not remote_id
+            if remote_id:
+                logger.warning(f"{platform_name.upper()} already posted (id {remote_id}), not sending again")
+                POST_TIMING.fair = False
+                result = True
+            else:
+                LEDGER.begin(platform_name, caption, local_paths)
+
+                # Retries run inside the supervised worker, under one deadline;
+                # each retry first checks whether the last attempt landed
+                execute = functools.partial(retry_engine.execute,
+                                            verify=getattr(poster, "find_posted", None))
+                result = SUPERVISOR.call(platform_name, poster,
+                                         execute, method, file_arg, caption)
+
+            if result is True:
+                PLATFORM_RESULTS[platform_name]["success"] += count
+                # The earlier run's post was counted when it went out
+                if sent:
+                    QUOTA.record(platform_name)
+                post_span.set(result="success")
+                logger.info(f"{platform_name.upper()} success")
+                return True
+
+            else:
+                PLATFORM_RESULTS[platform_name]["failed"] += count
+                POST_TIMING.fair = False
+                post_span.set(result="failed")
+                logger.error(f"{platform_name.upper()} failed (API returned False)")
+                return False
+
+        except DeadlineExceeded as e:
+            POST_TIMING.fair = False
+            # The kill may have come after the platform accepted the post
+            if find_posted(poster, file_arg, caption):
+                PLATFORM_RESULTS[platform_name]["success"] += count
+                QUOTA.record(platform_name)
+                post_span.set(result="success", error=type(e).__name__)
+                logger.warning(f"{platform_name.upper()} killed after the post went out: {e}")
+                return True
+
+            PLATFORM_RESULTS[platform_name]["failed"] += count
+            PLATFORM_RESULTS[platform_name]["timeouts"] += 1
+            post_span.set(result="timeout", error=type(e).__name__)
+            logger.error(f"{platform_name.upper()} killed: {e}")
             return False
 
+        except Exception as e:
+            PLATFORM_RESULTS[platform_name]["failed"] += count
+            POST_TIMING.fair = False
+            post_span.set(result="failed", error=getattr(e, "kind", type(e).__name__))
+            logger.exception(f"{platform_name.upper()} exception: {str(e)}")
+            return False
+
+
+# ============================================
+# PLATFORM DISPATCH
+# ============================================
+
+# Meta pulls media from a public URL; local upload is only a fallback
+URL_FIRST_PLATFORMS = ["instagram", "threads"]
+
+
+def format_caption(caption_payload, p_name, p_conf):
+    # Tumblr handles caption internally
+    if p_name == "tumblr":
+        return caption_payload
+
+    limit = p_conf[p_name].get("limit", 2000)
+    formatted = build_caption(caption_payload, p_name)
+    return safe_trim_caption(formatted, limit)
+
+
+def post_single(p_name, item, media, platforms, p_conf, retry_engine):
+    method = "post_video" if media == "video" else "post_image"
+    final_caption = format_caption(item["caption"], p_name, p_conf)
+
+    posted = False
+
+    # URL-first platforms
+    if p_name in URL_FIRST_PLATFORMS:
+        posted = safe_post(
+            p_name,
+            platforms,
+            method,
+            item["public_url"],
+            final_caption,
+            retry_engine,
+            item["local_path"],
+            media
+        )
+
+    # Fallback or normal platforms
+    if not posted:
+        posted = safe_post(
+            p_name,
+            platforms,
+            method,
+            item["local_path"],
+            final_caption,
+            retry_engine,
+            item["local_path"],
+            media
+        )
+
+    return posted
+
+
+def supports_album(p_name, platforms, p_conf):
+    """
+    Album mode is opt-in per platform: with "album": true in its
+    platforms entry (and images_per_run > 1), a run's images go out as
+    one post per MAX_ALBUM files instead of one post each.
+    """
+    if not p_conf[p_name].get("album"):
+        return False
+    try:
+        return hasattr(platforms.get(p_name), "post_images")
     except Exception as e:
-        PLATFORM_RESULTS[platform_name]["failed"] += 1
-        logger.exception(f"{platform_name.upper()} exception: {str(e)}")
+        logger.error(f"{p_name.upper()} init failed: {e}")
         return False
 
 
+def album_size(targets, platforms, p_conf):
+    """
+    Files per album when every target posts a run's images as albums
+    (the smallest MAX_ALBUM among them), else None.
+    """
+    if not targets or not all(supports_album(p, platforms, p_conf) for p in targets):
+        return None
+    return min(getattr(platforms.get(p), "MAX_ALBUM", 10) for p in targets)
+
+
+def post_album_chunk(p_name, chunk, media, platforms, p_conf, retry_engine):
+    """
+    Album mode: one post for a chunk of up to the poster's MAX_ALBUM
+    queued files. Returns {path_lower: posted}.
+    """
+    outcome = {}
+    url_first = p_name in URL_FIRST_PLATFORMS
+
+    ready = []
+    for item in chunk:
+        path = item["file"].path_lower
+        if url_first and not item["public_url"]:
+            logger.error(f"{p_name.upper()} no public URL for {item['file'].name}")
+            PLATFORM_RESULTS[p_name]["failed"] += 1
+            outcome[path] = False
+        elif verify_media(p_name, item["local_path"], media):
+            ready.append(item)
+        else:
+            outcome[path] = False
+
+    if len(ready) == 1:
+        posted = post_single(p_name, ready[0], media, platforms, p_conf, retry_engine)
+    elif ready:
+        key = "public_url" if url_first else "local_path"
+        posted = safe_post_album(
+            p_name,
+            platforms,
+            [item[key] for item in ready],
+            format_caption(ready[0]["caption"], p_name, p_conf),
+            retry_engine,
+            [item["local_path"] for item in ready],
+            media
+        )
+
+    for item in ready:
+        outcome[item["file"].path_lower] = posted
+
+    return outcome
+
+
 # ============================================
 # FINAL SUMMARY
 # ============================================
 
-def print_final_summary(enabled_platforms, total_platforms, dbx, platforms):
+def export_metrics(metrics_dir):
+    results = {k: dict(v) for k, v in PLATFORM_RESULTS.items()}
+    try:
+        TRACER.export_json(os.path.join(metrics_dir, "run_metrics.json"), results)
+        TRACER.export_prometheus(os.path.join(metrics_dir, "social_auto.prom"), results)
+        PROFILER.dump()
+        logger.info(f"Metrics exported to {metrics_dir}/")
+    except Exception as e:
+        logger.error(f"Metrics export failed: {e}")
+
+
+def find_posted(poster, file_arg, caption):
+    verify = getattr(poster, "find_posted", None)
+    if verify is None:
+        return None
+    try:
+        with TRACER.span("retry.verify"):
+            return verify(file_arg, caption)
+    except Exception as e:
+        logger.warning(f"Post check failed: {e}")
+        return None
+
+
+def save_state():
+    # Persisted across runs via the workflow cache
+    THROUGHPUT.save()
+    POST_COSTS.save()
+    PROGRESS.save()
+    LEDGER.save()
+    QUOTA.save()
+    HASHTAGS.save()
+
+
+def log_summary(enabled_platforms, total_platforms, dbx):
 
     total_success = sum(d["success"] for d in PLATFORM_RESULTS.values())
     total_failed = sum(d["failed"] for d in PLATFORM_RESULTS.values())
     total_skipped = sum(d["skipped"] for d in PLATFORM_RESULTS.values())
 
-    dropbox_stats = dbx.get_folder_stats()
+    with TRACER.span("dropbox.stats"):
+        dropbox_stats = dbx.get_folder_stats()
 
     summary_lines = []
     summary_lines.append("=" * 60)
@@ -149,13 +394,30 @@ def print_final_summary(enabled_platforms, total_platforms, dbx, platforms):
     summary_lines.append(f"Images          : {dropbox_stats['images']}")
     summary_lines.append("-" * 60)
     summary_lines.append(f"TOTAL FILES     : {dropbox_stats['total']}")
+    retries = RETRY_BUDGET.usage()
+    summary_lines.append(
+        f"RETRIES         : {retries['retries']}/{RETRY_BUDGET.run_retries} "
+        f"({retries['wasted_seconds']:.0f}s/{RETRY_BUDGET.run_seconds}s wasted)"
+    )
+    summary_lines.append("=" * 60)
+    summary_lines.append("TIME BY STAGE")
+    summary_lines.append("-" * 60)
+    summary_lines.extend(TRACER.summary_lines())
     summary_lines.append("=" * 60)
 
     final_summary = "\n".join(summary_lines)
 
     logger.info("\n" + final_summary)
 
-    
+    return total_success, total_failed
+
+
+def print_final_summary(enabled_platforms, total_platforms, dbx, metrics_dir="metrics"):
+
+    total_success, total_failed = log_summary(enabled_platforms, total_platforms, dbx)
+
+    export_metrics(metrics_dir)
+    save_state()
 
     # Cron-safe exit
     if total_success == 0 and total_failed > 0:
@@ -163,134 +425,944 @@ def print_final_summary(enabled_platforms, total_platforms, dbx, platforms):
     else:
         sys.exit(0)
 
-# MAIN WORKFLOW
+
+# ============================================
+# RUN STEPS (shared by cron and daemon mode)
 # ============================================
 
-def main():
+SOURCES = [
+    {"id": "ig", "flag": "upload_from_ig", "media": "video", "cap": "instagram"},
+    {"id": "general", "flag": "upload_from_general", "media": "video", "cap": "general_video"},
+    {"id": "image", "flag": "upload_from_images", "media": "image", "cap": "image"},
+]
 
-    logger.info("=" * 50)
-    logger.info("UNIVERSAL ROTATING WORKFLOW STARTED")
-    logger.info("=" * 50)
 
-    config = json.load(open("config.json", "r"))
+def active_sources(platforms, p_conf):
+    # Only sources that at least one enabled platform consumes
+    return [
+        src for src in SOURCES
+        if any(p_conf[p].get(src["flag"]) for p in platforms)
+    ]
 
-    dbx = DropboxHandler(config["dropbox"])
-    ai = CaptionGenerator(config)
-    p_conf = config["platforms"]
 
-    retry_engine = SmartRetry(
-        max_attempts=config["settings"].get("retry_count", 3)
-    )
+def source_targets(src, platforms, p_conf):
+    return [p for p in platforms if p_conf[p].get(src["flag"])]
 
-    delay = config["settings"].get("post_delay", 10)
 
-    mapping = {
-        "instagram": InstagramPoster,
-        "facebook": FacebookPoster,
-        "threads": ThreadsPoster,
-        "twitter": TwitterPoster,
-        "telegram": TelegramPoster,
-        "discord": DiscordPoster,
-        "tumblr": TumblrPoster,
+def adopt_claims(files):
+    """Carry on from the platforms another worker reached before releasing a file."""
+    for file in files:
+        for p_name in LEASES.handed_over(file.path_lower).get("posted", []):
+            PROGRESS.mark(file.path_lower, p_name)
+
+
+def claim_batch(dbx, src, targets, count):
+    """
+    Claim up to `count` of a source's queued files for `targets`: files
+    already posted elsewhere that still owe one of them come first, then
+    fresh files at random. Files owed only to other platforms are left.
+    """
+    queue = dbx.queued_files(src["id"])
+    owed = [
+        f for f in queue
+        if PROGRESS.started(f.path_lower) and PROGRESS.remaining(f.path_lower, targets)
+    ]
+    fresh = [f for f in queue if not PROGRESS.started(f.path_lower)]
+    files = dbx.claim_files(owed + random.sample(fresh, len(fresh)), count)
+    adopt_claims(files)
+    return files
+
+
+def over_quota(platforms, names):
+    """
+    Platforms among `names` at their publishing cap. Platforms that
+    report their own usage are asked (at most every refresh_minutes).
+    """
+    blocked = []
+    for p_name in names:
+        try:
+            if hasattr(platforms.poster_class(p_name), "quota_usage"):
+                QUOTA.update(p_name, platforms.get(p_name).quota_usage)
+        except Exception as e:
+            logger.error(f"{p_name.upper()} init failed: {e}")
+        if not QUOTA.allows(p_name):
+            logger.warning(f"{p_name.upper()} publishing quota used up ({QUOTA.describe(p_name)}), not posting")
+            blocked.append(p_name)
+    return blocked
+
+
+def release_claim(path):
+    # Unfinished: the next owner gets the platforms already done
+    posted = PROGRESS.posted(path)
+    LEASES.release(path, {"posted": posted} if posted else None)
+
+
+def prepare_items(dbx, ai, src, files, album=None):
+    """
+    Download, temp link and caption per file; failed downloads stay queued.
+    With album (see album_size) every post is an album under its first
+    file's caption, so only that file gets one and the rest share it.
+    """
+    items = []
+
+    # Captions are requested up front so the LLM overlaps the downloads
+    captions = {
+        file.path_lower: ai.start(file.name, src["cap"])
+        for i, file in enumerate(files) if not album or i % album == 0
     }
 
-    total_platforms = len(mapping)
+    for file in files:
+        logger.info(f"\nProcessing {src['id'].upper()} → {file.name}")
+
+        local_path = dbx.cached_file(file)
+        if local_path:
+            logger.info(f"Media cache hit: {file.name}")
+        else:
+            started = time.monotonic()
+            with TRACER.span("dropbox.download", bytes=file.size):
+                local_path = dbx.download_file(file)
+            if local_path:
+                # Feeds the download estimate of --plan
+                THROUGHPUT.record("dropbox.download", file.size, time.monotonic() - started)
+
+        if not local_path:
+            logger.error(f"Download failed, leaving {file.name} queued")
+            LEASES.release(file.path_lower)
+            continue
+
+        with TRACER.span("dropbox.temp_link"):
+            public_url = dbx.get_temp_link(file)
+
+        if album and len(items) % album:
+            leader = items[len(items) - len(items) % album]
+            items.append({
+                "file": file,
+                "source": src["id"],
+                "local_path": local_path,
+                "public_url": public_url,
+                "caption": leader["caption"],
+                "shared_caption": True,
+            })
+            continue
+
+        # A failed download can make a file without a caption lead its album
+        handle = captions.get(file.path_lower) or ai.start(file.name, src["cap"])
+        with TRACER.span("caption", group=src["cap"]):
+            caption_payload = ai.result(handle)
+
+        items.append({
+            "file": file,
+            "source": src["id"],
+            "local_path": local_path,
+            "public_url": public_url,
+            "caption": caption_payload,
+        })
+
+    return items
+
 
-    platforms = {
-        name: cls()
-        for name, cls in mapping.items()
-        if p_conf.get(name, {}).get("enabled")
+def plan_tasks(batches, platforms, p_conf):
+    """
+    One task per post still owed: a file, or an album chunk, to one
+    platform. batches is [(src, items, targets)].
+    """
+    tasks = []
+
+    for src, items, targets in batches:
+        for p_name in targets:
+            todo = [
+                item for item in items
+                if PROGRESS.remaining(item["file"].path_lower, [p_name])
+                and LEASES.holds(item["file"].path_lower)
+            ]
+            if not todo:
+                continue
+
+            if len(todo) > 1 and supports_album(p_name, platforms, p_conf):
+                size = getattr(platforms.get(p_name), "MAX_ALBUM", 10)
+                groups = [todo[i:i + size] for i in range(0, len(todo), size)]
+            else:
+                groups = [[item] for item in todo]
+
+            for group in groups:
+                kind = "album" if len(group) > 1 else src["media"]
+                tasks.append({
+                    "platform": p_name,
+                    "media": src["media"],
+                    "items": group,
+                    "kind": kind,
+                    "key": f"{p_name}.{kind}",
+                    "files": len(group),
+                    "bytes": sum(os.path.getsize(item["local_path"]) for item in group),
+                })
+
+    return tasks
+
+
+def publish_plan(batches, platforms, p_conf, retry_engine, delay, budget=None, parallel=1):
+    """
+    Post every batch's items to the targets they have not reached yet,
+    cheapest posts first, starting only what fits the run budget. With
+    parallel > 1, up to that many platforms post at once; each platform
+    still takes its own posts one at a time.
+    Returns {path_lower: {platform: posted}}.
+    """
+    results = {
+        item["file"].path_lower: {}
+        for _, items, _ in batches for item in items
     }
 
-    enabled_names = list(platforms.keys())
+    planner = RunPlanner(budget=budget, delay=delay)
+    tasks = planner.order(plan_tasks(batches, platforms, p_conf))
 
-    sources = [
-        {"id": "ig", "flag": "upload_from_ig", "media": "video", "cap": "instagram"},
-        {"id": "general", "flag": "upload_from_general", "media": "video", "cap": "general_video"},
-        {"id": "image", "flag": "upload_from_images", "media": "image", "cap": "image"},
-    ]
+    def run_task(task):
+        p_name = task["platform"]
+        names = ", ".join(item["file"].name for item in task["items"])
 
-    for src in sources:
+        if SUPERVISOR.expired():
+            logger.warning("Run deadline reached, remaining posts deferred")
+            return False
+
+        # Our own posts this run may have used up the rest
+        if not QUOTA.allows(p_name):
+            logger.warning(f"{p_name.upper()} deferred {names}: publishing quota used up")
+            return True
+
+        if not planner.admit(task):
+            logger.warning(
+                f"{p_name.upper()} deferred {names}: needs ~{task['estimate']:.0f}s, "
+                f"{planner.remaining():.0f}s left"
+            )
+            return True
 
-        file = dbx.get_file(src["id"])
+        started = time.monotonic()
+        POST_TIMING.fair = True
 
-        targets = [
-            p for p in platforms
-            if p_conf[p].get(src["flag"])
-        ]
+        if task["kind"] == "album":
+            outcome = post_album_chunk(p_name, task["items"], task["media"],
+                                       platforms, p_conf, retry_engine)
+        else:
+            item = task["items"][0]
+            outcome = {item["file"].path_lower: post_single(
+                p_name, item, task["media"], platforms, p_conf, retry_engine
+            )}
+
+        # Skips, failures and kills would drag the estimates toward 0 or the deadline
+        if POST_TIMING.fair and outcome and all(outcome.values()):
+            planner.observe(task, time.monotonic() - started)
+
+        for path, posted in outcome.items():
+            results[path][p_name] = posted
+            if posted:
+                PROGRESS.mark(path, p_name)
+
+        with TRACER.span("post_delay"):
+            time.sleep(delay)
+        return True
+
+    if parallel <= 1:
+        for task in tasks:
+            if not run_task(task):
+                break
+        return results
+
+    # One lane per platform, in plan order within the lane
+    lanes = defaultdict(list)
+    for task in tasks:
+        lanes[task["platform"]].append(task)
+
+    def run_lane(lane):
+        for task in lane:
+            if not run_task(task):
+                return
+
+    with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="lane") as pool:
+        for future in [pool.submit(run_lane, lane) for lane in lanes.values()]:
+            future.result()
+
+    return results
+
+
+def settle_item(dbx, src, item, outcome, targets):
+    """
+    Delete when every target has the file, move it to /failed on any
+    failure, and otherwise (run deadline) leave it queued for the next run,
+    which only posts to the platforms still missing.
+    """
+    path = item["file"].path_lower
+
+    if not all(outcome.values()):
+        finish_item(dbx, src, item, failed=True)
+        return
+
+    remaining = PROGRESS.remaining(path, targets)
+    if remaining:
+        logger.warning(f"{item['file'].name} deferred, still owed to: {', '.join(remaining)}")
+        dbx.release_file(item["local_path"])
+        release_claim(path)
+        return
+
+    finish_item(dbx, src, item, failed=False)
+
+
+def finish_item(dbx, src, item, failed):
+    file = item["file"]
+    # Posted everywhere: the cached copy is done. Failed files keep theirs
+    # for a re-drive until LRU eviction.
+    dbx.release_file(item["local_path"], drop=not failed)
+    PROGRESS.forget(file.path_lower)
+    # Held until flush() has removed it, so nobody claims it in between
+    LEASES.finish(file.path_lower)
+
+    # Queued on the handler; sent in one batch by dbx.flush()
+    if not failed:
+        # Tags that made it out everywhere feed the hashtag index, once
+        # per caption sent (album members only carry their leader's)
+        if isinstance(item["caption"], dict) and not item.get("shared_caption"):
+            HASHTAGS.learn(file.name, item["caption"].get("tags", []))
+        dbx.delete_file(file)
+        logger.info(f"Dropbox file queued for deletion (all targets success): {file.name}")
+    else:
+        dbx.move_to_failed(file, src["id"])
+        logger.warning(f"{file.name} queued for the failed folder due to upload failures")
+
+
+# ============================================
+# MAIN WORKFLOW (one run per cron trigger)
+# ============================================
 
-        if not file or not targets:
+def run_once(config, dbx, ai, platforms, retry_engine):
+
+    p_conf = config["platforms"]
+    delay = config["settings"].get("post_delay", 10)
+    images_per_run = config["settings"].get("images_per_run", 1)
+    metrics_dir = config["settings"].get("metrics_dir", "metrics")
+    run_budget = config["settings"].get("run_budget")
+    parallel = config["settings"].get("parallel_uploads", 1)
+
+    sources = active_sources(platforms, p_conf)
+
+    # Early exit: nothing queued -> no captions, no poster imports
+    with TRACER.span("dropbox.list"):
+        queue_sizes = dbx.queue_sizes([src["id"] for src in sources])
+    logger.info(f"Queued files: {queue_sizes}")
+
+    if not any(queue_sizes.values()):
+        logger.info("All queues empty. Nothing to post.")
+        export_metrics(metrics_dir)
+        sys.exit(0)
+
+    SUPERVISOR.start_run()
+    RETRY_BUDGET.start_run()
+
+    # Capped platforms are dropped before anything is claimed or downloaded;
+    # their files stay queued (as after a run deadline) until the cap frees.
+    # Only platforms a queued file goes to are asked (and their posters built).
+    wanted = {
+        p for src in sources if queue_sizes.get(src["id"])
+        for p in source_targets(src, platforms, p_conf)
+    }
+    blocked = over_quota(platforms, [p for p in platforms if p in wanted])
+
+    try:
+        # Everything is fetched first so the planner can order all posts
+        batches = []
+        for src in sources:
+
+            if SUPERVISOR.expired():
+                logger.warning("Run deadline reached, remaining sources stay queued")
+                break
+
+            targets = source_targets(src, platforms, p_conf)
+            open_targets = [p for p in targets if p not in blocked]
+            if not open_targets:
+                continue
+
+            # Files owed only to capped platforms are not claimed at all
+            count = images_per_run if src["media"] == "image" else 1
+            files = claim_batch(dbx, src, open_targets, count)
+            if not files:
+                continue
+
+            items = prepare_items(dbx, ai, src, files,
+                                  album_size(open_targets, platforms, p_conf))
+            if items:
+                batches.append((src, items, targets))
+
+        results = publish_plan(batches, platforms, p_conf, retry_engine,
+                               delay, budget=run_budget, parallel=parallel)
+
+        for src, items, targets in batches:
+            for item in items:
+                settle_item(dbx, src, item, results[item["file"].path_lower], targets)
+
+    except RunDeadlineExceeded as e:
+        logger.error(f"Run deadline reached ({e}). Unfinished files stay queued.")
+
+    finally:
+        SUPERVISOR.stop_run()
+
+        # Deletes/moves go out as one batch job each, even if a source crashed
+        with TRACER.span("dropbox.flush"):
+            dbx.flush()
+
+        LEASES.release_finished()
+        for path in list(LEASES.held):
+            release_claim(path)
+        LEASES.stop()
+
+    print_final_summary(list(platforms), len(PLATFORM_CLASSES), dbx, metrics_dir)
+
+
+# ============================================
+# DAEMON MODE (slots from settings.schedule)
+# ============================================
+
+def prepare_slot(dbx, ai, platforms, p_conf, scheduled, slot_platforms,
+                 prepared, images_per_run, refresh=True):
+    """
+    Everything a slot needs before its publish time: fresh listings,
+    warm posters, downloaded media and captions. `scheduled` is every
+    platform the resident loop posts to.
+    Returns [(src, slot_targets, all_targets, items)].
+    """
+    sources = active_sources(platforms, p_conf)
+
+    if refresh:
+        with TRACER.span("dropbox.list"):
+            dbx.queue_sizes([src["id"] for src in sources], refresh=True)
+
+    queued = {f.path_lower for src in sources for f in dbx.queued_files(src["id"])}
+
+    # Files removed from Dropbox by hand (or by another worker) since the last slot
+    for path in [p for p in prepared if p not in queued]:
+        dbx.release_file(prepared.pop(path)["local_path"], drop=True)
+        LEASES.release(path)
+
+    for p_name in slot_platforms:
+        try:
+            platforms.get(p_name)
+        except Exception as e:
+            logger.error(f"{p_name.upper()} init failed: {e}")
+
+    batches = []
+
+    for src in sources:
+        all_targets = [
+            p for p in source_targets(src, platforms, p_conf)
+            if p in scheduled
+        ]
+        slot_targets = [p for p in all_targets if p in slot_platforms]
+        if not slot_targets:
             continue
 
-        logger.info(f"\nProcessing {src['id'].upper()} → {file.name}")
+        # Files already posted elsewhere that still owe this slot come first
+        count = images_per_run if src["media"] == "image" else 1
+        files = claim_batch(dbx, src, slot_targets, count)
+
+        new_files = [f for f in files if f.path_lower not in prepared]
+        album = album_size(all_targets, platforms, p_conf)
+        for item in prepare_items(dbx, ai, src, new_files, album):
+            prepared[item["file"].path_lower] = item
+
+        items = []
+        for f in files:
+            item = prepared.get(f.path_lower)
+            if item is None:
+                continue
+            if f not in new_files:
+                # Temp links only live for four hours
+                with TRACER.span("dropbox.temp_link"):
+                    item["public_url"] = dbx.get_temp_link(f)
+            items.append(item)
+
+        if items:
+            batches.append((src, slot_targets, all_targets, items))
+
+    return batches
+
+
+def publish_slot(dbx, batches, prepared, platforms, p_conf, retry_engine, delay, budget,
+                 parallel=1):
+    """
+    Publish prepared batches and settle what is done: files every target
+    has get deleted, failures move to /failed, the rest stay prepared.
+    Returns {path_lower: {platform: posted}}.
+    """
+    SUPERVISOR.start_run()
+    RETRY_BUDGET.start_run()
+    results = {}
+
+    try:
+        with TRACER.span("slot.publish"):
+            results = publish_plan(
+                [(src, items, slot_targets) for src, slot_targets, _, items in batches],
+                platforms, p_conf, retry_engine, delay, budget=budget, parallel=parallel,
+            )
+
+            for src, slot_targets, all_targets, items in batches:
+                for item in items:
+                    path = item["file"].path_lower
+                    if not all(results[path].values()):
+                        finish_item(dbx, src, prepared.pop(path), failed=True)
+                    elif not PROGRESS.remaining(path, all_targets):
+                        finish_item(dbx, src, prepared.pop(path), failed=False)
+
+    except RunDeadlineExceeded as e:
+        # Posts that went out are in PROGRESS; the rest waits for the next slot
+        logger.error(f"Slot deadline reached ({e}). Unfinished files stay prepared.")
+
+    finally:
+        SUPERVISOR.stop_run()
+
+        with TRACER.span("dropbox.flush"):
+            dbx.flush()
+        LEASES.release_finished()
+
+    return results
+
+
+def end_slot(platforms, dbx, metrics_dir):
+    log_summary(list(platforms), len(PLATFORM_CLASSES), dbx)
+    export_metrics(metrics_dir)
+    save_state()
+
+    TRACER.reset()
+    PLATFORM_RESULTS.clear()
+
+
+def shutdown_resident(dbx, prepared):
+    # Cached media stays on disk for the next start
+    for item in prepared.values():
+        dbx.release_file(item["local_path"])
+    for path in list(LEASES.held):
+        release_claim(path)
+    LEASES.stop()
+    save_state()
+
+
+def run_daemon(config, dbx, ai, platforms, retry_engine):
+    """
+    Stay resident and publish at each slot of settings.schedule. Clients,
+    sessions and Dropbox listings stay warm between slots; media and
+    captions are prepared `prepare_minutes` ahead so the post goes out on
+    time. Each slot is exported like a cron run.
+    """
+    p_conf = config["platforms"]
+    settings = config["settings"]
+    delay = settings.get("post_delay", 10)
+    images_per_run = settings.get("images_per_run", 1)
+    metrics_dir = settings.get("metrics_dir", "metrics")
+    run_budget = settings.get("run_budget")
+    parallel = settings.get("parallel_uploads", 1)
+
+    schedule = SlotSchedule(settings.get("schedule", {}), list(platforms))
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    prepared = {}  # path_lower -> item, kept until every target has the file
+
+    logger.info(f"Daemon started: {len(schedule.slots)} daily slots ({schedule.tz.zone})")
+
+    while not stop.is_set():
+        slot_at, slot_platforms = schedule.next_slot()
+        logger.info(f"Next slot {schedule.describe(slot_at)}: {', '.join(slot_platforms)}")
+
+        prepare_at = slot_at - timedelta(seconds=schedule.prepare_seconds)
+        if not sleep_until(prepare_at, stop):
+            break
+
+        blocked = over_quota(platforms, slot_platforms)
+        slot_platforms = [p for p in slot_platforms if p not in blocked]
+
+        with TRACER.span("slot.prepare"):
+            batches = prepare_slot(dbx, ai, platforms, p_conf, schedule.platforms,
+                                   slot_platforms, prepared, images_per_run)
+
+        if not sleep_until(slot_at, stop):
+            break
+
+        publish_slot(dbx, batches, prepared, platforms, p_conf, retry_engine, delay,
+                     run_budget, parallel)
+        end_slot(platforms, dbx, metrics_dir)
+
+    shutdown_resident(dbx, prepared)
+    logger.info("Daemon stopped")
+
+
+# ============================================
+# INGEST MODE (post new files as they arrive)
+# ============================================
+
+def owed_platforms(dbx, sources, platforms, p_conf):
+    """Platforms some queued file still has to reach (from the cached listings)."""
+    return {
+        p
+        for src in sources
+        for f in dbx.queued_files(src["id"])
+        for p in PROGRESS.remaining(f.path_lower, source_targets(src, platforms, p_conf))
+    }
+
 
-        local_path = dbx.download_file(file)
-        public_url = dbx.get_temp_link(file)
+def run_ingest(config, dbx, ai, platforms, retry_engine):
+    """
+    Stay resident and post files soon after they land in the queues.
+
+    While nothing is owed the loop blocks in dbx.wait_for_changes(): a
+    Dropbox longpoll on the stored cursors (inotify for a local source),
+    so idle folders cost no listing calls. A change, or a paced platform
+    coming due, refreshes the listings from their cursors and publishes
+    to every platform whose settings.ingest interval has passed.
+    """
+    p_conf = config["platforms"]
+    settings = config["settings"]
+    ingest = settings.get("ingest", {})
+    delay = settings.get("post_delay", 10)
+    images_per_run = settings.get("images_per_run", 1)
+    metrics_dir = settings.get("metrics_dir", "metrics")
+    run_budget = settings.get("run_budget")
+    parallel = settings.get("parallel_uploads", 1)
+    idle_seconds = ingest.get("idle_wait_seconds", 900)
+
+    pacer = PostPacer(ingest, list(platforms),
+                      path=os.path.join(settings.get("state_dir", ".state"), "pacing.json"))
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    prepared = {}  # path_lower -> item, kept until every target has the file
+    changed = True  # list once at start
+
+    logger.info(f"Ingest started for {', '.join(sorted(pacer.platforms))}")
+
+    while not stop.is_set():
+        sources = active_sources(platforms, p_conf)
+
+        if changed:
+            # Only what changed since the stored cursors
+            with TRACER.span("dropbox.list"):
+                dbx.queue_sizes([src["id"] for src in sources], refresh=True)
+
+        owed = owed_platforms(dbx, sources, platforms, p_conf)
+        blocked = set(over_quota(platforms, sorted(owed & pacer.platforms)))
+        ready = [p for p in pacer.ready() if p in owed and p not in blocked]
+
+        if ready:
+            with TRACER.span("ingest.prepare"):
+                batches = prepare_slot(dbx, ai, platforms, p_conf, pacer.platforms,
+                                       ready, prepared, images_per_run, refresh=False)
+            if batches:
+                results = publish_slot(dbx, batches, prepared, platforms, p_conf,
+                                       retry_engine, delay, run_budget, parallel)
+                pacer.mark({p for outcome in results.values() for p, ok in outcome.items() if ok})
+                end_slot(platforms, dbx, metrics_dir)
+
+        # Wake for the next paced platform with work, else on a change.
+        # Work this round could not place (download failed, claimed
+        # elsewhere) is retried after idle_seconds.
+        paced = (owed_platforms(dbx, sources, platforms, p_conf) & pacer.platforms) - set(ready) - blocked
+        timeout = pacer.seconds_until(paced) if paced else idle_seconds
+        if paced:
+            logger.info(f"Waiting for new files; {', '.join(sorted(paced))} due in {timeout:.0f}s")
+        if blocked:
+            # Capped platforms are looked at again once their quota may have freed
+            timeout = min(timeout, min(QUOTA.resets_in(p) for p in blocked))
+
+        changed = dbx.wait_for_changes(timeout, stop)
+
+    shutdown_resident(dbx, prepared)
+    logger.info("Ingest stopped")
+
+
+# ============================================
+# PLAN MODE (what a run would do; nothing is posted)
+# ============================================
 
-        caption_payload = ai.generate(file.name, src["cap"])
+def plan_runs(dbx, sources, platforms, p_conf, images_per_run):
+    """
+    Split every queue into runs the way claim_batch takes files for
+    run_once (files still owed to a target first, then the fresh ones,
+    in queue order here where a run picks them at random) and build
+    each run's post tasks from the listing alone.
+    Returns (runs, files, skipped): runs is [{"tasks", "download"}],
+    files maps path_lower -> (run number, {platform: "post" | "done" |
+    "skip"}), and skipped is [(platform, file, reason)].
+    """
+    runs = defaultdict(lambda: {"tasks": [], "download": 0})
+    files, skipped = {}, []
 
-        file_failed = False
+    for src in sources:
+        count = images_per_run if src["media"] == "image" else 1
+        targets = source_targets(src, platforms, p_conf)
+        queue = sorted(dbx.queued_files(src["id"]), key=lambda f: not (
+            PROGRESS.started(f.path_lower) and PROGRESS.remaining(f.path_lower, targets)
+        ))
 
+        album_sizes = {}
         for p_name in targets:
+            cls = platforms.poster_class(p_name)
+            if p_conf[p_name].get("album") and hasattr(cls, "post_images"):
+                album_sizes[p_name] = getattr(cls, "MAX_ALBUM", 10)
+
+        for start in range(0, len(queue), count):
+            run = runs[start // count]
+            group = queue[start:start + count]
+
+            for f in group:
+                files[f.path_lower] = (start // count + 1, {})
+                if not dbx.has_local_copy(f):
+                    run["download"] += f.size
+
+            for p_name in targets:
+                todo = []
+                for f in group:
+                    if not PROGRESS.remaining(f.path_lower, [p_name]):
+                        files[f.path_lower][1][p_name] = "done"
+                        continue
+                    is_safe, msg = MediaVerifier.verify_size(f.size, p_name, src["media"])
+                    if is_safe:
+                        files[f.path_lower][1][p_name] = "post"
+                        todo.append(f)
+                    else:
+                        files[f.path_lower][1][p_name] = "skip"
+                        skipped.append((p_name, f, msg))
+
+                size = album_sizes.get(p_name) if len(todo) > 1 else None
+                chunks = [todo[i:i + size] for i in range(0, len(todo), size)] if size else [[f] for f in todo]
+
+                for chunk in chunks:
+                    kind = "album" if len(chunk) > 1 else src["media"]
+                    nbytes = sum(f.size for f in chunk)
+                    run["tasks"].append({
+                        "platform": p_name,
+                        "kind": kind,
+                        "key": f"{p_name}.{kind}",
+                        "files": len(chunk),
+                        "bytes": nbytes,
+                        # Meta fetches URL-first media itself
+                        "upload": 0 if p_name in URL_FIRST_PLATFORMS else nbytes,
+                    })
+
+    return [runs[i] for i in sorted(runs)], files, skipped
+
+
+def simulate_run(run, planner, parallel):
+    """(expected wall seconds, tasks the budget would defer) for one run."""
+    download = THROUGHPUT.expected_seconds("dropbox.download", run["download"])
+    if download is None:
+        download = run["download"] / DEFAULT_BPS
+
+    remaining = planner.remaining()
+    lanes = defaultdict(float)
+    deferred = []
+    for task in planner.order(run["tasks"]):
+        lane = task["platform"] if parallel > 1 else ""
+        cost = task["estimate"] + planner.delay
+        needed = task["estimate"] * planner.margin + planner.delay
+        if remaining is not None and download + lanes[lane] + needed > remaining:
+            deferred.append(task)
+            continue
+        lanes[lane] += cost
 
-            method = "post_video" if src["media"] == "video" else "post_image"
+    posting = max(max(lanes.values(), default=0.0), sum(lanes.values()) / max(parallel, 1))
+    return download + posting, deferred
 
-            # Tumblr handles caption internally
-            if p_name == "tumblr":
-                final_caption = caption_payload
-            else:
-                limit = p_conf[p_name].get("limit", 2000)
-                formatted = build_caption(caption_payload, p_name)
-                final_caption = safe_trim_caption(formatted, limit)
-
-            posted = False
-
-            # URL-first platforms
-            if p_name in ["instagram", "threads"]:
-                posted = safe_post(
-                    p_name,
-                    platforms[p_name],
-                    method,
-                    public_url,
-                    final_caption,
-                    retry_engine,
-                    local_path,
-                    src["media"]
-                )
-
-            # Fallback or normal platforms
-            if not posted:
-                result = safe_post(
-                    p_name,
-                    platforms[p_name],
-                    method,
-                    local_path,
-                    final_caption,
-                    retry_engine,
-                    local_path,
-                    src["media"]
-                )
-
-                if not result:
-                    file_failed = True
 
-            time.sleep(delay)
+def run_plan(config, dbx, platforms):
+    """
+    Dry run from saved state: the listing index written after each run,
+    MediaVerifier's size rules and the post cost history. Shows which
+    files would go where, what would be skipped, how many bytes would
+    move and how long the next run (and the whole queue) should take.
+    Nothing is listed, downloaded or posted, unless no index exists yet:
+    then the queues are listed once.
+    """
+    p_conf = config["platforms"]
+    settings = config["settings"]
+    parallel = settings.get("parallel_uploads", 1)
+
+    saved = dbx.load_index()
+    if saved is None:
+        logger.warning("No listing index yet (one is saved after each run); listing the queues")
+        origin = "live listing"
+    else:
+        origin = f"listing index from {timedelta(seconds=int(time.time() - saved))} ago"
 
-        if os.path.exists(local_path):
-            os.remove(local_path)
+    sources = active_sources(platforms, p_conf)
+    unindexed = [src["id"] for src in sources if saved is not None and not dbx.has_listing(src["id"])]
+    sources = [src for src in sources if src["id"] not in unindexed]
 
-        if not file_failed:
-            dbx.delete_file(file)
-            logger.info("Dropbox file deleted (all targets success)")
-        else:
-            dbx.move_to_failed(file, src["id"])
-            logger.warning("File moved to failed folder due to upload failures")
+    runs, files, skipped = plan_runs(dbx, sources, platforms, p_conf,
+                                     settings.get("images_per_run", 1))
+    planner = RunPlanner(budget=settings.get("run_budget"), delay=settings.get("post_delay", 10))
 
-    print_final_summary(enabled_names, total_platforms, dbx, platforms)
+    def mb(nbytes):
+        return f"{nbytes / 1024 / 1024:.1f} MB"
 
+    lines = ["=" * 60, f"RUN PLAN (dry run, {origin})", "=" * 60]
+    if unindexed:
+        lines.append(f"Not in the index (not planned): {', '.join(unindexed)}")
+    # From our own records only: nothing is asked of the platforms here
+    capped = [p for p in platforms if not QUOTA.allows(p)]
+    if capped:
+        lines.append(f"Publishing quota used up (posts wait for it): {', '.join(capped)}")
 
+    for src in sources:
+        queue = dbx.queued_files(src["id"])
+        lines.append(f"{src['id'].upper()} ({src['media']}): {len(queue)} queued "
+                     f"→ {', '.join(source_targets(src, platforms, p_conf))}")
+        for f in sorted(queue, key=lambda f: files[f.path_lower][0]):
+            run, plan = files[f.path_lower]
+            marks = " ".join(
+                p if state == "post" else f"{p}:{state}"
+                for p, state in plan.items()
+            )
+            lines.append(f"  run {run:<3} {f.name:40} {mb(f.size):>10}  {marks}")
+
+    if skipped:
+        lines += ["-" * 60, "SKIPPED (the file then goes to the failed folder)"]
+        lines += [f"  {p.upper():10} {f.name}: {reason}" for p, f, reason in skipped]
+
+    lines += ["-" * 60, "PER PLATFORM (whole queue)"]
+    totals = defaultdict(lambda: {"posts": 0, "files": 0, "bytes": 0, "seconds": 0.0})
+    for run in runs:
+        for task in run["tasks"]:
+            data = totals[task["platform"]]
+            data["posts"] += 1
+            data["files"] += task["files"]
+            data["bytes"] += task["upload"]
+            data["seconds"] += planner.estimate(task["key"], task["kind"], task["bytes"])
+    for p_name, data in totals.items():
+        lines.append(f"  {p_name.upper():10} {data['posts']:4} posts ({data['files']} files)  "
+                     f"upload {mb(data['bytes']):>10}  ~{data['seconds']:.0f}s")
+
+    lines += ["-" * 60]
+    if runs:
+        wall, deferred = simulate_run(runs[0], planner, parallel)
+        upload = sum(task["upload"] for task in runs[0]["tasks"])
+        lines.append(f"NEXT RUN   : {len(runs[0]['tasks'])} posts, download {mb(runs[0]['download'])}, "
+                     f"upload {mb(upload)}, ~{timedelta(seconds=int(wall))} expected")
+        if deferred:
+            lines.append(f"             {len(deferred)} posts would not fit the run budget and wait")
+        total = sum(simulate_run(run, planner, parallel)[0] for run in runs)
+        lines.append(f"WHOLE QUEUE: {len(runs)} runs, ~{timedelta(seconds=int(total))} of posting")
+    else:
+        lines.append("Nothing queued.")
+    lines.append("=" * 60)
 
-if __name__ == "__main__":
-    main()
+    logger.info("\n" + "\n".join(lines))
+
+
+def open_source(config):
+    """Media source from config["source"]: Dropbox (default) or a local directory."""
+    backend = config.get("source", {}).get("backend", "dropbox")
+    if backend == "local":
+        return LocalDirectorySource(config["local"], leases=LEASES)
+
+    media_cache = MediaCache(
+        config["settings"].get("media_cache_dir", ".cache/media"),
+        max_bytes=config["settings"].get("media_cache_mb", 2048) * 1024 * 1024,
+    )
+    return DropboxHandler(config["dropbox"], cache=media_cache, leases=LEASES)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Post queued media to the enabled platforms.")
+    parser.add_argument("--daemon", action="store_true",
+                        help="stay running and post at the slots in settings.schedule")
+    parser.add_argument("--ingest", action="store_true",
+                        help="stay running and post new files as they arrive, paced by settings.ingest")
+    parser.add_argument("--plan", action="store_true",
+                        help="show what a run would post and how long it would take, without posting")
+    args = parser.parse_args(argv)
+
+    logger.info("=" * 50)
+    logger.info("UNIVERSAL ROTATING WORKFLOW STARTED")
+    logger.info("=" * 50)
+
+    config = json.load(open("config.json", "r"))
+
+    # Opt-in: every traced stage gets CPU, stack and allocation profiles
+    profile_conf = config["settings"].get("profile", {})
+    if os.getenv("SOCIAL_AUTO_PROFILE", "").lower() in ("1", "true", "yes") or profile_conf.get("enabled"):
+        metrics_dir = config["settings"].get("metrics_dir", "metrics")
+        TRACER.observer = PROFILER.configure(
+            enabled=True,
+            directory=profile_conf.get("dir", os.path.join(metrics_dir, "profile")),
+            sample_ms=profile_conf.get("sample_ms", 5),
+            top=profile_conf.get("top", 25),
+            alloc_mb=profile_conf.get("alloc_mb", 8),
+        )
+
+    dbx = open_source(config)
+
+    lease_conf = config["settings"].get("leases", {})
+    LEASES.configure(open_store(lease_conf, getattr(dbx, "_get_client", None)),
+                     ttl=lease_conf.get("ttl", 900))
+    ai = CaptionGenerator(config)
+
+    retry_engine = SmartRetry(
+        max_attempts=config["settings"].get("retry_count", 3)
+    )
 
+    state_dir = config["settings"].get("state_dir", ".state")
 
+    SUPERVISOR.configure(
+        platform_deadline=config["settings"].get("platform_deadline", 600),
+        run_deadline=config["settings"].get("run_deadline"),
+        enabled=config["settings"].get("supervised", True),
+        overrides={
+            name: conf["deadline"]
+            for name, conf in config["platforms"].items() if "deadline" in conf
+        },
+    )
+
+    upload_conf = config["settings"].get("upload", {})
+    GOVERNOR.configure(
+        max_bps=(upload_conf.get("max_mbit") or 0) * 125000,
+        per_host=upload_conf.get("per_host", 2),
+        hosts=upload_conf.get("hosts"),
+    )
+
+    quota_conf = config["settings"].get("quota", {})
+    QUOTA.configure(
+        limits=quota_conf.get("limits"),
+        window_hours=quota_conf.get("window_hours", 24),
+        refresh_minutes=quota_conf.get("refresh_minutes", 15),
+    )
+
+    budget_conf = config["settings"].get("retry_budget", {})
+    RETRY_BUDGET.configure(
+        call_retries=budget_conf.get("call_retries", 4),
+        call_seconds=budget_conf.get("call_seconds", 300),
+        run_retries=budget_conf.get("run_retries", 40),
+        run_seconds=budget_conf.get("run_seconds", 900),
+    )
+
+    THROUGHPUT.load(os.path.join(state_dir, "throughput.json"))
+    POST_COSTS.load(os.path.join(state_dir, "post_costs.json"))
+    HASHTAGS.load(os.path.join(state_dir, "hashtags.idx"))
+    PROGRESS.load(os.path.join(state_dir, "post_progress.json"))
+    LEDGER.load(os.path.join(state_dir, "post_ledger.json"))
+    QUOTA.load(os.path.join(state_dir, "quota.json"))
+    dbx.index_path = os.path.join(state_dir, "listing_index.json")
+
+    platforms = PlatformRegistry(config["platforms"])
+
+    if args.plan:
+        run_plan(config, dbx, platforms)
+    elif args.ingest:
+        run_ingest(config, dbx, ai, platforms, retry_engine)
+    elif args.daemon:
+        run_daemon(config, dbx, ai, platforms, retry_engine)
+    else:
+        run_once(config, dbx, ai, platforms, retry_engine)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,141 @@
 import os
-from groq import Groq
+import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from modules.hashtag_index import HASHTAGS, tokenize
+
+LOCAL_TEMPLATES = {
+    "instagram": "{title} ✨",
+    "general_video": "{title}. Watch till the end!",
+    "image": "{title}",
+}
+
 
 class CaptionGenerator:
+    """
+    Captions from the Groq LLM, bounded by settings.caption_deadline.
+
+    start() fires the LLM request in the background and returns at once, so
+    callers can overlap it with the download; result() waits at most until
+    the deadline and otherwise falls back to a caption built locally from
+    the filename. caption_deadline <= 0 waits for the LLM (still bounded by
+    the client timeout).
+
+    settings.hashtag_mode picks where hashtags come from:
+      llm    - the LLM's tags as-is
+      hybrid - LLM tags re-ranked by the hashtag index, gaps filled from it
+      index  - the index's tags; the LLM only writes the text, unless the
+               index knows too little about the filename
+    """
+
     def __init__(self, config):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        self.client = None  # Lazy initialization
         self.logger = logging.getLogger(__name__)
         self.fixed_tag = config['settings'].get('fixed_hashtag', '#BoyishLife')
+        self.deadline = float(config['settings'].get('caption_deadline', 8))
+        self.request_timeout = float(config['settings'].get('caption_timeout', 30))
+        self.hashtag_mode = config['settings'].get('hashtag_mode', 'hybrid')
+        self.index = HASHTAGS
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="caption")
+        self._client_lock = threading.Lock()
+
+    def _get_client(self):
+        # groq pulls in httpx/pydantic; only pay for it when a caption is needed
+        with self._client_lock:
+            if self.client is None:
+                from groq import Groq
+                self.client = Groq(
+                    api_key=os.getenv("GROQ_API_KEY"),
+                    timeout=self.request_timeout,
+                    max_retries=1,
+                )
+        return self.client
+
+    # =====================================================
+    # PUBLIC API
+    # =====================================================
+
+    def start(self, filename, group_type):
+        """Begin generating; returns a handle for result()."""
+        clean_name = self._clean_name(filename)
+        count = self._tag_count(group_type)
+
+        index_tags = []
+        if self.hashtag_mode == "index":
+            index_tags = self.index.suggest(clean_name, count)
+            if len(index_tags) < count:
+                index_tags = []
+
+        return {
+            "name": clean_name,
+            "group": group_type,
+            "index_tags": index_tags,
+            "started": time.monotonic(),
+            "future": self._executor.submit(
+                self._ask_llm, clean_name, group_type, not index_tags
+            ),
+        }
+
+    def result(self, handle):
+        future = handle["future"]
+        timeout = None
+        if self.deadline > 0:
+            timeout = max(0.0, self.deadline - (time.monotonic() - handle["started"]))
+
+        try:
+            payload = future.result(timeout=timeout)
+            return self._apply_index(payload, handle)
+        except FutureTimeout:
+            self.logger.warning(
+                f"AI caption missed the {self.deadline:.0f}s deadline, using local caption"
+            )
+        except Exception as e:
+            self.logger.error(f"AI Generation Failed: {e}")
 
-    def generate(self, filename, group_type):
-        clean_name = os.path.splitext(filename)[0].replace('_', ' ')
-        
+        return self._local_caption(handle["name"], handle["group"])
+
+    def _apply_index(self, payload, handle):
+        count = self._tag_count(handle["group"])
+        if handle["index_tags"]:
+            payload["tags"] = handle["index_tags"]
+        elif self.hashtag_mode == "hybrid":
+            payload["tags"] = self.index.rerank(handle["name"], payload["tags"], count)
+        return payload
+
+    # =====================================================
+    # LLM
+    # =====================================================
+
+    @staticmethod
+    def _clean_name(filename):
+        return os.path.splitext(filename)[0].replace('_', ' ').replace('-', ' ').strip()
+
+    @staticmethod
+    def _tag_count(group_type):
         tag_counts = {
             "instagram": 4,
             "general_video": 4, # Used for Facebook
             "image": 3          # Used for Twitter/Threads
         }
-        count = tag_counts.get(group_type, 3)
+        return tag_counts.get(group_type, 3)
 
-        system_instruction = (
-            "You are a social media manager. Generate a caption based on the filename. "
-            "CRITICAL: End the caption with exactly {count} relevant hashtags based on the filename. "
-            "Do NOT add the #BoyishLife hashtag (I will add it myself)."
-        )
+    def _ask_llm(self, clean_name, group_type, with_tags=True):
+        count = self._tag_count(group_type)
+
+        if with_tags:
+            system_instruction = (
+                "You are a social media manager. Generate a caption based on the filename. "
+                "CRITICAL: End the caption with exactly {count} relevant hashtags based on the filename. "
+                "Do NOT add the #BoyishLife hashtag (I will add it myself)."
+            )
+        else:
+            # Tags come from the hashtag index
+            system_instruction = (
+                "You are a social media manager. Generate a caption based on the filename. "
+                "Do NOT add any hashtags."
+            )
 
         prompts = {
             "instagram": f"Write an aesthetic, poetic caption for an Instagram Reel titled '{clean_name}'. Max 100 words.",
@@ -32,37 +145,48 @@ class CaptionGenerator:
 
         user_prompt = prompts.get(group_type, prompts['image'])
 
-        try:
-            completion = self.client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=[
-                    {"role": "system", "content": system_instruction},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=500
-            )
-            raw_caption = completion.choices[0].message.content.strip().replace('"', '').replace("'", "")
+        completion = self._get_client().chat.completions.create(
+            model="llama-3.1-8b-instant",
+            messages=[
+                {"role": "system", "content": system_instruction},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.7,
+            max_tokens=500
+        )
+        raw_caption = completion.choices[0].message.content.strip().replace('"', '').replace("'", "")
 
-            parts = raw_caption.split('#')
-            main_text = parts[0].strip()
+        parts = raw_caption.split('#')
+        main_text = parts[0].strip()
 
-            hashtags = []
-            for p in parts[1:]:
-                tag = p.split()[0].strip().replace(',', '').replace('.', '')
-                if len(tag) > 1:
-                    hashtags.append(tag)
+        hashtags = []
+        for p in parts[1:]:
+            tag = p.split()[0].strip().replace(',', '').replace('.', '')
+            if len(tag) > 1:
+                hashtags.append(tag)
 
-            return {
-                "text": main_text,
-                "tags": hashtags,
-                "brand_tag": self.fixed_tag
-            }
+        return {
+            "text": main_text,
+            "tags": hashtags,
+            "brand_tag": self.fixed_tag
+        }
 
-        except Exception as e:
-            self.logger.error(f"AI Generation Failed: {e}")
-            return {
-                "text": clean_name,
-                "tags": ["nature", "life"],
-                "brand_tag": self.fixed_tag
-            }
+    # =====================================================
+    # LOCAL FALLBACK
+    # =====================================================
+
+    def _local_caption(self, clean_name, group_type):
+        """Template text plus known-good hashtags, then filename keywords."""
+        tags = []
+        if self.hashtag_mode != "llm":
+            tags = self.index.suggest(clean_name, self._tag_count(group_type))
+        tags += [word for word in tokenize(clean_name) if word not in tags]
+
+        title = " ".join(w for w in clean_name.split() if not w.isdigit()) or clean_name
+        template = LOCAL_TEMPLATES.get(group_type, LOCAL_TEMPLATES["image"])
+
+        return {
+            "text": template.format(title=title[:1].upper() + title[1:]),
+            "tags": tags[:self._tag_count(group_type)] or ["nature", "life"],
+            "brand_tag": self.fixed_tag
+        }
@@ -1,15 +1,31 @@
 import logging
 import os
-import random
-import dropbox
-from dropbox.exceptions import ApiError
+import threading
+import time
 
+from modules.media_cache import MediaCache
+from modules.media_source import MediaSource
 
-class DropboxHandler:
-    def __init__(self, config):
+
+class DropboxHandler(MediaSource):
+    """
+    Queues in Dropbox folders. Media streams into the local MediaCache and
+    URL-first platforms get temporary links.
+    """
+
+    def __init__(self, config, cache=None, leases=None):
+        super().__init__(config, leases=leases)
         self.logger = logging.getLogger(__name__)
-        self.conf = config
+        self.cache = cache or MediaCache()
         self.client = None  # Lazy initialization
+        self._cursors = {}        # path -> list_folder cursor, for incremental refresh
+        self._known_folders = set()
+
+        # Long-poll watchers, one per listed folder (see wait_for_changes)
+        self.longpoll_seconds = min(max(int(config.get("longpoll_seconds", 120)), 30), 480)
+        self._cursor_moved = threading.Condition()
+        self._changed = threading.Event()
+        self._watchers = {}
 
     # =====================================================
     # LAZY CLIENT CONNECT
@@ -22,6 +38,8 @@ class DropboxHandler:
         """
         if self.client is None:
             try:
+                import dropbox
+
                 self.client = dropbox.Dropbox(
                     app_key=os.getenv("DROPBOX_APP_KEY"),
                     app_secret=os.getenv("DROPBOX_APP_SECRET"),
@@ -35,58 +53,20 @@ class DropboxHandler:
 
         return self.client
 
-    # =====================================================
-    # FILE SELECTION
-    # =====================================================
-
-    def get_file(self, folder_type):
-        """
-        folder_type: 'ig', 'general', 'image'
-        Returns random file metadata
-        """
-        path_map = {
-            "ig": self.conf["folder_video_ig"],
-            "general": self.conf["folder_video_general"],
-            "image": self.conf["folder_images"],
-        }
-
-        path = path_map.get(folder_type)
-        if not path:
-            return None
-
-        files = self._list_files(path)
-        return random.choice(files) if files else None
-
-    # =====================================================
-    # FOLDER STATS (WITH PAGINATION SUPPORT)
-    # =====================================================
-
-    def get_folder_stats(self):
-        stats = {}
-
-        folder_map = {
-            "video_ig": self.conf["folder_video_ig"],
-            "video_general": self.conf["folder_video_general"],
-            "images": self.conf["folder_images"],
-        }
-
-        total_files = 0
-
-        for key, path in folder_map.items():
-            files = self._list_files(path)
-            count = len(files)
-            stats[key] = count
-            total_files += count
-
-        stats["total"] = total_files
-        return stats
-
     # =====================================================
     # LIST FILES (Handles >2000 files safely)
     # =====================================================
 
-    def _list_files(self, path):
+    def _list_files(self, path, refresh=False):
+        if path in self._listing_cache:
+            if not refresh:
+                return self._listing_cache[path]
+            if self._apply_changes(path):
+                return self._listing_cache[path]
+
         try:
+            import dropbox
+
             client = self._get_client()
             results = client.files_list_folder(path)
             files = [
@@ -104,28 +84,166 @@ class DropboxHandler:
                     if isinstance(entry, dropbox.files.FileMetadata)
                 )
 
+            self._listing_cache[path] = files
+            self._set_cursor(path, results.cursor)
             return files
 
         except Exception as e:
             self.logger.error(f"Dropbox list error ({path}): {e}")
             return []
 
+    def _apply_changes(self, path):
+        """
+        Bring a cached listing up to date from its cursor: only entries
+        added, changed or deleted since then are transferred. Returns False
+        when a full listing is needed instead (no or expired cursor).
+        """
+        cursor = self._cursors.get(path)
+        if not cursor:
+            return False
+
+        try:
+            import dropbox
+
+            client = self._get_client()
+            files = {entry.path_lower: entry for entry in self._listing_cache[path]}
+
+            has_more = True
+            while has_more:
+                results = client.files_list_folder_continue(cursor)
+                for entry in results.entries:
+                    if isinstance(entry, dropbox.files.FileMetadata):
+                        files[entry.path_lower] = entry
+                    elif isinstance(entry, dropbox.files.DeletedMetadata):
+                        files.pop(entry.path_lower, None)
+                cursor, has_more = results.cursor, results.has_more
+
+            self._listing_cache[path] = list(files.values())
+            self._set_cursor(path, cursor)
+            return True
+
+        except Exception as e:
+            self.logger.warning(f"Dropbox incremental list failed ({path}), relisting: {e}")
+            self._cursors.pop(path, None)
+            return False
+
+    def _set_cursor(self, path, cursor):
+        with self._cursor_moved:
+            self._cursors[path] = cursor
+            self._cursor_moved.notify_all()
+
+    # =====================================================
+    # CHANGE NOTIFICATION (longpoll)
+    # =====================================================
+
+    def wait_for_changes(self, timeout, stop=None):
+        """
+        Block until a listed folder changes, via files/list_folder/longpoll
+        on its stored cursor. Longpolls go to notify.dropboxapi.com and
+        return no entries, so an idle queue costs no listing calls; the
+        next refresh fetches just the changes from the cursor.
+        """
+        if not self._cursors:
+            return super().wait_for_changes(timeout, stop)
+
+        for path in list(self._cursors):
+            if path not in self._watchers:
+                watcher = threading.Thread(target=self._watch, args=(path,),
+                                           name=f"dropbox-longpoll{path}", daemon=True)
+                self._watchers[path] = watcher
+                watcher.start()
+
+        deadline = time.monotonic() + timeout
+        while not (stop and stop.is_set()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self._changed.wait(min(remaining, 1)):
+                self._changed.clear()
+                return True
+        return False
+
+    def _watch(self, path):
+        """
+        Longpoll one folder's cursor. After reporting a change it waits for
+        the refresh to move the cursor on, since the old one would report
+        the same change again.
+        """
+        from dropbox.exceptions import ApiError
+
+        reported = None
+        while True:
+            with self._cursor_moved:
+                self._cursor_moved.wait_for(lambda: self._cursors.get(path) not in (None, reported))
+                cursor = self._cursors[path]
+
+            try:
+                result = self._get_client().files_list_folder_longpoll(cursor, timeout=self.longpoll_seconds)
+            except ApiError as e:
+                # Cursor reset: the refresh relists the folder
+                self.logger.warning(f"Dropbox longpoll cursor reset ({path}): {e}")
+                reported = cursor
+                self._changed.set()
+                continue
+            except Exception as e:
+                self.logger.warning(f"Dropbox longpoll failed ({path}), retrying: {e}")
+                time.sleep(30)
+                continue
+
+            if result.changes:
+                reported = cursor
+                self._changed.set()
+            if result.backoff:
+                time.sleep(result.backoff)
+
     # =====================================================
     # DOWNLOAD
     # =====================================================
 
-    def download_file(self, file_metadata):
-        try:
-            client = self._get_client()
+    @staticmethod
+    def _cache_key(file_metadata):
+        return file_metadata.content_hash or f"rev-{file_metadata.rev}"
 
-            local_path = f"temp_{file_metadata.name}"
-            client.files_download_to_file(local_path, file_metadata.path_lower)
+    def cached_file(self, file_metadata):
+        """Local path if the content is already in the media cache."""
+        return self.cache.lookup(self._cache_key(file_metadata), file_metadata.name)
 
-            return local_path
+    def has_local_copy(self, file_metadata):
+        return self.cache.path_for(self._cache_key(file_metadata), file_metadata.name) in self.cache.entries
 
-        except Exception as e:
-            self.logger.error(f"Download failed: {e}")
-            return None
+    def download_file(self, file_metadata, attempts=2):
+        """
+        Stream into the media cache, verifying the content_hash as bytes
+        arrive. Returns the shared cached path; release it with
+        release_file() when done.
+        """
+        cached = self.cached_file(file_metadata)
+        if cached:
+            return cached
+
+        for attempt in range(1, attempts + 1):
+            try:
+                client = self._get_client()
+
+                _, response = client.files_download(file_metadata.path_lower)
+                try:
+                    return self.cache.store(
+                        self._cache_key(file_metadata),
+                        file_metadata.name,
+                        response.iter_content(chunk_size=1024 * 1024),
+                        expected_hash=file_metadata.content_hash,
+                    )
+                finally:
+                    response.close()
+
+            except Exception as e:
+                self.logger.error(f"Download failed (attempt {attempt}/{attempts}): {e}")
+
+        return None
+
+    def release_file(self, local_path, drop=False):
+        if local_path:
+            self.cache.release(local_path, drop=drop)
 
     # =====================================================
     # TEMP LINK (FOR IG / THREADS)
@@ -143,51 +261,142 @@ class DropboxHandler:
             return None
 
     # =====================================================
-    # DELETE FILE
+    # DELETE / MOVE (batched)
     # =====================================================
 
-    def delete_file(self, file_metadata):
+    def _failed_folder(self, source_type):
+        return f"/failed/{source_type}"
+
+    def _flush_deletes(self, files):
+        import dropbox
+
         try:
             client = self._get_client()
-            client.files_delete_v2(file_metadata.path_lower)
-            self.logger.info(f"Deleted {file_metadata.name} from Dropbox")
+            launch = client.files_delete_batch(
+                [dropbox.files.DeleteArg(f.path_lower) for f in files]
+            )
+
+            if launch.is_complete():
+                result = launch.get_complete()
+            elif launch.is_async_job_id():
+                status = self._wait_for_job(client.files_delete_batch_check, launch.get_async_job_id())
+                if status.is_failed():
+                    raise RuntimeError(f"delete batch failed: {status.get_failed()}")
+                result = status.get_complete()
+            else:
+                raise RuntimeError("delete batch returned an unknown result")
+
         except Exception as e:
-            self.logger.error(f"Delete failed: {e}")
+            self.logger.error(f"Delete batch failed, deleting one by one: {e}")
+            for file_metadata in files:
+                self._delete_one(file_metadata)
+            return
+
+        for file_metadata, entry in zip(files, result.entries):
+            if entry.is_success():
+                self.logger.info(f"Deleted {file_metadata.name} from Dropbox")
+            else:
+                self.logger.error(f"Delete failed ({file_metadata.name}): {entry.get_failure()}")
+                self._remember(file_metadata)
+
+    def _flush_moves(self, moves):
+        import dropbox
+
+        try:
+            client = self._get_client()
+
+            for folder in sorted({target for _, target in moves}):
+                self._ensure_folder(folder)
+
+            launch = client.files_move_batch_v2(
+                [
+                    dropbox.files.RelocationPath(f.path_lower, f"{target}/{f.name}")
+                    for f, target in moves
+                ],
+                autorename=True,
+            )
+
+            if launch.is_complete():
+                result = launch.get_complete()
+            else:
+                result = self._wait_for_job(
+                    client.files_move_batch_check_v2, launch.get_async_job_id()
+                ).get_complete()
+
+        except Exception as e:
+            self.logger.error(f"Move batch failed, moving one by one: {e}")
+            for file_metadata, target in moves:
+                self._move_one(file_metadata, target)
+            return
+
+        for (file_metadata, target), entry in zip(moves, result.entries):
+            if entry.is_success():
+                self.logger.warning(f"Moved failed file to {target}/{file_metadata.name}")
+            else:
+                failure = entry.get_failure() if entry.is_failure() else entry
+                self.logger.error(f"Move to failed error ({file_metadata.name}): {failure}")
+                self._remember(file_metadata)
+
+    def _wait_for_job(self, check, job_id, timeout=60):
+        """Poll a batch job with growing pauses until it leaves in_progress."""
+        delay = 0.25
+        deadline = time.monotonic() + timeout
+
+        while True:
+            status = check(job_id)
+            if not status.is_in_progress():
+                return status
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"batch job {job_id} still running after {timeout}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 5)
 
     # =====================================================
-    # MOVE TO FAILED
+    # SINGLE-FILE FALLBACKS
     # =====================================================
 
-    def move_to_failed(self, file_metadata, source_type):
-        """
-        Moves file to /failed/<source_type>/
-        """
-        client = self._get_client()
-
-        failed_root = "/failed"
-        failed_path = f"{failed_root}/{source_type}"
-        destination = f"{failed_path}/{file_metadata.name}"
+    def _delete_one(self, file_metadata):
+        try:
+            client = self._get_client()
+            client.files_delete_v2(file_metadata.path_lower)
+            self.logger.info(f"Deleted {file_metadata.name} from Dropbox")
+        except Exception as e:
+            self.logger.error(f"Delete failed: {e}")
+            self._remember(file_metadata)
 
+    def _move_one(self, file_metadata, target):
         try:
-            # Create folders safely
-            for folder in (failed_root, failed_path):
-                try:
-                    client.files_create_folder_v2(folder)
-                except ApiError as e:
-                    if e.error.is_path() and e.error.get_path().is_conflict():
-                        pass
-                    else:
-                        raise
+            client = self._get_client()
+            self._ensure_folder(target)
 
             client.files_move_v2(
                 file_metadata.path_lower,
-                destination,
+                f"{target}/{file_metadata.name}",
                 autorename=True,
             )
 
             self.logger.warning(
-                f"Moved failed file to {failed_path}/{file_metadata.name}"
+                f"Moved failed file to {target}/{file_metadata.name}"
             )
 
         except Exception as e:
             self.logger.error(f"Move to failed error: {e}")
+            self._remember(file_metadata)
+
+    def _ensure_folder(self, folder):
+        """Create folder and its parents once per process; conflicts mean it exists."""
+        from dropbox.exceptions import ApiError
+
+        client = self._get_client()
+        parts = folder.strip("/").split("/")
+
+        for depth in range(1, len(parts) + 1):
+            path = "/" + "/".join(parts[:depth])
+            if path in self._known_folders:
+                continue
+            try:
+                client.files_create_folder_v2(path)
+            except ApiError as e:
+                if not (e.error.is_path() and e.error.get_path().is_conflict()):
+                    raise
+            self._known_folders.add(path)
@@ -0,0 +1,94 @@
+import json
+import logging
+from urllib.parse import urlencode
+
+import requests
+
+from core.tracing import TRACER
+
+GRAPH_URL = "https://graph.facebook.com"
+# Graph API cap on calls in one batch request
+MAX_BATCH = 50
+
+
+class BatchResponse:
+    """One call's share of a batch, shaped like the requests.Response it replaces."""
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {}  # not requested (include_headers=false)
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class GraphBatchClient:
+    """
+    Sends several Graph API calls as one `batch` request.
+
+        graph = GraphBatchClient(token)
+        results = graph.execute([
+            ("GET", "17890001", {"fields": "status_code"}),
+            ("POST", f"{ig_id}/media", {"image_url": url, "is_carousel_item": "true"}),
+        ])
+
+    Paths are relative to the API version. Results come back in call
+    order, one per call, each with its own status_code, text and json():
+    callers check them exactly as they would a single response. A call
+    Meta did not get to within the batch's time limit comes back as a
+    503. A lone call is sent as a plain request, and more than MAX_BATCH
+    are split over several batches. Only a failure of the batch request
+    itself raises (requests.HTTPError, with the response).
+
+    graph.threads.net has no batch endpoint; this is graph.facebook.com only.
+    """
+
+    def __init__(self, token, version="v18.0", timeout=60):
+        self.logger = logging.getLogger(__name__)
+        self.token = token
+        self.version = version
+        self.timeout = timeout
+
+    def execute(self, calls, timeout=None):
+        """calls: [(method, path, params)]; returns one response per call."""
+        results = []
+        for start in range(0, len(calls), MAX_BATCH):
+            results += self._send(calls[start:start + MAX_BATCH], timeout or self.timeout)
+        return results
+
+    def _send(self, calls, timeout):
+        if len(calls) == 1:
+            method, path, params = calls[0]
+            url = f"{GRAPH_URL}/{self.version}/{path}"
+            params = {"access_token": self.token, **params}
+            if method == "GET":
+                return [requests.get(url, params=params, timeout=timeout)]
+            return [requests.request(method, url, data=params, timeout=timeout)]
+
+        batch = []
+        for method, path, params in calls:
+            relative_url = f"{self.version}/{path}"
+            if method == "GET":
+                batch.append({"method": method, "relative_url": f"{relative_url}?{urlencode(params)}"})
+            else:
+                batch.append({"method": method, "relative_url": relative_url, "body": urlencode(params)})
+
+        with TRACER.span("graph.batch", calls=len(calls)):
+            res = requests.post(f"{GRAPH_URL}/", data={
+                "access_token": self.token,
+                "batch": json.dumps(batch),
+                "include_headers": "false",
+            }, timeout=timeout)
+
+        if res.status_code != 200:
+            raise requests.HTTPError(f"Graph Batch Failed: {res.text}", response=res)
+
+        results = []
+        for item in res.json():
+            if item is None:
+                results.append(BatchResponse(503, json.dumps({"error": {"message": "Not processed in batch"}})))
+            else:
+                results.append(BatchResponse(item.get("code"), item.get("body") or ""))
+        self.logger.debug(f"Graph batch: {len(calls)} calls in one request")
+        return results
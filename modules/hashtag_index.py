@@ -0,0 +1,185 @@
+import array
+import logging
+import math
+import os
+import re
+import struct
+import sys
+import threading
+
+# Filename words that make poor hashtags
+STOPWORDS = {
+    "a", "an", "and", "the", "of", "in", "on", "at", "to", "for", "with",
+    "my", "our", "your", "is", "it", "by", "from", "img", "vid", "video",
+    "photo", "image", "reel", "story", "final", "copy", "edit",
+    "mp4", "mov", "jpg", "jpeg", "png", "webp", "gif",
+}
+
+MAGIC = b"HTX1"
+
+# Reserved row/column: ("", tag) counts posts using a tag, (token, "")
+# counts posts whose filename had the token.
+ANY = ""
+
+
+def tokenize(text):
+    """Lowercase filename words worth matching on."""
+    tokens = []
+    for word in re.split(r"[^\w]+", text.lower().replace("_", " ")):
+        if len(word) > 2 and not word.isdigit() and word not in STOPWORDS and word not in tokens:
+            tokens.append(word)
+    return tokens
+
+
+def normalize_tag(tag):
+    return str(tag).strip().lstrip("#")
+
+
+class HashtagIndex:
+    """
+    Token -> hashtag co-occurrence counts learned from posted captions.
+
+    Each post that went out adds its filename tokens against its tags.
+    A tag's score for a new filename is the sum over its known tokens of
+    P(tag | token), with overall popularity as a tie-break, so ranking is
+    a handful of dict lookups and needs no network call.
+
+    On disk it is a string table plus one flat uint32 array of
+    (token_id, tag_id, count) triples, loaded with a single frombytes().
+    """
+
+    def __init__(self, path=None):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.rows = {}  # token -> {tag: count}
+        self._lock = threading.Lock()
+
+    # =====================================================
+    # PERSISTENCE
+    # =====================================================
+
+    def load(self, path):
+        self.path = path
+        self.rows = {}
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            self.rows = self._decode(data)
+            self.logger.info(f"Hashtag index loaded ({len(self.rows) - 1} tokens)")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.warning(f"Hashtag index unreadable, starting fresh: {e}")
+            self.rows = {}
+        return self
+
+    def save(self):
+        if not self.path or not self.rows:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(self._encode())
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.logger.warning(f"Hashtag index not saved: {e}")
+
+    def _encode(self):
+        with self._lock:
+            strings = {}
+            triples = array.array("I")
+            for token, tags in self.rows.items():
+                token_id = strings.setdefault(token, len(strings))
+                for tag, count in tags.items():
+                    triples.extend((token_id, strings.setdefault(tag, len(strings)), count))
+
+        table = "\0".join(strings).encode("utf-8")
+        if sys.byteorder != "little":
+            triples.byteswap()
+        header = struct.pack("<4sIII", MAGIC, len(strings), len(table), len(triples) // 3)
+        return header + table + triples.tobytes()
+
+    @staticmethod
+    def _decode(data):
+        magic, n_strings, table_len, n_triples = struct.unpack_from("<4sIII", data)
+        if magic != MAGIC:
+            raise ValueError("not a hashtag index")
+
+        offset = struct.calcsize("<4sIII")
+        strings = data[offset:offset + table_len].decode("utf-8").split("\0")
+        if len(strings) != n_strings:
+            raise ValueError("corrupt string table")
+
+        triples = array.array("I")
+        triples.frombytes(data[offset + table_len:offset + table_len + n_triples * 12])
+        if sys.byteorder != "little":
+            triples.byteswap()
+
+        rows = {}
+        for i in range(0, len(triples), 3):
+            token_id, tag_id, count = triples[i:i + 3]
+            rows.setdefault(strings[token_id], {})[strings[tag_id]] = count
+        return rows
+
+    # =====================================================
+    # LEARN / QUERY
+    # =====================================================
+
+    def learn(self, filename, tags):
+        """Count one posted caption: its filename tokens against its tags."""
+        tags = [t for t in dict.fromkeys(normalize_tag(t) for t in tags) if len(t) > 1]
+        if not tags:
+            return
+
+        with self._lock:
+            for token in [ANY] + tokenize(filename):
+                row = self.rows.setdefault(token, {})
+                row[ANY] = row.get(ANY, 0) + 1
+                for tag in tags:
+                    row[tag] = row.get(tag, 0) + 1
+
+    def scores(self, tokens):
+        """{tag: score} for tags seen with any of the tokens."""
+        scores = {}
+        for token in tokens:
+            row = self.rows.get(token)
+            if not row:
+                continue
+            seen = row[ANY]
+            for tag, count in row.items():
+                if tag != ANY:
+                    scores[tag] = scores.get(tag, 0.0) + count / seen
+
+        popular = self.rows.get(ANY)
+        if popular:
+            total = popular[ANY]
+            for tag in scores:
+                # Small tie-break between equally matched tags
+                scores[tag] += 0.01 * math.log1p(popular.get(tag, 0)) / math.log1p(total)
+        return scores
+
+    def suggest(self, filename, n=4):
+        """Best known tags for a filename, best first; [] if nothing matches."""
+        scores = self.scores(tokenize(filename))
+        return sorted(scores, key=scores.get, reverse=True)[:n]
+
+    def rerank(self, filename, tags, n=4):
+        """
+        LLM tags that worked before move to the front, ordered by history;
+        unknown ones keep their order and the index fills any gap.
+        """
+        scores = self.scores(tokenize(filename))
+        tags = list(dict.fromkeys(normalize_tag(t) for t in tags if normalize_tag(t)))
+
+        ranked = sorted(tags, key=lambda t: -scores.get(t, 0.0))
+        for tag in sorted(scores, key=scores.get, reverse=True):
+            if len(ranked) >= n:
+                break
+            if tag not in ranked:
+                ranked.append(tag)
+        return ranked
+
+
+# Shared by caption generation and main; main loads/saves it from the state dir.
+HASHTAGS = HashtagIndex()
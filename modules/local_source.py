@@ -0,0 +1,259 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import quote
+
+from modules.media_source import MediaSource
+
+# path_lower keeps the name main uses for a file's id; locally it is the
+# real (case-preserving) path.
+LocalFile = namedtuple("LocalFile", ["name", "path_lower", "size", "mtime"])
+
+# Files still being written (or temp files of a copy) are not queued yet
+PARTIAL_SUFFIXES = (".part", ".tmp", ".crdownload", ".partial")
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_CREATE
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """
+    Minimal inotify over ctypes: tells which watched folders changed.
+    Raises OSError where inotify is unavailable.
+    """
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify not available")
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}  # wd -> folder
+
+    def add(self, folder):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {folder}")
+        self.watches[wd] = folder
+
+    def read(self, timeout):
+        """Folders with events within `timeout` seconds (all on overflow)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    changed.update(self.watches.values())
+                elif wd in self.watches:
+                    changed.add(self.watches[wd])
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LocalDirectorySource(MediaSource):
+    """
+    Queues in local folders, for on-prem runs and tests.
+
+    Files are read in place, with no transfer and no cache copy. Deletes
+    remove them and failed files move to <failed_folder>/<source>/.
+    inotify marks a folder dirty when something lands in or leaves it, so
+    refreshes only rescan folders that changed. Without inotify, folders
+    are rescanned on every refresh and wait_for_changes() polls.
+
+    URL-first platforms need the files served somewhere: public_base_url
+    + the path relative to `root` gives their URL.
+    """
+
+    def __init__(self, config, leases=None):
+        super().__init__(config, leases=leases)
+        self.logger = logging.getLogger(__name__)
+        self.root = os.path.abspath(config.get("root", "."))
+        self.failed_root = os.path.abspath(config.get("failed_folder", os.path.join(self.root, "failed")))
+        self.public_base_url = config.get("public_base_url")
+        self.poll_seconds = config.get("poll_seconds", 5)
+        # Skip files modified this recently: a copy may still be running
+        self.settle_seconds = config.get("settle_seconds", 2)
+
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+        self._inotify = None
+        try:
+            self._inotify = Inotify()
+        except OSError as e:
+            self.logger.info(f"inotify unavailable ({e}), polling local folders")
+
+    def _folder_path(self, folder_type):
+        folder = super()._folder_path(folder_type)
+        return os.path.join(self.root, folder) if folder else None
+
+    # =====================================================
+    # LISTING
+    # =====================================================
+
+    def _list_files(self, path, refresh=False):
+        if path in self._listing_cache:
+            if not refresh:
+                return self._listing_cache[path]
+            if self._inotify:
+                self._drain_events(0)
+                with self._dirty_lock:
+                    if path not in self._dirty:
+                        return self._listing_cache[path]
+
+        if self._inotify and path not in self._listing_cache:
+            try:
+                os.makedirs(path, exist_ok=True)
+                self._inotify.add(path)
+            except OSError as e:
+                self.logger.warning(f"Not watching {path}: {e}")
+
+        with self._dirty_lock:
+            self._dirty.discard(path)
+        self._listing_cache[path] = self._scan(path)
+        return self._listing_cache[path]
+
+    def _scan(self, path):
+        files = []
+        now = time.time()
+        try:
+            entries = list(os.scandir(path))
+        except FileNotFoundError:
+            return files
+        except OSError as e:
+            self.logger.error(f"Local list error ({path}): {e}")
+            return files
+
+        for entry in entries:
+            if entry.name.startswith(".") or entry.name.endswith(PARTIAL_SUFFIXES):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            if now - stat.st_mtime < self.settle_seconds:
+                with self._dirty_lock:
+                    self._dirty.add(path)  # look again on the next refresh
+                continue
+            files.append(LocalFile(entry.name, entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _drain_events(self, timeout):
+        changed = self._inotify.read(timeout)
+        with self._dirty_lock:
+            self._dirty.update(changed)
+        return changed
+
+    def wait_for_changes(self, timeout, stop=None):
+        if not (self._inotify and self._listing_cache):
+            return super().wait_for_changes(min(timeout, self.poll_seconds), stop)
+
+        # Files skipped while settling show up without a new event
+        settling = bool(self._dirty)
+        if settling:
+            timeout = min(timeout, self.settle_seconds)
+
+        deadline = time.monotonic() + timeout
+        while not (stop and stop.is_set()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return settling
+            if self._drain_events(min(remaining, 1)):
+                return True
+        return False
+
+    # =====================================================
+    # LOCAL BYTES / PUBLIC URL
+    # =====================================================
+
+    def cached_file(self, file):
+        # Read in place: nothing to download
+        return file.path_lower if os.path.exists(file.path_lower) else None
+
+    def has_local_copy(self, file):
+        return True
+
+    def download_file(self, file):
+        return self.cached_file(file)
+
+    def release_file(self, local_path, drop=False):
+        # Source files only go away through delete_file()
+        pass
+
+    def get_temp_link(self, file):
+        if not self.public_base_url:
+            return None
+        relative = os.path.relpath(file.path_lower, self.root).replace(os.sep, "/")
+        return f"{self.public_base_url.rstrip('/')}/{quote(relative)}"
+
+    # =====================================================
+    # DELETE / MOVE
+    # =====================================================
+
+    def _failed_folder(self, source_type):
+        return os.path.join(self.failed_root, source_type)
+
+    def _flush_deletes(self, files):
+        for file in files:
+            try:
+                os.remove(file.path_lower)
+                self.logger.info(f"Deleted {file.name}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.logger.error(f"Delete failed ({file.name}): {e}")
+                self._remember(file)
+
+    def _flush_moves(self, moves):
+        for file, target in moves:
+            try:
+                os.makedirs(target, exist_ok=True)
+                destination = self._free_name(target, file.name)
+                os.replace(file.path_lower, destination)
+                self.logger.warning(f"Moved failed file to {destination}")
+            except OSError as e:
+                self.logger.error(f"Move to failed error ({file.name}): {e}")
+                self._remember(file)
+
+    @staticmethod
+    def _free_name(folder, name):
+        # Like Dropbox autorename: "clip.mp4" -> "clip (1).mp4"
+        stem, ext = os.path.splitext(name)
+        candidate, n = os.path.join(folder, name), 1
+        while os.path.exists(candidate):
+            candidate = os.path.join(folder, f"{stem} ({n}){ext}")
+            n += 1
+        return candidate
@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+# Dropbox hashes content in 4 MB blocks
+DROPBOX_BLOCK = 4 * 1024 * 1024
+
+
+class ContentHashMismatch(Exception):
+    pass
+
+
+class ContentHasher:
+    """
+    Dropbox content_hash computed incrementally: sha256 over the
+    concatenated sha256 digests of each 4 MB block.
+    """
+
+    def __init__(self):
+        self._overall = hashlib.sha256()
+        self._block = hashlib.sha256()
+        self._block_len = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), DROPBOX_BLOCK - self._block_len)
+            self._block.update(view[:take])
+            self._block_len += take
+            view = view[take:]
+            if self._block_len == DROPBOX_BLOCK:
+                self._overall.update(self._block.digest())
+                self._block = hashlib.sha256()
+                self._block_len = 0
+
+    def hexdigest(self):
+        overall = self._overall.copy()
+        if self._block_len:
+            overall.update(self._block.digest())
+        return overall.hexdigest()
+
+
+class MediaCache:
+    """
+    Size-capped, content-addressed media store: <root>/<content_hash><ext>.
+
+    Files are keyed by what they contain, not where they live in Dropbox,
+    so same-named files never collide and a retry, a re-driven failed file
+    or a rerun after a crash reuses the bytes already on disk. Least
+    recently used entries are evicted past max_bytes; entries in use by
+    the current run are never evicted.
+    """
+
+    def __init__(self, root=".cache/media", max_bytes=2 * 1024 ** 3):
+        self.logger = logging.getLogger(__name__)
+        self.root = root
+        self.max_bytes = max_bytes
+        self.entries = {}  # path -> [size, last_used]
+        self._in_use = {}  # path -> reference count
+        self._lock = threading.Lock()
+        self._scan()
+
+    def _scan(self):
+        os.makedirs(self.root, exist_ok=True)
+        for entry in os.scandir(self.root):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith(".part"):
+                # left over from an interrupted download
+                os.remove(entry.path)
+                continue
+            stat = entry.stat()
+            self.entries[entry.path] = [stat.st_size, stat.st_mtime]
+
+    def path_for(self, key, name):
+        ext = os.path.splitext(name)[1].lower()
+        return os.path.join(self.root, f"{key}{ext}")
+
+    # =====================================================
+    # LOOKUP / STORE
+    # =====================================================
+
+    def lookup(self, key, name):
+        """Path of a cached copy (marked in use), or None."""
+        path = self.path_for(key, name)
+        with self._lock:
+            if path not in self.entries or not os.path.exists(path):
+                self.entries.pop(path, None)
+                return None
+            self._touch(path)
+            self._in_use[path] = self._in_use.get(path, 0) + 1
+        return path
+
+    def store(self, key, name, chunks, expected_hash=None):
+        """
+        Write an iterable of byte chunks into the cache, checking the
+        Dropbox content_hash on the fly. Returns the path (marked in use).
+        """
+        path = self.path_for(key, name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        hasher = ContentHasher() if expected_hash else None
+        size = 0
+
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+                    if hasher:
+                        hasher.update(chunk)
+
+            if hasher and hasher.hexdigest() != expected_hash:
+                raise ContentHashMismatch(
+                    f"{name}: content_hash {hasher.hexdigest()} != {expected_hash}"
+                )
+
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self._lock:
+            self.entries[path] = [size, time.time()]
+            self._in_use[path] = self._in_use.get(path, 0) + 1
+
+        self.evict()
+        return path
+
+    def release(self, path, drop=False):
+        """Done with a path for this run; drop=True deletes it right away."""
+        with self._lock:
+            count = self._in_use.get(path, 0) - 1
+            if count > 0:
+                self._in_use[path] = count
+                return
+            self._in_use.pop(path, None)
+            if drop and path in self.entries:
+                self._remove(path)
+
+    # =====================================================
+    # EVICTION
+    # =====================================================
+
+    def _touch(self, path):
+        now = time.time()
+        self.entries[path][1] = now
+        try:
+            # persists the LRU order for the next run
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+
+    def _remove(self, path):
+        self.entries.pop(path, None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        with self._lock:
+            total = sum(size for size, _ in self.entries.values())
+            if total <= self.max_bytes:
+                return
+
+            for path, (size, _) in sorted(self.entries.items(), key=lambda kv: kv[1][1]):
+                if total <= self.max_bytes:
+                    break
+                if path in self._in_use:
+                    continue
+                self._remove(path)
+                total -= size
+                self.logger.info(f"Media cache evicted {os.path.basename(path)} ({size / (1024 * 1024):.1f} MB)")
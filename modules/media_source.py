@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+
+# A queued file as remembered in the listing index (for --plan)
+IndexedFile = namedtuple("IndexedFile", ["name", "path_lower", "size", "content_hash", "rev"])
+
+
+class MediaSource:
+    """
+    Where queued media comes from and where it goes once settled.
+
+    main only talks to this interface. Queued files are objects with
+    .name, .path_lower (a stable id for progress and leases) and .size;
+    subclasses list them, provide local bytes and a public URL, and apply
+    the deletes and moves queued by delete_file()/move_to_failed() when
+    flush() is called.
+
+    Subclasses implement _list_files(), cached_file(), download_file(),
+    release_file(), get_temp_link(), _failed_folder(), _flush_deletes()
+    and _flush_moves(). wait_for_changes() is optional.
+
+    With index_path set, flush() also saves the listings it ended with,
+    so --plan can show the queues without listing them again.
+    """
+
+    FOLDER_KEYS = {
+        "ig": "folder_video_ig",
+        "general": "folder_video_general",
+        "image": "folder_images",
+    }
+
+    def __init__(self, config, leases=None):
+        self.logger = logging.getLogger(__name__)
+        self.conf = config
+        self.leases = leases  # claims files when several workers share the queues
+        self._listing_cache = {}  # folder -> [file]
+        self._pending_deletes = []  # files, applied by flush()
+        self._pending_moves = []    # (file, target folder), applied by flush()
+        self.index_path = None      # listing index written by flush()
+
+    # =====================================================
+    # FILE SELECTION
+    # =====================================================
+
+    def _folder_path(self, folder_type):
+        key = self.FOLDER_KEYS.get(folder_type)
+        return self.conf.get(key) if key else None
+
+    def claim_files(self, files, count):
+        """
+        The first `count` of `files` this worker gets a lease on; files
+        claimed by another worker are skipped.
+        """
+        claimed = []
+        for file in files:
+            if len(claimed) >= count:
+                break
+            if self.leases is None or self.leases.claim(file.path_lower):
+                claimed.append(file)
+        return claimed
+
+    def has_listing(self, folder_type):
+        """True if the folder's listing is already cached (or indexed)."""
+        return self._folder_path(folder_type) in self._listing_cache
+
+    def queued_files(self, folder_type):
+        path = self._folder_path(folder_type)
+        return list(self._list_files(path)) if path else []
+
+    def queue_sizes(self, folder_types, refresh=False):
+        """
+        Cheap pre-flight check: one listing per folder, cached so that
+        queued_files() afterwards does not list again. refresh=True brings
+        the cached listing up to date.
+        """
+        return {
+            folder_type: len(self._list_files(self._folder_path(folder_type), refresh=refresh))
+            for folder_type in folder_types
+            if self._folder_path(folder_type)
+        }
+
+    def wait_for_changes(self, timeout, stop=None):
+        """
+        Block up to `timeout` seconds until the queues may have changed
+        (or the `stop` event is set); True if they may have. Backends
+        without change notification just sleep and say yes.
+        """
+        if stop is not None:
+            return not stop.wait(timeout)
+        time.sleep(timeout)
+        return True
+
+    # =====================================================
+    # FOLDER STATS
+    # =====================================================
+
+    def get_folder_stats(self):
+        """
+        Counts from the cached listings, which already reflect this run's
+        deletes and moves; only folders never listed are fetched.
+        """
+        stats = {}
+        total_files = 0
+
+        for key, folder_type in (("video_ig", "ig"), ("video_general", "general"), ("images", "image")):
+            count = len(self._list_files(self._folder_path(folder_type)))
+            stats[key] = count
+            total_files += count
+
+        stats["total"] = total_files
+        return stats
+
+    def _list_files(self, path, refresh=False):
+        raise NotImplementedError
+
+    def _forget(self, file):
+        # Keep cached listings in step with our own deletes and moves
+        for path, files in self._listing_cache.items():
+            self._listing_cache[path] = [
+                f for f in files if f.path_lower != file.path_lower
+            ]
+
+    def _remember(self, file):
+        # A delete/move that did not happen: the file is still queued
+        folder = file.path_lower.rsplit("/", 1)[0].lower()
+        for path, files in self._listing_cache.items():
+            if path.lower().rstrip("/") == folder and file not in files:
+                files.append(file)
+
+    # =====================================================
+    # LOCAL BYTES / PUBLIC URL
+    # =====================================================
+
+    def cached_file(self, file):
+        """Local path if the bytes are available without a transfer."""
+        raise NotImplementedError
+
+    def has_local_copy(self, file):
+        """Like cached_file() but read-only: nothing is marked in use."""
+        raise NotImplementedError
+
+    def download_file(self, file):
+        """Local path to read the file from; release_file() it when done."""
+        raise NotImplementedError
+
+    def release_file(self, local_path, drop=False):
+        raise NotImplementedError
+
+    def get_temp_link(self, file):
+        """Public URL for URL-first platforms, or None."""
+        raise NotImplementedError
+
+    # =====================================================
+    # DELETE / MOVE (batched)
+    # =====================================================
+
+    def delete_file(self, file):
+        """Queued; applied with the next flush()."""
+        self._pending_deletes.append(file)
+        self._forget(file)
+
+    def move_to_failed(self, file, source_type):
+        """Queued for the failed folder of source_type; applied with the next flush()."""
+        self._pending_moves.append((file, self._failed_folder(source_type)))
+        self._forget(file)
+
+    def flush(self):
+        """
+        Apply queued deletes and moves. Entries that fail go back into the
+        cached listings.
+        """
+        deletes, self._pending_deletes = self._pending_deletes, []
+        moves, self._pending_moves = self._pending_moves, []
+
+        if deletes:
+            self._flush_deletes(deletes)
+        if moves:
+            self._flush_moves(moves)
+        self.save_index()
+
+    def _failed_folder(self, source_type):
+        raise NotImplementedError
+
+    def _flush_deletes(self, files):
+        raise NotImplementedError
+
+    def _flush_moves(self, moves):
+        raise NotImplementedError
+
+    # =====================================================
+    # LISTING INDEX
+    # =====================================================
+
+    def save_index(self):
+        if not self.index_path or not self._listing_cache:
+            return
+        folders = {
+            path: [
+                [f.name, f.path_lower, f.size,
+                 getattr(f, "content_hash", None), getattr(f, "rev", None)]
+                for f in files
+            ]
+            for path, files in self._listing_cache.items()
+        }
+        try:
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"saved": time.time(), "folders": folders}, f)
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            self.logger.warning(f"Listing index not saved: {e}")
+
+    def load_index(self):
+        """
+        Fill the listings from the saved index instead of the backend.
+        Returns when it was saved (epoch seconds), or None without one.
+        """
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"Listing index unreadable: {e}")
+            return None
+
+        self._listing_cache = {
+            path: [IndexedFile(*entry) for entry in files]
+            for path, files in index["folders"].items()
+        }
+        return index["saved"]
@@ -0,0 +1,186 @@
+import json
+import mimetypes
+import os
+import uuid
+
+from core.governor import GOVERNOR
+
+
+class MultipartStream:
+    """
+    multipart/form-data body that reads file parts from disk on demand.
+
+    Memory stays at one chunk regardless of file size, and len() is known
+    up front so requests sends a Content-Length instead of chunked
+    encoding. Pass it as `data=` together with `headers=stream.headers`.
+
+        stream = MultipartStream(
+            fields={"chat_id": "123"},
+            files=[("video", "/tmp/clip.mp4")],
+            progress=log_progress(logger, "Telegram"),
+        )
+        session.post(url, data=stream, headers=stream.headers)
+
+    `progress(sent, total)` is called after every read.
+
+    With `host`, the body is an upload under the GOVERNOR: building it
+    waits for a connection slot on that host, every read draws from the
+    shared bandwidth budget, and close() gives the slot back.
+    """
+
+    def __init__(self, fields=None, files=None, chunk_size=64 * 1024, progress=None, host=None):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self._parts = []  # bytes or (path, size)
+
+        for name, value in (fields or {}).items():
+            content_type = None
+            if isinstance(value, (dict, list)):
+                value, content_type = json.dumps(value), "application/json"
+            self._add_field(name, value, content_type)
+
+        for entry in files or []:
+            name, path = entry[0], entry[1]
+            filename = entry[2] if len(entry) > 2 else os.path.basename(path)
+            content_type = entry[3] if len(entry) > 3 else (
+                mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            )
+            self._add_file(name, path, filename, content_type)
+
+        self._parts.append(f"--{self.boundary}--\r\n".encode())
+        self.length = sum(
+            len(part) if isinstance(part, bytes) else part[1]
+            for part in self._parts
+        )
+        self._index = 0
+        self._handle = None
+        self._position = 0
+        self._transfer = GOVERNOR.open(host, self.length) if host else None
+
+    # =====================================================
+    # BUILD
+    # =====================================================
+
+    def _add_field(self, name, value, content_type=None):
+        header = f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n'
+        if content_type:
+            header += f"Content-Type: {content_type}\r\n"
+        self._parts.append(f"{header}\r\n{value}\r\n".encode())
+
+    def _add_file(self, name, path, filename, content_type):
+        self._parts.append((
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode())
+        self._parts.append((path, os.path.getsize(path)))
+        self._parts.append(b"\r\n")
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @property
+    def headers(self):
+        return {"Content-Type": self.content_type}
+
+    # =====================================================
+    # FILE-LIKE INTERFACE (what requests / http.client use)
+    # =====================================================
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length
+
+        out = bytearray()
+        while len(out) < size and self._index < len(self._parts):
+            part = self._parts[self._index]
+
+            if isinstance(part, bytes):
+                # bytes parts are consumed whole; they are small headers
+                out.extend(part)
+                self._index += 1
+                continue
+
+            if self._handle is None:
+                self._handle = open(part[0], "rb")
+
+            data = self._handle.read(min(self.chunk_size, size - len(out)))
+            if data:
+                out.extend(data)
+            else:
+                self._handle.close()
+                self._handle = None
+                self._index += 1
+
+        if self._transfer is not None and out:
+            self._transfer.consume(len(out))
+
+        self._position += len(out)
+        if self.progress is not None and out:
+            self.progress(self._position, self.length)
+        return bytes(out)
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=0):
+        # Only rewinding is supported; enough for resends and redirects
+        if offset != 0 or whence != 0:
+            raise OSError("MultipartStream can only seek to the start")
+        self._close_handle()
+        if self._transfer is not None:
+            self._transfer.rewind()
+        self._index = 0
+        self._position = 0
+        return 0
+
+    def close(self):
+        self._close_handle()
+        if self._transfer is not None:
+            self._transfer.close()
+            self._transfer = None
+
+    def _close_handle(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+def log_progress(logger, label, step=25, min_bytes=5 * 1024 * 1024):
+    """
+    Progress callback that logs every `step` percent; small bodies are
+    not worth the noise and stay silent.
+    """
+    state = {"next": step, "last": 0}
+
+    def report(sent, total):
+        if not total or total < min_bytes:
+            return
+
+        # a rewound body (resend) starts the count over
+        if sent < state["last"]:
+            state["next"] = step
+        state["last"] = sent
+
+        percent = sent * 100 // total
+        if percent >= state["next"]:
+            rate = GOVERNOR.throughput() / (1024 * 1024)
+            logger.info(
+                f"   📤 {label}: {percent}% ({sent / (1024 * 1024):.1f}/{total / (1024 * 1024):.1f} MB, "
+                f"all uploads {rate:.1f} MB/s)"
+            )
+            state["next"] = (percent // step + 1) * step
+
+    return report
@@ -2,31 +2,128 @@ import os
 import requests
 import time
 import logging
+import threading
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from core.timeouts import THROUGHPUT
+from core.retry_budget import RETRY_BUDGET, BudgetedRetry
+from modules.multipart import MultipartStream, log_progress
+
+
+class RateLimitTracker:
+    """
+    Tracks Discord's per-bucket limits from the X-RateLimit-* headers so
+    requests wait for a reset instead of being rejected with 429.
+    Routes are mapped to buckets as Discord reports them.
+
+    Pickles without its lock, so a supervised worker can hand what it
+    learned back to the parent (DiscordPoster.SHARED_STATE). Reset times
+    are monotonic, which forked processes share.
+    """
+
+    def __init__(self):
+        self.route_buckets = {}   # route -> bucket id
+        self.buckets = {}         # bucket id -> {"remaining": int, "reset_at": monotonic}
+        self.global_reset_at = 0.0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        with self._lock:
+            return {
+                "route_buckets": dict(self.route_buckets),
+                "buckets": {k: dict(v) for k, v in self.buckets.items()},
+                "global_reset_at": self.global_reset_at,
+            }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def delay_for(self, route):
+        now = time.monotonic()
+        with self._lock:
+            wait = max(0.0, self.global_reset_at - now)
+            bucket = self.buckets.get(self.route_buckets.get(route))
+            if bucket and bucket["remaining"] <= 0:
+                wait = max(wait, bucket["reset_at"] - now)
+        return wait
+
+    def wait(self, route, logger=None):
+        delay = self.delay_for(route)
+        if delay > 0:
+            if logger:
+                logger.info(f"   ⏳ Discord bucket exhausted, waiting {delay:.1f}s for reset...")
+            time.sleep(delay)
+
+    def update(self, route, response):
+        headers = response.headers
+        now = time.monotonic()
+
+        with self._lock:
+            bucket_id = headers.get("X-RateLimit-Bucket")
+            reset_after = headers.get("X-RateLimit-Reset-After")
+            remaining = headers.get("X-RateLimit-Remaining")
+
+            if bucket_id:
+                self.route_buckets[route] = bucket_id
+                if remaining is not None and reset_after is not None:
+                    self.buckets[bucket_id] = {
+                        "remaining": int(remaining),
+                        "reset_at": now + float(reset_after),
+                    }
+
+            if response.status_code == 429:
+                retry_after = self.retry_after(response)
+                is_global = headers.get("X-RateLimit-Global") == "true" or \
+                    headers.get("X-RateLimit-Scope") == "global"
+                if is_global:
+                    self.global_reset_at = now + retry_after
+                else:
+                    bucket_id = bucket_id or self.route_buckets.get(route, route)
+                    self.route_buckets[route] = bucket_id
+                    self.buckets[bucket_id] = {"remaining": 0, "reset_at": now + retry_after}
+
+    @staticmethod
+    def retry_after(response):
+        try:
+            return float(response.json().get("retry_after", 5))
+        except Exception:
+            return float(response.headers.get("Retry-After") or 5)
+
 
 class DiscordPoster:
+    # Discord allows up to 10 attachments per message
+    MAX_ALBUM = 10
+    # Stay under the per-message upload cap for non-boosted servers
+    MAX_ALBUM_BYTES = 10 * 1024 * 1024
+    # Host the upload governor counts our connections against
+    UPLOAD_HOST = "discord.com"
+    # Bucket limits learned from the headers, copied back from supervised workers
+    SHARED_STATE = ("rate_limits",)
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        
+
         self.token = os.getenv("DISCORD_BOT_TOKEN")
         self.channel_id = os.getenv("DISCORD_CHANNEL_ID")
-        
+
         if not self.token or not self.channel_id:
             raise ValueError("Missing Discord Credentials")
 
         self.base_url = f"https://discord.com/api/v10/channels/{self.channel_id}/messages"
+        self.route = f"POST /channels/{self.channel_id}/messages"
+        self.rate_limits = RateLimitTracker()
+        self._sent_batches = set()  # batches of the album being posted already delivered
 
         # Robust Session
         self.session = requests.Session()
-        retries = Retry(
+        retries = BudgetedRetry(
             total=3,
             backoff_factor=1,
             status_forcelist=[500, 502, 503, 504],
             allowed_methods=["POST"]
         )
         self.session.mount("https://", HTTPAdapter(max_retries=retries))
-        
+
         self.session.headers.update({
             "Authorization": f"Bot {self.token}",
             "User-Agent": "DiscordBot (SocialAuto, 1.0)"
@@ -40,44 +137,126 @@ class DiscordPoster:
         # 1. Check File Size and Warn User
         file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
         self.logger.info(f"   📂 File Size: {file_size_mb:.2f} MB")
-        
+
         if file_size_mb > 8:
             self.logger.warning("   ⚠️ WARNING: File > 8MB. Upload might fail without Nitro.")
 
-        safe_caption = caption[:2000]
-        payload = {"content": safe_caption}
-        
+        return self._send_message([file_path], caption)
+
+    def post_video(self, file_path, caption):
+        # Discord treats video files exactly like images (attachments)
+        self.logger.info("   ⏳ Discord: Uploading Video...")
+        return self.post_image(file_path, caption)
+
+    def post_images(self, file_paths, caption):
+        """
+        Batching mode: pack queued images into as few messages as possible
+        (max 10 attachments and MAX_ALBUM_BYTES per message).
+        """
+        missing = [p for p in file_paths if not os.path.exists(p)]
+        if missing:
+            self.logger.error(f"❌ Files not found: {missing}")
+            return False
+
+        batches = []
+        current, current_bytes = [], 0
+        for path in file_paths:
+            size = os.path.getsize(path)
+            if current and (len(current) >= self.MAX_ALBUM or current_bytes + size > self.MAX_ALBUM_BYTES):
+                batches.append(current)
+                current, current_bytes = [], 0
+            current.append(path)
+            current_bytes += size
+        if current:
+            batches.append(current)
+
+        self.logger.info(f"   ⏳ Discord: {len(file_paths)} images in {len(batches)} message(s)")
+
+        # Caption goes on the first message only. Delivered batches are
+        # remembered so a SmartRetry re-run does not post them twice.
+        for index, batch in enumerate(batches):
+            key = tuple(batch)
+            if key in self._sent_batches:
+                continue
+            self._send_message(batch, caption if index == 0 else "")
+            self._sent_batches.add(key)
+
+        # Done: the same files queued again later are a new post
+        for batch in batches:
+            self._sent_batches.discard(tuple(batch))
+        return True
+
+    def _send_message(self, file_paths, caption):
+        payload = {
+            "content": caption[:2000],
+            "attachments": [
+                {"id": i, "filename": os.path.basename(p)}
+                for i, p in enumerate(file_paths)
+            ],
+        }
+        total_size = sum(os.path.getsize(p) for p in file_paths)
+        timeout = THROUGHPUT.timeout_for("discord", total_size, default=60)
+
         try:
-            with open(file_path, 'rb') as f:
-                files = {
-                    "file": (os.path.basename(file_path), f, "application/octet-stream")
-                }
-                
-                # 2. PRINT DEBUG MSG BEFORE UPLOAD
-                self.logger.info("   ⏳ Connecting to Discord... (This may take 30-60s)")
-                
-                # 3. PERFORM UPLOAD
-                response = self.session.post(self.base_url, data=payload, files=files, timeout=60)
-
-                # 4. PRINT DEBUG MSG AFTER UPLOAD
+            rate_limited = False
+            while True:
+                if rate_limited:
+                    # Waiting out a 429 is a retry: it comes out of the budget
+                    RETRY_BUDGET.failed()
+                    RETRY_BUDGET.spend("discord 429")
+                    RETRY_BUDGET.sleep(self.rate_limits.delay_for(self.route), "discord 429")
+                else:
+                    self.rate_limits.wait(self.route, self.logger)
+
+                # A fresh streamed body per attempt: a consumed handle would
+                # otherwise send an empty body on the re-post.
+                body = MultipartStream(
+                    fields={"payload_json": payload},
+                    files=[
+                        (f"files[{i}]", p, os.path.basename(p), "application/octet-stream")
+                        for i, p in enumerate(file_paths)
+                    ],
+                    progress=log_progress(self.logger, "Discord"),
+                    host=self.UPLOAD_HOST,
+                )
+
+                self.logger.info(f"   ⏳ Connecting to Discord... (Timeout: {timeout[1]}s)")
+
+                started = time.monotonic()
+                try:
+                    response = self.session.post(
+                        self.base_url,
+                        data=body,
+                        headers=body.headers,
+                        timeout=timeout,
+                    )
+                finally:
+                    body.close()
+
+                self.rate_limits.update(self.route, response)
                 self.logger.info(f"   📩 Response Code: {response.status_code}")
 
-                if response.status_code == 429:
-                    self.logger.warning("   ⚠️ Rate Limited! Waiting safely...")
-                    time.sleep(int(response.json().get('retry_after', 5)) + 1)
-                    response = self.session.post(self.base_url, data=payload, files=files, timeout=60)
-
-                if response.status_code in [200, 201]:
-                    self.logger.info("   ✅ Discord Upload Complete!")
-                    return True
-                elif response.status_code == 404:
-                    raise Exception("Invalid Channel ID (404)")
-                elif response.status_code == 401:
-                    raise Exception("Invalid Bot Token (401)")
-                elif response.status_code == 413:
-                    raise Exception("File Too Large (413)")
-                else:
-                    raise Exception(f"Discord API Error: {response.status_code} - {response.text}")
+                if response.status_code != 429:
+                    break
+
+                rate_limited = True
+                self.logger.warning("   ⚠️ Rate Limited! Waiting for bucket reset...")
+
+            if response.status_code in [200, 201]:
+                THROUGHPUT.record("discord", total_size, time.monotonic() - started)
+                self.logger.info("   ✅ Discord Upload Complete!")
+                return True
+            elif response.status_code == 404:
+                raise Exception("Invalid Channel ID (404)")
+            elif response.status_code == 401:
+                raise Exception("Invalid Bot Token (401)")
+            elif response.status_code == 413:
+                raise Exception("File Too Large (413)")
+            else:
+                raise requests.HTTPError(
+                    f"Discord API Error: {response.status_code} - {response.text}",
+                    response=response,
+                )
 
         except requests.exceptions.Timeout:
             self.logger.error("   ❌ Timeout: Your internet is too slow for this file size.")
@@ -85,8 +264,3 @@ class DiscordPoster:
         except Exception as e:
             self.logger.error(f"   ❌ Connection Error: {e}")
             raise e
-
-    def post_video(self, file_path, caption):
-        # Discord treats video files exactly like images (attachments)
-        self.logger.info("   ⏳ Discord: Uploading Video...")
-        return self.post_image(file_path, caption)
@@ -1,14 +1,27 @@
 import os
+import json
 import requests
 import logging
 import time
+from core.timeouts import THROUGHPUT
+from core.idempotency import LEDGER, match_recent
+from modules.multipart import MultipartStream, log_progress
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".avi", ".mkv", ".webm")
+
 
 class FacebookPoster:
+    # Photos attached to one multi-photo feed post
+    MAX_ALBUM = 10
+    # Streamed uploads are governed per host (core/governor.py)
+    UPLOAD_HOST = "graph.facebook.com"
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.page_id = os.getenv("FB_PAGE_ID")
         self.token = os.getenv("META_TOKEN")
         self.base_url = f"https://graph.facebook.com/v18.0/{self.page_id}"
+        self._staged = {}  # file path -> unpublished photo id awaiting its feed post
 
     def post_video(self, file_path, caption):
         url = f"{self.base_url}/videos"
@@ -22,28 +35,43 @@ class FacebookPoster:
              return False
 
         # 1. Log File Size
-        size_mb = os.path.getsize(file_path) / (1024 * 1024)
+        size = os.path.getsize(file_path)
+        size_mb = size / (1024 * 1024)
         self.logger.info(f"   📂 File Size: {size_mb:.2f} MB")
         
-        self.logger.info("   ⏳ FB: Uploading Video... (Timeout: 120s)")
+        # Learned from past uploads; falls back to the old fixed 120s
+        timeout = THROUGHPUT.timeout_for("facebook.video", size, default=120)
+        self.logger.info(f"   ⏳ FB: Uploading Video... (Timeout: {timeout[1]}s)")
         
         try:
-            with open(file_path, 'rb') as f:
-                files = {'source': f}
-                # Added timeout to prevent freezing
-                res = requests.post(url, data=data, files=files, timeout=120)
+            # Streamed from disk: memory stays flat whatever the video size
+            body = MultipartStream(
+                fields=data,
+                files=[("source", file_path)],
+                progress=log_progress(self.logger, "FB"),
+                host=self.UPLOAD_HOST,
+            )
+            started = time.monotonic()
+            try:
+                res = requests.post(url, data=body, headers=body.headers, timeout=timeout)
+            finally:
+                body.close()
             
             self.logger.info(f"   📩 Response Code: {res.status_code}")
 
             if res.status_code != 200:
                 raise requests.HTTPError(f"FB Upload Failed: {res.text}", response=res)
             
+            THROUGHPUT.record("facebook.video", size, time.monotonic() - started)
+            LEDGER.record("facebook", caption, res.json().get("id"))
+            
             self.logger.info(f"   ✅ FB Video Published ID: {res.json().get('id')}")
             return True
             
         except requests.exceptions.Timeout:
+            # The upload may still have landed: raised so the retry checks first
             self.logger.error("   ❌ FB Timeout: Video too large for current speed.")
-            return False
+            raise Exception("FB Upload Timeout")
         except Exception as e:
             self.logger.error(f"   ❌ FB Error: {e}")
             raise e
@@ -59,23 +87,113 @@ class FacebookPoster:
              self.logger.error(f"❌ File not found: {file_path}")
              return False
 
-        size_mb = os.path.getsize(file_path) / (1024 * 1024)
+        size = os.path.getsize(file_path)
+        size_mb = size / (1024 * 1024)
         self.logger.info(f"   📂 File Size: {size_mb:.2f} MB")
         
-        self.logger.info("   ⏳ FB: Uploading Image... (Timeout: 60s)")
+        timeout = THROUGHPUT.timeout_for("facebook.photo", size, default=60)
+        self.logger.info(f"   ⏳ FB: Uploading Image... (Timeout: {timeout[1]}s)")
         
         try:
-            with open(file_path, 'rb') as f:
-                files = {'source': f}
-                res = requests.post(url, data=data, files=files, timeout=60)
+            body = MultipartStream(fields=data, files=[("source", file_path)], host=self.UPLOAD_HOST)
+            started = time.monotonic()
+            try:
+                res = requests.post(url, data=body, headers=body.headers, timeout=timeout)
+            finally:
+                body.close()
                 
             self.logger.info(f"   📩 Response Code: {res.status_code}")
             
             if res.status_code != 200:
                 raise requests.HTTPError(f"FB Photo Failed: {res.text}", response=res)
                 
+            THROUGHPUT.record("facebook.photo", size, time.monotonic() - started)
+            LEDGER.record("facebook", caption, res.json().get("post_id"))
+                
             self.logger.info(f"   ✅ FB Photo Published ID: {res.json().get('post_id')}")
             return True
         except Exception as e:
             self.logger.error(f"   ❌ FB Error: {e}")
             raise e
+
+    def post_images(self, file_paths, caption):
+        """
+        Multi-photo post: each photo is uploaded unpublished, then a single
+        /feed call publishes them together under one message.
+        """
+        try:
+            missing = [p for p in file_paths if not os.path.exists(p)]
+            if missing:
+                self.logger.error(f"❌ Files not found: {missing}")
+                return False
+
+            photo_ids = []
+            for file_path in file_paths[:self.MAX_ALBUM]:
+                # Staged photos survive a failed feed call and are reused on retry
+                if file_path not in self._staged:
+                    self._staged[file_path] = self._stage_photo(file_path)
+                photo_ids.append(self._staged[file_path])
+
+            data = {"access_token": self.token, "message": caption}
+            for i, photo_id in enumerate(photo_ids):
+                data[f"attached_media[{i}]"] = json.dumps({"media_fbid": photo_id})
+
+            self.logger.info(f"   ⏳ FB: Publishing {len(photo_ids)} photos as one post...")
+            res = requests.post(f"{self.base_url}/feed", data=data, timeout=60)
+            self.logger.info(f"   📩 Response Code: {res.status_code}")
+
+            if res.status_code != 200:
+                raise requests.HTTPError(f"FB Feed Post Failed: {res.text}", response=res)
+
+            LEDGER.record("facebook", caption, res.json().get("id"))
+            for file_path in file_paths:
+                self._staged.pop(file_path, None)
+
+            self.logger.info(f"   ✅ FB Album Published ID: {res.json().get('id')}")
+            return True
+        except Exception as e:
+            self.logger.error(f"   ❌ FB Error: {e}")
+            raise e
+
+    def find_posted(self, media, caption):
+        """Id of a post with this text made since the first attempt, else None."""
+        if isinstance(media, str) and media.lower().endswith(VIDEO_EXTENSIONS):
+            edge, text_field = "videos", "description"
+        else:
+            edge, text_field = "posts", "message"
+
+        res = requests.get(f"{self.base_url}/{edge}", params={
+            "fields": f"id,{text_field},created_time",
+            "limit": 10,
+            "access_token": self.token
+        }, timeout=15)
+        if res.status_code != 200:
+            return None
+
+        post_id = match_recent(res.json().get("data", []), caption,
+                               LEDGER.since("facebook", caption), text_field)
+        if post_id:
+            LEDGER.record("facebook", caption, post_id)
+        return post_id
+
+    def _stage_photo(self, file_path):
+        size = os.path.getsize(file_path)
+        timeout = THROUGHPUT.timeout_for("facebook.photo", size, default=60)
+        self.logger.info(f"   ⏳ FB: Staging {os.path.basename(file_path)} ({size / (1024 * 1024):.2f} MB)")
+
+        body = MultipartStream(
+            fields={"access_token": self.token, "published": "false"},
+            files=[("source", file_path)],
+            host=self.UPLOAD_HOST,
+        )
+        started = time.monotonic()
+        try:
+            res = requests.post(f"{self.base_url}/photos", data=body, headers=body.headers, timeout=timeout)
+        finally:
+            body.close()
+
+        if res.status_code != 200:
+            raise requests.HTTPError(f"FB Photo Staging Failed: {res.text}", response=res)
+
+        THROUGHPUT.record("facebook.photo", size, time.monotonic() - started)
+        return res.json()["id"]
@@ -2,13 +2,23 @@ import os
 import requests
 import time
 import logging
+from core.tracing import TRACER
+from core.timeouts import THROUGHPUT
+from core.idempotency import LEDGER, caption_fingerprint, match_recent
+from modules.graph_batch import GraphBatchClient
 
 class InstagramPoster:
+    # Graph API carousel limit
+    MAX_ALBUM = 10
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.ig_id = os.getenv("IG_ID")
         self.token = os.getenv("META_TOKEN")
         self.base_url = f"https://graph.facebook.com/v18.0/{self.ig_id}"
+        self.graph = GraphBatchClient(self.token)
+        self._children = {}  # image url -> carousel item container (reused on retry)
+        self._containers = {}  # (media type, caption fingerprint) -> container (reused on retry)
 
     def post_video(self, video_url, caption):
         return self._create_publish_container(video_url, caption, "VIDEO")
@@ -16,76 +26,69 @@ class InstagramPoster:
     def post_image(self, image_url, caption):
         return self._create_publish_container(image_url, caption, "IMAGE")
 
+    def post_images(self, image_urls, caption):
+        """
+        Carousel: the item containers are created in one batch request,
+        then one CAROUSEL container, then a single poll/publish cycle for
+        the whole group.
+        """
+        try:
+            image_urls = image_urls[:self.MAX_ALBUM]
+            self._create_children([url for url in image_urls if url not in self._children])
+            children = [self._children[image_url] for image_url in image_urls]
+
+            key = ("CAROUSEL", caption_fingerprint(caption))
+            if key not in self._containers:
+                self._containers[key] = self._create_container({
+                    "media_type": "CAROUSEL",
+                    "children": ",".join(children),
+                    "caption": caption,
+                }, "CAROUSEL")
+            creation_id = self._containers[key]
+
+            self._wait_for_container(creation_id, "CAROUSEL", children)
+            LEDGER.record("instagram", caption, self._publish(creation_id))
+
+            self._containers.pop(key, None)
+            for image_url in image_urls:
+                self._children.pop(image_url, None)
+            return True
+
+        except requests.exceptions.Timeout:
+            self.logger.error("   ❌ IG Connection Timed Out")
+            raise Exception("Timeout")
+        except Exception as e:
+            self.logger.error(f"   ❌ IG Carousel Error: {e}")
+            raise e
+
     def _create_publish_container(self, media_url, caption, media_type):
         # 1. Create Container
-        url = f"{self.base_url}/media"
-        
         payload = {
-            "access_token": self.token,
             "caption": caption,
             "media_type": "REELS" if media_type == "VIDEO" else "IMAGE"
         }
-        
+
         if media_type == "VIDEO":
             payload["video_url"] = media_url
             payload["share_to_feed"] = "true"
         else:
             payload["image_url"] = media_url
 
-        self.logger.info(f"   ⏳ IG: Sending {media_type} URL to Meta...")
-        
         try:
-            res = requests.post(url, data=payload, timeout=60)
-            self.logger.info(f"   📩 Response Code: {res.status_code}")
-            
-            if res.status_code != 200:
-                raise Exception(f"IG Create Failed: {res.text}")
-            
-            creation_id = res.json()['id']
-            self.logger.info(f"   ✅ Container Created ID: {creation_id}")
+            # A retry reuses the container (and Meta's transcode) of the last attempt
+            key = (media_type, caption_fingerprint(caption))
+            reused = key in self._containers
+            if not reused:
+                self._containers[key] = self._create_container(payload, media_type)
+            creation_id = self._containers[key]
 
             # 2. Poll Status (Critical for Video)
-            if media_type == "VIDEO":
-                self.logger.info("   ⏳ IG: Waiting for video processing...")
-                status = "IN_PROGRESS"
-                attempts = 0
-                max_attempts = 20
-                
-                while status != "FINISHED" and attempts < max_attempts:
-                    time.sleep(5)
-                    attempts += 1
-                    
-                    stat_res = requests.get(
-                        f"https://graph.facebook.com/v18.0/{creation_id}",
-                        params={"fields": "status_code", "access_token": self.token},
-                        timeout=30
-                    )
-                    
-                    if stat_res.status_code != 200:
-                        self.logger.warning(f"   ⚠️ IG Poll Error: {stat_res.text}")
-                        continue
-                        
-                    status = stat_res.json().get('status_code', 'ERROR')
-                    self.logger.info(f"      - Attempt {attempts}: {status}")
-                    
-                    if status == "ERROR":
-                        raise Exception("IG Video Processing Failed (Status: ERROR)")
-
-                if status != "FINISHED":
-                    raise Exception("IG Video Processing Timeout")
+            if media_type == "VIDEO" or reused:
+                self._wait_for_container(creation_id, media_type)
 
             # 3. Publish
-            self.logger.info("   ⏳ IG: Publishing...")
-            pub_url = f"{self.base_url}/media_publish"
-            pub_res = requests.post(pub_url, data={
-                "creation_id": creation_id, 
-                "access_token": self.token
-            }, timeout=60)
-            
-            if pub_res.status_code != 200:
-                raise Exception(f"IG Publish Failed: {pub_res.text}")
-                
-            self.logger.info(f"   ✅ IG Published Successfully ID: {pub_res.json()['id']}")
+            LEDGER.record("instagram", caption, self._publish(creation_id))
+            self._containers.pop(key, None)
             return True
 
         except requests.exceptions.Timeout:
@@ -93,4 +96,142 @@ class InstagramPoster:
             raise Exception("Timeout")
         except Exception as e:
             self.logger.error(f"   ❌ IG Error: {e}")
-            raise e
\ No newline at end of file
+            raise e
+
+    def find_posted(self, media, caption):
+        """Id of a post with this caption made since the first attempt, else None."""
+        res = requests.get(f"{self.base_url}/media", params={
+            "fields": "id,caption,timestamp",
+            "limit": 10,
+            "access_token": self.token
+        }, timeout=15)
+        if res.status_code != 200:
+            return None
+
+        media_id = match_recent(res.json().get("data", []), caption,
+                                LEDGER.since("instagram", caption), "caption")
+        if media_id:
+            LEDGER.record("instagram", caption, media_id)
+        return media_id
+
+    def quota_usage(self):
+        """(posts used, cap) of the rolling 24h content publishing limit."""
+        res = requests.get(f"{self.base_url}/content_publishing_limit", params={
+            "fields": "quota_usage,config",
+            "access_token": self.token
+        }, timeout=15)
+        if res.status_code != 200:
+            raise requests.HTTPError(f"IG Quota Check Failed: {res.text}", response=res)
+
+        data = (res.json().get("data") or [{}])[0]
+        return data.get("quota_usage", 0), data.get("config", {}).get("quota_total")
+
+    # =====================================================
+    # CONTAINER STEPS
+    # =====================================================
+
+    def _create_container(self, payload, media_type):
+        url = f"{self.base_url}/media"
+        payload = {"access_token": self.token, **payload}
+
+        self.logger.info(f"   ⏳ IG: Sending {media_type} URL to Meta...")
+
+        # Meta fetches the media itself; only server-side overhead is learned
+        timeout = THROUGHPUT.timeout_for("instagram.create", 0, default=60)
+        started = time.monotonic()
+        with TRACER.span("container.create", media_type=media_type):
+            res = requests.post(url, data=payload, timeout=timeout)
+        self.logger.info(f"   📩 Response Code: {res.status_code}")
+
+        if res.status_code != 200:
+            raise requests.HTTPError(f"IG Create Failed: {res.text}", response=res)
+
+        THROUGHPUT.record("instagram.create", 0, time.monotonic() - started)
+        creation_id = res.json()['id']
+        self.logger.info(f"   ✅ Container Created ID: {creation_id}")
+        return creation_id
+
+    def _create_children(self, image_urls):
+        """Carousel item containers, one batch request for all of them."""
+        if not image_urls:
+            return
+        self.logger.info(f"   ⏳ IG: Sending {len(image_urls)} carousel item URLs to Meta...")
+
+        timeout = THROUGHPUT.timeout_for("instagram.create", 0, default=60)
+        with TRACER.span("container.create", media_type="IMAGE", items=len(image_urls)):
+            results = self.graph.execute([
+                ("POST", f"{self.ig_id}/media", {"image_url": image_url, "is_carousel_item": "true"})
+                for image_url in image_urls
+            ], timeout=timeout)
+
+        # Items that made it are kept for the retry either way
+        failed = None
+        for image_url, res in zip(image_urls, results):
+            if res.status_code == 200:
+                self._children[image_url] = res.json()["id"]
+            elif failed is None:
+                failed = res
+        if failed is not None:
+            raise requests.HTTPError(f"IG Create Failed: {failed.text}", response=failed)
+        self.logger.info(f"   ✅ {len(image_urls)} Item Containers Created")
+
+    def _wait_for_container(self, creation_id, media_type, children=()):
+        """
+        Poll until the container, and any carousel items it is built from,
+        are FINISHED. All still in progress are polled in one batch request.
+        """
+        with TRACER.span("container.poll") as poll_span:
+            self.logger.info(f"   ⏳ IG: Waiting for {media_type.lower()} processing...")
+            pending = [creation_id, *children]
+            attempts = 0
+            max_attempts = 20
+
+            while pending and attempts < max_attempts:
+                time.sleep(5)
+                attempts += 1
+
+                results = self.graph.execute([
+                    ("GET", container_id, {"fields": "status_code"}) for container_id in pending
+                ], timeout=30)
+
+                statuses = {}
+                for container_id, stat_res in zip(pending, results):
+                    if stat_res.status_code != 200:
+                        self.logger.warning(f"   ⚠️ IG Poll Error: {stat_res.text}")
+                        continue
+                    statuses[container_id] = stat_res.json().get('status_code', 'ERROR')
+
+                status = statuses.get(creation_id, "FINISHED" if creation_id not in pending else "IN_PROGRESS")
+                pending = [c for c in pending if statuses.get(c) != "FINISHED"]
+                poll_span.set(polls=attempts, status=status)
+                items = f" ({len(pending) - (creation_id in pending)} items pending)" if children else ""
+                self.logger.info(f"      - Attempt {attempts}: {status}{items}")
+
+                broken = [c for c, s in statuses.items() if s in ("ERROR", "EXPIRED")]
+                if broken:
+                    # Not worth reusing on retry; a carousel is rebuilt without a broken item
+                    for container_id in {creation_id, *broken}:
+                        self._drop_container(container_id)
+                    raise Exception(f"IG {media_type.title()} Processing Failed (Status: {statuses[broken[0]]})")
+
+            if pending:
+                raise Exception(f"IG {media_type.title()} Processing Timeout")
+
+    def _publish(self, creation_id):
+        self.logger.info("   ⏳ IG: Publishing...")
+        pub_url = f"{self.base_url}/media_publish"
+        with TRACER.span("container.publish"):
+            pub_res = requests.post(pub_url, data={
+                "creation_id": creation_id,
+                "access_token": self.token
+            }, timeout=60)
+
+        if pub_res.status_code != 200:
+            raise requests.HTTPError(f"IG Publish Failed: {pub_res.text}", response=pub_res)
+
+        self.logger.info(f"   ✅ IG Published Successfully ID: {pub_res.json()['id']}")
+        return pub_res.json()['id']
+
+    def _drop_container(self, creation_id):
+        self._containers = {k: v for k, v in self._containers.items() if v != creation_id}
+        self._children = {k: v for k, v in self._children.items() if v != creation_id}
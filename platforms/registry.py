@@ -0,0 +1,50 @@
+import importlib
+import logging
+
+
+# name -> (module, class). Modules are imported on first use only, so a
+# run with empty queues never pays for tweepy / pytumblr / client setup.
+PLATFORM_CLASSES = {
+    "instagram": ("platforms.instagram", "InstagramPoster"),
+    "facebook": ("platforms.facebook", "FacebookPoster"),
+    "threads": ("platforms.threads", "ThreadsPoster"),
+    "twitter": ("platforms.twitter", "TwitterPoster"),
+    "telegram": ("platforms.telegram", "TelegramPoster"),
+    "discord": ("platforms.discord", "DiscordPoster"),
+    "tumblr": ("platforms.tumblr", "TumblrPoster"),
+}
+
+
+class PlatformRegistry:
+    def __init__(self, platform_config):
+        self.logger = logging.getLogger(__name__)
+        self.enabled = [
+            name for name in PLATFORM_CLASSES
+            if platform_config.get(name, {}).get("enabled")
+        ]
+        self._instances = {}
+
+    def __contains__(self, name):
+        return name in self.enabled
+
+    def __iter__(self):
+        return iter(self.enabled)
+
+    def __len__(self):
+        return len(self.enabled)
+
+    def poster_class(self, name):
+        """The poster class, imported but not built (no credentials needed)."""
+        module_name, class_name = PLATFORM_CLASSES[name]
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def get(self, name):
+        """
+        Import and build the poster on first request, then reuse it.
+        Constructor errors (missing credentials) propagate to the caller.
+        """
+        if name not in self._instances:
+            self._instances[name] = self.poster_class(name)()
+            self.logger.info(f"{name} poster initialized (lazy)")
+
+        return self._instances[name]
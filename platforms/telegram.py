@@ -1,10 +1,19 @@
 import os
+import json
+import time
 import requests
 import logging
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from core.timeouts import THROUGHPUT
+from core.retry_budget import BudgetedRetry
+from modules.multipart import MultipartStream, log_progress
 
 class TelegramPoster:
+    # sendMediaGroup takes 2-10 items
+    MAX_ALBUM = 10
+    # Upload host, for the governor's per-host connection cap
+    UPLOAD_HOST = "api.telegram.org"
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.token = os.getenv("TELEGRAM_POST_BOT_TOKEN") 
@@ -16,46 +25,104 @@ class TelegramPoster:
         self.base_url = f"https://api.telegram.org/bot{self.token}"
         
         self.session = requests.Session()
-        retries = Retry(total=5, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
+        # Transport retries draw on the shared retry budget
+        retries = BudgetedRetry(total=5, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
         self.session.mount("https://", HTTPAdapter(max_retries=retries))
 
     # --- MUST BE INDENTED UNDER CLASS ---
     def post_video(self, file_path, caption):
         url = f"{self.base_url}/sendVideo"
         if not os.path.exists(file_path):
-            self.logger.error(f"❌ File not found: {file_path}")
-            return False
+            raise FileNotFoundError(f"File not found: {file_path}")
 
-        with open(file_path, 'rb') as f:
-            data = {'chat_id': str(self.chat_id), 'caption': caption}
-            try:
-                res = self.session.post(url, data=data, files={'video': f}, timeout=60)
-                return self._check_response(res)
-            except Exception as e:
-                self.logger.error(f"   ❌ Telegram Video Error: {e}")
-                return False
+        size = os.path.getsize(file_path)
+        timeout = THROUGHPUT.timeout_for("telegram", size, default=60)
+
+        body = MultipartStream(
+            fields={'chat_id': str(self.chat_id), 'caption': caption},
+            files=[('video', file_path)],
+            progress=log_progress(self.logger, "Telegram"),
+            host=self.UPLOAD_HOST,
+        )
+        try:
+            started = time.monotonic()
+            res = self.session.post(url, data=body, headers=body.headers, timeout=timeout)
+            self._check_response(res)
+            THROUGHPUT.record("telegram", size, time.monotonic() - started)
+            return True
+        except Exception as e:
+            self.logger.error(f"   ❌ Telegram Video Error: {e}")
+            raise
+        finally:
+            body.close()
 
     def post_image(self, file_path, caption):
         url = f"{self.base_url}/sendPhoto"
         if not os.path.exists(file_path):
-            self.logger.error(f"❌ File not found: {file_path}")
-            return False
+            raise FileNotFoundError(f"File not found: {file_path}")
 
-        with open(file_path, 'rb') as f:
-            data = {'chat_id': str(self.chat_id), 'caption': caption}
-            try:
-                res = self.session.post(url, data=data, files={'photo': f}, timeout=60)
-                return self._check_response(res)
-            except Exception as e:
-                self.logger.error(f"   ❌ Telegram Image Error: {e}")
-                return False
+        size = os.path.getsize(file_path)
+        timeout = THROUGHPUT.timeout_for("telegram", size, default=60)
+
+        body = MultipartStream(
+            fields={'chat_id': str(self.chat_id), 'caption': caption},
+            files=[('photo', file_path)],
+            progress=log_progress(self.logger, "Telegram"),
+            host=self.UPLOAD_HOST,
+        )
+        try:
+            started = time.monotonic()
+            res = self.session.post(url, data=body, headers=body.headers, timeout=timeout)
+            self._check_response(res)
+            THROUGHPUT.record("telegram", size, time.monotonic() - started)
+            return True
+        except Exception as e:
+            self.logger.error(f"   ❌ Telegram Image Error: {e}")
+            raise
+        finally:
+            body.close()
+
+    def post_images(self, file_paths, caption):
+        """One sendMediaGroup call for the whole album; caption on the first photo."""
+        if len(file_paths) == 1:
+            return self.post_image(file_paths[0], caption)
+
+        url = f"{self.base_url}/sendMediaGroup"
+        for file_path in file_paths:
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(f"File not found: {file_path}")
+
+        file_paths = file_paths[:self.MAX_ALBUM]
+        media = [{"type": "photo", "media": f"attach://photo{i}"} for i in range(len(file_paths))]
+        media[0]["caption"] = caption
+
+        size = sum(os.path.getsize(p) for p in file_paths)
+        timeout = THROUGHPUT.timeout_for("telegram", size, default=60)
+
+        body = MultipartStream(
+            fields={'chat_id': str(self.chat_id), 'media': json.dumps(media)},
+            files=[(f"photo{i}", p) for i, p in enumerate(file_paths)],
+            progress=log_progress(self.logger, "Telegram"),
+            host=self.UPLOAD_HOST,
+        )
+        self.logger.info(f"   ⏳ Telegram: Sending album of {len(file_paths)} photos...")
+        try:
+            started = time.monotonic()
+            res = self.session.post(url, data=body, headers=body.headers, timeout=timeout)
+            self._check_response(res)
+            THROUGHPUT.record("telegram", size, time.monotonic() - started)
+            return True
+        except Exception as e:
+            self.logger.error(f"   ❌ Telegram Album Error: {e}")
+            raise
+        finally:
+            body.close()
 
     def _check_response(self, res):
+        # Raised with the response so SmartRetry classifies by status code
         if res.status_code != 200:
-            self.logger.error(f"Telegram API Error: {res.text}")
-            return False
+            raise requests.HTTPError(f"Telegram API Error: {res.status_code} - {res.text}", response=res)
         self.logger.info("   ✅ Telegram Content Posted")
-        return True
     def send_message(self, text):
         url = f"{self.base_url}/sendMessage"
         payload = {
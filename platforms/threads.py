@@ -2,13 +2,21 @@ import os
 import requests
 import time
 import logging
+from core.tracing import TRACER
+from core.timeouts import THROUGHPUT
+from core.idempotency import LEDGER, caption_fingerprint, match_recent
 
 class ThreadsPoster:
+    # Threads carousel limit
+    MAX_ALBUM = 20
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.user_id = os.getenv("THREADS_USER_ID")
         self.token = os.getenv("THREADS_ACCESS_TOKEN")
         self.base_url = f"https://graph.threads.net/v1.0/{self.user_id}"
+        self._children = {}  # image url -> carousel item container (reused on retry)
+        self._containers = {}  # (media type, caption fingerprint) -> container (reused on retry)
 
     def post_image(self, image_url, caption):
         return self._create_publish_container(image_url, caption, "IMAGE")
@@ -16,58 +24,135 @@ class ThreadsPoster:
     def post_video(self, video_url, caption):
         return self._create_publish_container(video_url, caption, "VIDEO")
 
+    def post_images(self, image_urls, caption):
+        """
+        Carousel: one item container per image, then a single CAROUSEL
+        container that goes through one poll/publish cycle.
+        """
+        children = []
+        for image_url in image_urls[:self.MAX_ALBUM]:
+            if image_url not in self._children:
+                self._children[image_url] = self._create_container({
+                    "media_type": "IMAGE",
+                    "image_url": image_url,
+                    "is_carousel_item": "true",
+                })
+            children.append(self._children[image_url])
+
+        key = ("CAROUSEL", caption_fingerprint(caption))
+        if key not in self._containers:
+            self._containers[key] = self._create_container({
+                "media_type": "CAROUSEL",
+                "children": ",".join(children),
+                "text": caption,
+            })
+        container_id = self._containers[key]
+
+        self._wait_for_container(container_id, "CAROUSEL")
+        self._publish(container_id, caption)
+
+        self._containers.pop(key, None)
+        for image_url in image_urls:
+            self._children.pop(image_url, None)
+        return True
+
     def _create_publish_container(self, media_url, caption, media_type):
-        # 1. Start Upload
+        # 1. Start Upload (a retry reuses the last attempt's container)
+        key = (media_type, caption_fingerprint(caption))
+        if key not in self._containers:
+            self._containers[key] = self._create_container({
+                "text": caption,
+                "media_type": media_type,
+                "image_url" if media_type == "IMAGE" else "video_url": media_url
+            })
+        container_id = self._containers[key]
+
+        # 2. MANDATORY POLLING LOOP
+        self._wait_for_container(container_id, media_type)
+
+        # 3. Final Publish
+        published = self._publish(container_id, caption)
+        self._containers.pop(key, None)
+        return published
+
+    def find_posted(self, media, caption):
+        """Id of a post with this text made since the first attempt, else None."""
+        res = requests.get(f"{self.base_url}/threads", params={
+            "fields": "id,text,timestamp",
+            "limit": 10,
+            "access_token": self.token
+        }, timeout=15)
+        if res.status_code != 200:
+            return None
+
+        post_id = match_recent(res.json().get("data", []), caption,
+                               LEDGER.since("threads", caption), "text")
+        if post_id:
+            LEDGER.record("threads", caption, post_id)
+        return post_id
+
+    def _create_container(self, payload):
         url = f"{self.base_url}/threads"
-        payload = {
-            "access_token": self.token,
-            "text": caption,
-            "media_type": media_type,
-            "image_url" if media_type == "IMAGE" else "video_url": media_url
-        }
-        
-        res = requests.post(url, data=payload, timeout=60)
+        payload = {"access_token": self.token, **payload}
+        media_type = payload["media_type"]
+
+        timeout = THROUGHPUT.timeout_for("threads.create", 0, default=60)
+        started = time.monotonic()
+        with TRACER.span("container.create", media_type=media_type):
+            res = requests.post(url, data=payload, timeout=timeout)
         if res.status_code != 200:
-            raise Exception(f"Threads Init Failed: {res.text}")
+            raise requests.HTTPError(f"Threads Init Failed: {res.text}", response=res)
             
-        container_id = res.json()['id']
+        THROUGHPUT.record("threads.create", 0, time.monotonic() - started)
+        return res.json()['id']
 
-        # 2. MANDATORY POLLING LOOP
+    def _wait_for_container(self, container_id, media_type):
         # Larger videos need more time to transcode.
         self.logger.info(f"   ⏳ Threads: Waiting for {media_type} to process...")
         
-        status = "IN_PROGRESS"
-        attempts = 0
-        while status != "FINISHED" and attempts < 60:
-            time.sleep(5)
-            attempts += 1
+        with TRACER.span("container.poll") as poll_span:
+            status = "IN_PROGRESS"
+            attempts = 0
+            while status != "FINISHED" and attempts < 60:
+                time.sleep(5)
+                attempts += 1
             
-            # Check Status
-            check_url = f"https://graph.threads.net/v1.0/{container_id}"
-            check_res = requests.get(check_url, params={
-                "fields": "status,error_message",
-                "access_token": self.token
-            })
-            
-            data = check_res.json()
-            status = data.get("status", "ERROR")
-            self.logger.info(f"      - Processing Status: {status} (Attempt {attempts})")
+                # Check Status
+                check_url = f"https://graph.threads.net/v1.0/{container_id}"
+                check_res = requests.get(check_url, params={
+                    "fields": "status,error_message",
+                    "access_token": self.token
+                }, timeout=30)
+
+                if check_res.status_code != 200:
+                    # A failed poll says nothing about the container
+                    self.logger.warning(f"   ⚠️ Threads Poll Error: {check_res.text}")
+                    continue
+
+                data = check_res.json()
+                status = data.get("status", "ERROR")
+                poll_span.set(polls=attempts, status=status)
+                self.logger.info(f"      - Processing Status: {status} (Attempt {attempts})")
             
-            if status == "ERROR":
-                raise Exception(f"Threads Processing Error: {data.get('error_message')}")
+                if status in ("ERROR", "EXPIRED"):
+                    # Not worth reusing on retry
+                    self._containers = {k: v for k, v in self._containers.items() if v != container_id}
+                    raise Exception(f"Threads Processing Error: {data.get('error_message')}")
 
         if status != "FINISHED":
             raise Exception("Threads upload timed out after 5 minutes.")
 
-        # 3. Final Publish
+    def _publish(self, container_id, caption):
         pub_url = f"{self.base_url}/threads_publish"
-        pub_res = requests.post(pub_url, data={
-            "creation_id": container_id,
-            "access_token": self.token
-        })
+        with TRACER.span("container.publish"):
+            pub_res = requests.post(pub_url, data={
+                "creation_id": container_id,
+                "access_token": self.token
+            }, timeout=60)
         
         if pub_res.status_code == 200:
+            LEDGER.record("threads", caption, pub_res.json().get("id"))
             self.logger.info("   ✅ Threads Published Successfully!")
             return True
         else:
-            raise Exception(f"Threads Publish Failed: {pub_res.text}")
\ No newline at end of file
+            raise requests.HTTPError(f"Threads Publish Failed: {pub_res.text}", response=pub_res)
\ No newline at end of file
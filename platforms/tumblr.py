@@ -1,21 +1,48 @@
 import os
+import time
 import logging
-import pytumblr
+import mimetypes
+import requests
+from requests_oauthlib import OAuth1
 from typing import Tuple, List, Union
+from core.timeouts import THROUGHPUT
+from modules.multipart import MultipartStream, log_progress
 
 
 class TumblrPoster:
+    """
+    Posts through the Neue Post Format endpoint (/v2/blog/{blog}/posts).
+    Media is streamed from disk as a multipart part, so memory stays flat
+    for large videos, and caption + tags are sent natively (no 200-char
+    video caption cut as with the legacy create_video call).
+    """
+
+    API_ROOT = "https://api.tumblr.com/v2"
+    # A long-running process re-reads /user/limits after this many seconds
+    LIMITS_TTL = 3600
+    # Copied back from supervised workers so the limits survive each post
+    SHARED_STATE = ("_limits", "_limits_at")
+    # NPF posts allow up to 30 media blocks; keep albums readable
+    MAX_ALBUM = 10
+    UPLOAD_HOST = "api.tumblr.com"
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.blog_name = os.getenv("TUMBLR_BLOG_NAME")
 
-        self.client = pytumblr.TumblrRestClient(
+        # Pooled session, OAuth1-signed (multipart bodies are not signed).
+        # Supervised workers start it with fresh connections (core/supervisor.py)
+        self.session = requests.Session()
+        self.session.auth = OAuth1(
             os.getenv("TUMBLR_CONSUMER_KEY"),
             os.getenv("TUMBLR_CONSUMER_SECRET"),
             os.getenv("TUMBLR_OAUTH_TOKEN"),
             os.getenv("TUMBLR_OAUTH_TOKEN_SECRET"),
         )
 
+        self._limits = None  # cached /user/limits response
+        self._limits_at = 0.0
+
     # 🔥 Central Clean Logic
     
 
@@ -44,34 +71,135 @@ class TumblrPoster:
 
         return str(caption_data), []
 
-    def post_image(self, file_path: str, caption_data: Union[str, dict]) -> bool:
-        text, tag_str = self._extract_data(caption_data)
+    # =====================================================
+    # DAILY LIMITS
+    # =====================================================
+
+    def _check_daily_limit(self, media_type):
+        """
+        Ask /user/limits once per run (hourly in daemon mode) and track
+        remaining posts locally, so a post that Tumblr would reject never
+        uploads its media.
+        """
+        limits = self._load_limits()
+
+        for key in ("posts", "videos" if media_type == "video" else "photos"):
+            bucket = limits.get(key)
+            if isinstance(bucket, dict) and bucket.get("remaining") is not None \
+                    and int(bucket["remaining"]) <= 0:
+                raise Exception(
+                    f"Tumblr daily {key} limit reached (resets at {bucket.get('reset_at')})"
+                )
+
+    def _load_limits(self):
+        if self._limits is None or time.monotonic() - self._limits_at > self.LIMITS_TTL:
+            self._limits_at = time.monotonic()
+            try:
+                res = self.session.get(f"{self.API_ROOT}/user/limits", timeout=(10, 30))
+                body = res.json().get("response", {}) if res.status_code == 200 else {}
+                self._limits = body.get("user", body)
+            except Exception as e:
+                self.logger.warning(f"   ⚠️ Tumblr limits unavailable: {e}")
+                self._limits = {}
+        return self._limits
+
+    def quota_usage(self):
+        """(posts used, cap) of the daily post limit, or None if unknown."""
+        bucket = self._load_limits().get("posts")
+        if not isinstance(bucket, dict) or bucket.get("limit") is None or bucket.get("remaining") is None:
+            return None
+        return int(bucket["limit"]) - int(bucket["remaining"]), int(bucket["limit"])
+
+    def _consume_limit(self, media_type):
+        for key in ("posts", "videos" if media_type == "video" else "photos"):
+            bucket = (self._limits or {}).get(key)
+            if isinstance(bucket, dict) and bucket.get("remaining") is not None:
+                bucket["remaining"] = int(bucket["remaining"]) - 1
+
+    # =====================================================
+    # NPF POST
+    # =====================================================
+
+    @staticmethod
+    def _media_block(media_type, identifier, file_path):
+        mime = mimetypes.guess_type(file_path)[0] or (
+            "video/mp4" if media_type == "video" else "image/jpeg"
+        )
+        media = {"type": mime, "identifier": identifier}
+
+        if media_type == "video":
+            return {"type": "video", "media": media}
+        return {"type": "image", "media": [media]}
+
+    def _create_post(self, file_paths: List[str], caption_data, media_type) -> bool:
+        text, tags = self._extract_data(caption_data)
+
+        for path in file_paths:
+            if not os.path.exists(path):
+                self.logger.error(f"❌ File not found: {path}")
+                return False
+
+        self._check_daily_limit(media_type)
+
+        identifiers = [f"{media_type}{i}" for i in range(len(file_paths))]
+        content = [self._media_block(media_type, ident, path)
+                   for ident, path in zip(identifiers, file_paths)]
+        if text:
+            content.append({"type": "text", "text": text})
+
+        body = MultipartStream(
+            fields={"json": {"content": content, "tags": ",".join(tags), "state": "published"}},
+            files=list(zip(identifiers, file_paths)),
+            progress=log_progress(self.logger, "Tumblr"),
+            host=self.UPLOAD_HOST,
+        )
+
+        size = sum(os.path.getsize(p) for p in file_paths)
+        key = f"tumblr.{'video' if media_type == 'video' else 'photo'}"
+        timeout = THROUGHPUT.timeout_for(key, size, default=120)
+
+        self.logger.info(f"   ⏳ Tumblr: Uploading {len(file_paths)} {media_type} (NPF, Timeout: {timeout[1]}s)")
 
         try:
-            response = self.client.create_photo(
-                self.blog_name,
-                state="published",
-                caption=text,
-                tags=tag_str,
-                data=[file_path],
+            started = time.monotonic()
+            res = self.session.post(
+                f"{self.API_ROOT}/blog/{self.blog_name}/posts",
+                data=body,
+                headers=body.headers,
+                timeout=timeout,
             )
-            return "id" in response
+        finally:
+            body.close()
+
+        self.logger.info(f"   📩 Response Code: {res.status_code}")
+
+        if res.status_code not in (200, 201):
+            raise requests.HTTPError(f"Tumblr Post Failed: {res.text}", response=res)
+
+        THROUGHPUT.record(key, size, time.monotonic() - started)
+        self._consume_limit(media_type)
+
+        post_id = res.json().get("response", {}).get("id")
+        self.logger.info(f"   ✅ Tumblr Published ID: {post_id}")
+        return post_id is not None
+
+    def post_image(self, file_path: str, caption_data: Union[str, dict]) -> bool:
+        try:
+            return self._create_post([file_path], caption_data, "image")
         except Exception as e:
             self.logger.error(f"Tumblr Photo Error: {e}")
-            return False
+            raise e
 
     def post_video(self, file_path: str, caption_data: Union[str, dict]) -> bool:
-        text, tag_str = self._extract_data(caption_data)
-
         try:
-            response = self.client.create_video(
-                self.blog_name,
-                state="published",
-                caption=text[:200],  # metadata safe
-                tags=tag_str,
-                data=file_path,  # correct for video
-            )
-            return "id" in response
+            return self._create_post([file_path], caption_data, "video")
         except Exception as e:
             self.logger.error(f"Tumblr Video Error: {e}")
-            return False
+            raise e
+
+    def post_images(self, file_paths: List[str], caption_data: Union[str, dict]) -> bool:
+        try:
+            return self._create_post(file_paths[:self.MAX_ALBUM], caption_data, "image")
+        except Exception as e:
+            self.logger.error(f"Tumblr Photo Set Error: {e}")
+            raise e
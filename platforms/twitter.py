@@ -1,12 +1,17 @@
 import os
+import time
 import tweepy
 import logging
 import requests
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from core.timeouts import THROUGHPUT
+from core.retry_budget import BudgetedRetry
 
 
 class TwitterPoster:
+    # A tweet carries at most 4 images
+    MAX_ALBUM = 4
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
 
@@ -22,7 +27,7 @@ class TwitterPoster:
 
         # 2. CREATE ROBUST SESSION (Fixes SSL/Connection Errors)
         self.session = requests.Session()
-        retries = Retry(
+        retries = BudgetedRetry(
             total=5,
             backoff_factor=1,
             status_forcelist=[500, 502, 503, 504],
@@ -36,40 +41,83 @@ class TwitterPoster:
         self.api_v1.session = self.session
 
         # 4. Authenticate v2 (Tweet Creation)
+        # A 429 is raised, not slept on here: SmartRetry waits for it out
+        # of the run's retry budget, within the platform deadline
         self.client_v2 = tweepy.Client(
             consumer_key=api_key,
             consumer_secret=api_secret,
             access_token=access_token,
             access_token_secret=access_token_secret,
-            wait_on_rate_limit=True,
+            wait_on_rate_limit=False,
         )
         self.client_v2.session = self.session
 
+        self._uploaded = {}  # file path -> media_id awaiting its tweet
+
     def post_image(self, file_path, caption):
         return self._upload_media(file_path, caption, is_video=False)
 
     def post_video(self, file_path, caption):
         return self._upload_media(file_path, caption, is_video=True)
 
+    def post_images(self, file_paths, caption):
+        """Upload up to 4 images and attach them all to one tweet."""
+        try:
+            missing = [p for p in file_paths if not os.path.exists(p)]
+            if missing:
+                self.logger.error(f"❌ Files not found: {missing}")
+                return False
+
+            media_ids = []
+            for file_path in file_paths[:self.MAX_ALBUM]:
+                # Uploads made before a failed tweet are kept for the retry
+                if file_path not in self._uploaded:
+                    self._uploaded[file_path] = self._upload_file(file_path, is_video=False)
+                media_ids.append(self._uploaded[file_path])
+
+            self.logger.info(f"   ⏳ Twitter: Posting Tweet with {len(media_ids)} images (v2)...")
+            response = self.client_v2.create_tweet(text=caption, media_ids=media_ids)
+
+            for file_path in file_paths:
+                self._uploaded.pop(file_path, None)
+
+            if response.data and "id" in response.data:
+                self.logger.info(f"   ✅ Twitter Posted! ID: {response.data['id']}")
+                return True
+            return False
+        except Exception as e:
+            self.logger.error(f"   ❌ Twitter Error: {e}")
+            raise e
+
+    def _upload_file(self, file_path, is_video=False):
+        size = os.path.getsize(file_path)
+        size_mb = size / (1024 * 1024)
+        self.logger.info(f"   📂 File Size: {size_mb:.2f} MB")
+
+        # tweepy passes API.timeout straight to requests
+        media_key = "twitter.video" if is_video else "twitter.image"
+        self.api_v1.timeout = THROUGHPUT.timeout_for(media_key, size, default=60)
+        started = time.monotonic()
+
+        # Upload to v1.1
+        if is_video:
+            self.logger.info("   ⏳ Twitter: Uploading VIDEO (v1.1)...")
+            media = self.api_v1.media_upload(file_path, media_category="tweet_video")
+        else:
+            self.logger.info("   ⏳ Twitter: Uploading IMAGE (v1.1)...")
+            media = self.api_v1.media_upload(file_path)
+
+        THROUGHPUT.record(media_key, size, time.monotonic() - started)
+        self.logger.info(f"   ⏳ Media ID: {media.media_id}")
+        return media.media_id
+
     def _upload_media(self, file_path, caption, is_video=False):
         try:
             if not os.path.exists(file_path):
                 self.logger.error(f"❌ File not found: {file_path}")
                 return False
 
-            size_mb = os.path.getsize(file_path) / (1024 * 1024)
-            self.logger.info(f"   📂 File Size: {size_mb:.2f} MB")
-
-            # Upload to v1.1
-            if is_video:
-                self.logger.info("   ⏳ Twitter: Uploading VIDEO (v1.1)...")
-                media = self.api_v1.media_upload(file_path, media_category="tweet_video")
-            else:
-                self.logger.info("   ⏳ Twitter: Uploading IMAGE (v1.1)...")
-                media = self.api_v1.media_upload(file_path)
-
-            media_id = media.media_id
-            self.logger.info(f"   ⏳ Media ID: {media_id}")
+            media_id = self._upload_file(file_path, is_video)
 
             # Post Tweet v2
             self.logger.info("   ⏳ Twitter: Posting Tweet (v2)...")
@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core.supervisor import SUPERVISOR
+from platforms.discord import DiscordPoster
+
+RESET_AFTER = 1.5
+
+
+class _ExhaustedBucket(BaseHTTPRequestHandler):
+    """Accepts every message and reports the bucket as used up."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        payload = json.dumps({"id": "1"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("X-RateLimit-Bucket", "test-bucket")
+        self.send_header("X-RateLimit-Remaining", "0")
+        self.send_header("X-RateLimit-Reset-After", str(RESET_AFTER))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SupervisedRateLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _ExhaustedBucket)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        os.environ.setdefault("DISCORD_BOT_TOKEN", "test")
+        os.environ.setdefault("DISCORD_CHANNEL_ID", "1")
+        self.poster = DiscordPoster()
+        self.poster.base_url = f"http://127.0.0.1:{self.server.server_port}/messages"
+
+        fd, self.image = tempfile.mkstemp(suffix=".jpg")
+        os.write(fd, b"\xff\xd8" + b"0" * 1024)
+        os.close(fd)
+
+        SUPERVISOR.configure(platform_deadline=30, enabled=True)
+        if not SUPERVISOR.enabled:
+            self.skipTest("supervised workers need fork()")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.remove(self.image)
+
+    def test_second_post_waits_for_bucket_reset(self):
+        self.assertTrue(SUPERVISOR.call("discord", self.poster, self.poster.post_image, self.image, "one"))
+        # The worker's bucket state came back to the parent's poster
+        self.assertEqual(self.poster.rate_limits.buckets["test-bucket"]["remaining"], 0)
+
+        started = time.monotonic()
+        self.assertTrue(SUPERVISOR.call("discord", self.poster, self.poster.post_image, self.image, "two"))
+        self.assertGreaterEqual(time.monotonic() - started, RESET_AFTER - 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()